@@ -2,22 +2,32 @@
 Laporan controller: FastAPI endpoint handlers for laporan operations
 """
 from fastapi import HTTPException, Cookie, Response
+import asyncio
+import csv
 import os
-from typing import Optional, List
+from datetime import date, datetime
+from typing import Optional, List, Tuple
+from uuid import UUID
 from db.connection import Database
 from models.laporan import LaporanCreate, LaporanOut, LaporanDetail
-from repositories import laporan_repo, notifikasi_repo
+from repositories import cluster_repo, foto_hash_repo, laporan_repo, outbox_repo
+from utils import bulk_import, geocoder, idempotency, metrics, notifikasi_writer, outbox, photo_hash, wilayah_index
 
+# Bulk import limits (POST /laporan/bulk)
+BULK_MAX_BYTES = int(os.getenv("BULK_IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+BULK_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", "200000"))
+BULK_MAX_ERRORS = 1000
+BULK_NOTIFY_MODES = ("each", "summary", "none")
+# GET /laporan/batch
+BATCH_MAX_IDS = 100
+
+
+async def _insert_laporan(laporan: LaporanCreate, db: Database, laporan_token: Optional[str]) -> dict:
+    # Reports with coordinates but no kota get the nearest kab/kota
+    id_kota = laporan.id_kota
+    if id_kota is None:
+        id_kota = geocoder.lookup(laporan.latitude, laporan.longitude)
 
-async def create_laporan_handler(
-    laporan: LaporanCreate, response: Response, db: Database, 
-    laporan_token: Optional[str] = Cookie(None)
-) -> LaporanOut:
-    """
-    POST /laporan
-    Create a new laporan and return token_cookie (sets HttpOnly cookie).
-    If user already has a token from previous laporan, reuse it.
-    """
     row = await laporan_repo.create_laporan(
         db=db,
         nama_pelapor=laporan.nama_pelapor,
@@ -25,7 +35,7 @@ async def create_laporan_handler(
         email_pelapor=laporan.email_pelapor,
         judul_laporan=laporan.judul_laporan,
         deskripsi=laporan.deskripsi,
-        id_kota=getattr(laporan, 'id_kota', None),
+        id_kota=id_kota,
         tanggal_hilang=laporan.tanggal_hilang,  # Pass date object as-is
         lokasi_hilang=getattr(laporan, 'lokasi_hilang', None),
         latitude=getattr(laporan, 'latitude', None),
@@ -38,16 +48,55 @@ async def create_laporan_handler(
     if not row:
         raise HTTPException(status_code=500, detail="Failed to create laporan")
 
-    # Create admin notification
-    await notifikasi_repo.create_notifikasi(
-        db=db,
+    # Admin notification goes through the batched writer; bursts per kota become a digest
+    await notifikasi_writer.writer.submit(
+        db,
         id_laporan=row[0],
         pesan=f"Laporan baru: {row[3]}",
+        digest_key=id_kota or 0,
+        digest_label=wilayah_index.kota_name(id_kota),
     )
 
+    # Keep this reporter's reads on the primary until the replica catches up
+    db.mark_write(row[1])
+
+    return {
+        "id_laporan": row[0],
+        "token_cookie": str(row[1]),
+        "nama_pelapor": row[2],
+        "judul_laporan": row[3],
+        "status": row[4],
+    }
+
+
+async def create_laporan_handler(
+    laporan: LaporanCreate, response: Response, db: Database, 
+    laporan_token: Optional[str] = Cookie(None),
+    idempotency_key: Optional[str] = None
+) -> LaporanOut:
+    """
+    POST /laporan
+    Create a new laporan and return token_cookie (sets HttpOnly cookie).
+    If user already has a token from previous laporan, reuse it.
+    With an Idempotency-Key, a retry of the same request returns the first
+    response instead of creating another laporan.
+    """
+    if idempotency_key:
+        async def _create():
+            return await _insert_laporan(laporan, db, laporan_token), True
+
+        created, replayed = await idempotency.store.run(
+            db, "laporan.create", idempotency_key,
+            idempotency.request_hash(laporan.__dict__, laporan_token), _create,
+        )
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+    else:
+        created = await _insert_laporan(laporan, db, laporan_token)
+
     # Set HttpOnly persistent cookie for reporter so it survives browser restarts.
     # Use environment variable `USE_SECURE_COOKIE=true` when running over HTTPS in production.
-    token = row[1]
+    token = created["token_cookie"]
     max_age = 60 * 60 * 24 * 30  # 30 days
     secure_flag = os.getenv('USE_SECURE_COOKIE', 'false').lower() == 'true'
     response.set_cookie(
@@ -61,28 +110,74 @@ async def create_laporan_handler(
         path='/'
     )
 
-    return LaporanOut(
-        id_laporan=row[0],
-        token_cookie=str(row[1]),
-        nama_pelapor=row[2],
-        judul_laporan=row[3],
-        status=row[4],
-    )
+    return LaporanOut(**created)
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    'judul_laporan,status,foto_url' -> those LaporanDetail fields (id_laporan
+    is always included); None when no fieldset was asked for.
+    """
+    if not fields:
+        return None
+    parsed = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in parsed if f not in laporan_repo.FIELD_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(laporan_repo.FIELD_COLUMNS)}",
+        )
+    return list(dict.fromkeys(["id_laporan", *parsed]))
+
+
+def _kota_label(row) -> Optional[str]:
+    kota, provinsi = row["nama_kota"], row["nama_provinsi"]
+    return f"{kota}, {provinsi}" if kota and provinsi else (kota or None)
+
+
+def _sparse_laporan(row, fields: List[str], prefer_lokasi_hilang: bool = False) -> dict:
+    """
+    Only `fields` of a laporan, from a row selected with the same fieldset.
+    Values match the full LaporanDetail; `lokasi` prefers the free-text
+    lokasi_hilang on /laporan/mine as get_my_laporan_handler does.
+    """
+    out = {}
+    for field in fields:
+        if field == "lokasi":
+            kota = _kota_label(row)
+            out[field] = (row["lokasi_hilang"] or kota) if prefer_lokasi_hilang else kota
+        elif field in ("kategori", "kategori_nama"):
+            out[field] = row["nama_kategori"]
+        elif field == "nama_barang":
+            out[field] = row["judul_laporan"]
+        elif field in ("tanggal_hilang", "created_at"):
+            out[field] = str(row[field]) if row[field] else None
+        else:
+            out[field] = row[field]
+    return out
 
 
 async def get_my_laporan_handler(
-    laporan_token: Optional[str] = Cookie(None), db: Database = None
+    laporan_token: Optional[str] = Cookie(None), db: Database = None, fields: Optional[str] = None
 ) -> List[LaporanDetail]:
     """
     GET /laporan/mine
     Retrieve laporan for the current reporter (via cookie token).
     If no token or no laporan found, return empty list with 200 status.
+    With `fields` each item has only those fields.
     """
+    selected = _parse_fields(fields)
     if not laporan_token:
         # No token = no reports for this user (anonymous user without a session)
         return []
 
-    rows = await laporan_repo.get_laporan_by_token(db=db, token_cookie=laporan_token)
+    if selected:
+        rows = await laporan_repo.get_laporan_by_token(
+            db=db.for_read(laporan_token), token_cookie=laporan_token, fields=selected
+        )
+        return [_sparse_laporan(r, selected, prefer_lokasi_hilang=True) for r in rows]
+
+    rows = await laporan_repo.get_laporan_by_token(db=db.for_read(laporan_token), token_cookie=laporan_token)
     # Repository SELECT columns now:
     # 0:id_laporan,1:nama_pelapor,2:judul_laporan,3:kontak_pelapor,
     # 4:email_pelapor,5:deskripsi,6:tanggal_hilang,7:lokasi_hilang,8:latitude,9:longitude,
@@ -108,6 +203,180 @@ async def get_my_laporan_handler(
     ]
 
 
+MAX_CHANGES_LIMIT = 1000
+
+
+def _parse_cursor(since: str) -> Tuple[int, int]:
+    """Cursor 'xid:id_change' as returned in `next`; '0' means from the start."""
+    try:
+        if since == "0":
+            return 0, 0
+        xid, id_change = since.split(":", 1)
+        cursor = int(xid), int(id_change)
+    except ValueError:
+        cursor = (-1, -1)
+    if cursor[0] < 0 or cursor[1] < 0:
+        raise HTTPException(status_code=400, detail="Invalid since cursor")
+    return cursor
+
+
+async def get_changes_handler(
+    since: Optional[str] = None,
+    limit: int = 500,
+    mine: bool = False,
+    laporan_token: Optional[str] = Cookie(None),
+    db: Database = None,
+) -> dict:
+    """
+    GET /laporan/changes
+    Laporan created, changed status or archived after the `since` cursor.
+    Without `since` only the current cursor is returned: take it, load the
+    full list, then poll with it. `reset` means the cursor is older than the
+    retained log and the client must reload the full list.
+    """
+    limit = max(1, min(limit, MAX_CHANGES_LIMIT))
+    token_cookie = None
+    if mine:
+        if not laporan_token:
+            raise HTTPException(status_code=401, detail="Unauthorized - missing laporan_token cookie")
+        try:
+            token_cookie = str(UUID(laporan_token))
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Unauthorized - invalid laporan_token cookie")
+    read_db = db.for_read(laporan_token)
+
+    cursor = _parse_cursor(since) if since is not None else None
+    reset = False
+    if cursor is not None:
+        # Any cursor below the purge horizon, idle-poll "xmin:0" ones
+        # included, may have missed purged changes
+        horizon = await laporan_repo.get_changes_horizon(read_db)
+        reset = horizon is not None and cursor < horizon
+    if cursor is None or reset:
+        xmin, _ = await laporan_repo.list_changes(read_db, 0, 0, token_cookie, limit=0)
+        return {"changes": [], "next": f"{xmin}:0", "has_more": False, "reset": reset}
+
+    xmin, rows = await laporan_repo.list_changes(read_db, cursor[0], cursor[1], token_cookie, limit=limit)
+    has_more = len(rows) == limit
+    if has_more:
+        next_cursor = (rows[-1][0], rows[-1][1])
+    else:
+        # Everything below xmin has been seen; never move the cursor backwards
+        next_cursor = max(cursor, (xmin, 0))
+    return {
+        "changes": [
+            {
+                "id_laporan": r[2],
+                "change": r[3],
+                "status": r[4],
+                "changed_at": r[5].isoformat() if r[5] else None,
+            }
+            for r in rows
+        ],
+        "next": f"{next_cursor[0]}:{next_cursor[1]}",
+        "has_more": has_more,
+        "reset": False,
+    }
+
+
+CLUSTER_STATUSES = {"Aktif", "Selesai", "Dihapus"}
+
+
+def _parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """'min_lon,min_lat,max_lon,max_lat' (the order map libraries use)."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if not (-180.0 <= min_lon < max_lon <= 180.0 and -90.0 <= min_lat < max_lat <= 90.0):
+        raise HTTPException(status_code=400, detail="bbox out of range or min >= max")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+async def get_clusters_handler(
+    bbox: str,
+    zoom: int,
+    status: str = "Aktif",
+    id_kategori: Optional[int] = None,
+    db: Database = None,
+) -> dict:
+    """
+    GET /laporan/clusters
+    Aggregated laporan per grid cell in the viewport, from the laporan_tiles
+    aggregate. The number of clusters is bounded by cluster_repo.MAX_CELLS.
+    """
+    box = _parse_bbox(bbox)
+    if zoom < 0 or zoom > 22:
+        raise HTTPException(status_code=400, detail="zoom must be between 0 and 22")
+    statuses = [s.strip() for s in status.split(",") if s.strip()]
+    if not statuses or any(s not in CLUSTER_STATUSES for s in statuses):
+        raise HTTPException(status_code=400, detail=f"status must be one or more of {sorted(CLUSTER_STATUSES)}")
+
+    level = cluster_repo.choose_level(box, zoom)
+    tiles = cluster_repo.tile_range(box, level)
+    rows = await cluster_repo.get_clusters(db.for_read(), level, tiles, statuses, id_kategori)
+    return {
+        "level": level,
+        "clusters": [
+            {
+                "id": f"{level}/{r[0]}/{r[1]}",
+                "count": r[2],
+                "latitude": r[3],
+                "longitude": r[4],
+                "top_kategori": {"id_kategori": r[5] or None, "nama_kategori": r[6]},
+                "bounds": cluster_repo.tile_bounds(level, r[0], r[1]),
+            }
+            for r in rows
+        ],
+    }
+
+
+async def similar_photos_handler(
+    id_laporan: int, max_distance: int = 10, limit: int = 20, db: Database = None
+) -> dict:
+    """
+    GET /laporan/{id_laporan}/similar-photos
+    Other laporan with a near-identical photo, from the in-memory hash index.
+    """
+    if max_distance < 0 or max_distance > photo_hash.MAX_DISTANCE:
+        raise HTTPException(status_code=400, detail=f"max_distance must be between 0 and {photo_hash.MAX_DISTANCE}")
+    limit = max(1, min(limit, 100))
+    read_db = db.for_read()
+
+    row = await foto_hash_repo.get_laporan_photo(read_db, id_laporan)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Laporan not found")
+    foto_url, phash = row[0], row[1]
+    if not foto_url or phash is None:
+        # No photo, or uploaded before fingerprinting / without Pillow
+        return {"id_laporan": id_laporan, "foto_url": foto_url, "fingerprinted": False, "matches": []}
+
+    await photo_hash.index.refresh(read_db)
+    distances = {
+        url: distance
+        for url, distance in photo_hash.index.search(phash, max_distance)
+        if url != foto_url
+    }
+    matches = []
+    if distances:
+        rows = await foto_hash_repo.list_laporan_by_foto(read_db, list(distances), id_laporan)
+        matches = sorted(
+            (
+                {
+                    "id_laporan": r["id_laporan"],
+                    "judul_laporan": r["judul_laporan"],
+                    "foto_url": r["foto_url"],
+                    "status": r["status"],
+                    "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+                    "distance": distances[r["foto_url"]],
+                }
+                for r in rows
+            ),
+            key=lambda m: (m["distance"], -m["id_laporan"]),
+        )[:limit]
+    return {"id_laporan": id_laporan, "foto_url": foto_url, "fingerprinted": True, "matches": matches}
+
+
 async def mark_found_handler(
     id_laporan: int, laporan_token: Optional[str] = Cookie(None), db: Database = None
 ) -> dict:
@@ -118,11 +387,16 @@ async def mark_found_handler(
     if not laporan_token:
         raise HTTPException(status_code=401, detail="Unauthorized - missing laporan_token cookie")
 
-    row = await laporan_repo.mark_laporan_found(
-        db=db, id_laporan=id_laporan, token_cookie=laporan_token
-    )
-    if not row:
-        raise HTTPException(status_code=404, detail="Laporan not found or unauthorized")
+    async with db.transaction() as tx:
+        row = await laporan_repo.mark_laporan_found(
+            db=tx, id_laporan=id_laporan, token_cookie=laporan_token
+        )
+        if not row:
+            raise HTTPException(status_code=404, detail="Laporan not found or unauthorized")
+        # Reporter notification commits with the status change
+        await outbox_repo.enqueue_status_change(tx, [row[0]], "found", outbox.CHANNELS)
+    db.mark_write(laporan_token)
+    outbox.dispatcher.wake()
 
     return {"id_laporan": row[0], "status": row[1]}
 
@@ -138,13 +412,16 @@ async def delete_laporan_handler(
     if not admin:
         raise HTTPException(status_code=403, detail="Admin access required to delete laporan")
 
-    row = await laporan_repo.delete_laporan(db=db, id_laporan=id_laporan)
-    if not row:
-        raise HTTPException(status_code=404, detail="Laporan not found")
+    async with db.transaction() as tx:
+        row = await laporan_repo.delete_laporan(db=tx, id_laporan=id_laporan)
+        if not row:
+            raise HTTPException(status_code=404, detail="Laporan not found")
+        await outbox_repo.enqueue_status_change(tx, [row[0]], "deleted", outbox.CHANNELS)
+    outbox.dispatcher.wake()
 
     # Create notification
-    await notifikasi_repo.create_notifikasi(
-        db=db,
+    await notifikasi_writer.writer.submit(
+        db,
         id_laporan=id_laporan,
         pesan="Laporan dihapus oleh admin",
     )
@@ -154,17 +431,28 @@ async def delete_laporan_handler(
 
 async def get_laporan_by_id_handler(
     id_laporan: int,
-    db: Database = None
+    db: Database = None,
+    laporan_token: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> LaporanDetail:
     """
     GET /laporan/{id_laporan}
-    Get a single laporan by ID with full details.
+    Get a single laporan by ID with full details (or only `fields`).
     """
-    row = await laporan_repo.get_laporan_by_id(db=db, id_laporan=id_laporan)
+    selected = _parse_fields(fields)
+    row = await laporan_repo.get_laporan_by_id(
+        db=db.for_read(laporan_token), id_laporan=id_laporan, fields=selected
+    )
     
     if not row:
         raise HTTPException(status_code=404, detail="Laporan not found")
     
+    if selected:
+        return _sparse_laporan(row, selected)
+    return _laporan_detail(row)
+
+
+def _laporan_detail(row) -> LaporanDetail:
     # Same column mapping as list_laporan_handler
     return LaporanDetail(
         id_laporan=row[0],
@@ -184,6 +472,42 @@ async def get_laporan_by_id_handler(
     )
 
 
+def _parse_ids(ids: str) -> List[int]:
+    """'1,2,3' -> [1, 2, 3], duplicates dropped, order kept."""
+    try:
+        parsed = [int(v) for v in ids.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="ids is required")
+    if len(parsed) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IDS} ids per request")
+    return parsed
+
+
+async def get_laporan_batch_handler(
+    ids: str,
+    db: Database = None,
+    laporan_token: Optional[str] = None,
+    fields: Optional[str] = None
+) -> dict:
+    """
+    GET /laporan/batch?ids=1,2,3
+    Several laporan (same fields as GET /laporan/{id}) in one query, in the
+    order requested; ids that do not exist are listed in `missing`.
+    """
+    wanted = _parse_ids(ids)
+    selected = _parse_fields(fields)
+    rows = await laporan_repo.get_laporan_by_ids(db=db.for_read(laporan_token), ids=wanted, fields=selected)
+    by_id = {r["id_laporan"]: r for r in rows}
+    to_out = (lambda r: _sparse_laporan(r, selected)) if selected else _laporan_detail
+    return {
+        "laporan": [to_out(by_id[i]) for i in wanted if i in by_id],
+        "missing": [i for i in wanted if i not in by_id],
+    }
+
+
 async def logout_handler(response: Response) -> dict:
     """
     POST /laporan/logout
@@ -195,25 +519,49 @@ async def logout_handler(response: Response) -> dict:
 
 
 async def list_laporan_handler(
-    status: Optional[str] = None,
-    id_kategori: Optional[int] = None,
+    status: Optional[List[str]] = None,
+    id_kategori: Optional[List[int]] = None,
     id_provinsi: Optional[int] = None,
     id_kota: Optional[int] = None,
+    tanggal_hilang_from: Optional[date] = None,
+    tanggal_hilang_to: Optional[date] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    has_foto: Optional[bool] = None,
+    sort: str = "created_at",
     limit: int = 100,
-    db: Database = None
+    db: Database = None,
+    laporan_token: Optional[str] = None,
+    fields: Optional[str] = None
 ) -> List[LaporanDetail]:
     """
     GET /laporan
     List laporan (admin view) with optional filters.
+    With `fields` each item has only those fields.
     """
+    if sort not in laporan_repo.LIST_SORTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort must be one of: {', '.join(laporan_repo.LIST_SORTS)}",
+        )
+    selected = _parse_fields(fields)
     rows = await laporan_repo.list_laporan(
-        db=db,
+        db=db.for_read(laporan_token),
         status=status,
         id_kategori=id_kategori,
         id_provinsi=id_provinsi,
         id_kota=id_kota,
-        limit=limit
+        tanggal_hilang_from=tanggal_hilang_from,
+        tanggal_hilang_to=tanggal_hilang_to,
+        created_from=created_from,
+        created_to=created_to,
+        has_foto=has_foto,
+        sort=sort,
+        limit=limit,
+        fields=selected
     )
+    if selected:
+        return [_sparse_laporan(r, selected) for r in rows]
     # Repository returns columns in this order:
     # 0:id_laporan, 1:nama_pelapor, 2:judul_laporan, 3:kontak_pelapor, 4:email_pelapor, 
     # 5:deskripsi, 6:tanggal_hilang, 7:lokasi_hilang, 8:latitude, 9:longitude,
@@ -238,3 +586,97 @@ async def list_laporan_handler(
         )
         for r in rows
     ]
+
+
+def _parse_bulk(body: bytes, fmt: str, resolver) -> Tuple[List[tuple], List[dict], int, int]:
+    """
+    Decode, parse and validate an import (runs in a thread). Returns
+    (records in BULK_COLUMNS order, first BULK_MAX_ERRORS errors, failed, received).
+    """
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Import must be UTF-8 encoded")
+
+    records = []
+    errors = []
+    failed = 0
+    received = 0
+    try:
+        for line_no, data, parse_error in bulk_import.iter_rows(text, fmt):
+            received += 1
+            if received > BULK_MAX_ROWS:
+                raise HTTPException(status_code=413, detail=f"Import has more than {BULK_MAX_ROWS} rows")
+            if parse_error:
+                row_errors = [{"field": None, "message": parse_error}]
+            else:
+                laporan, row_errors = bulk_import.validate_row(data, resolver)
+                if laporan is not None:
+                    id_kota = laporan.id_kota
+                    if id_kota is None:
+                        id_kota = geocoder.lookup(laporan.latitude, laporan.longitude)
+                    records.append(tuple(
+                        id_kota if c == "id_kota" else getattr(laporan, c)
+                        for c in laporan_repo.BULK_COLUMNS
+                    ))
+                    continue
+            failed += 1
+            if len(errors) < BULK_MAX_ERRORS:
+                errors.append({"row": line_no, "errors": row_errors})
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"Malformed CSV: {e}")
+    return records, errors, failed, received
+
+
+async def bulk_import_handler(
+    body: bytes,
+    content_type: Optional[str] = None,
+    fmt: Optional[str] = None,
+    notify: str = "each",
+    dry_run: bool = False,
+    return_ids: bool = False,
+    source: Optional[str] = None,
+    db: Database = None,
+) -> dict:
+    """
+    POST /laporan/bulk
+    Validate a CSV / NDJSON batch and insert the valid rows in one transaction.
+    Invalid rows are skipped and reported by line number.
+    """
+    fmt = fmt or bulk_import.detect_format(content_type)
+    if fmt not in bulk_import.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(bulk_import.FORMATS)}")
+    if notify not in BULK_NOTIFY_MODES:
+        raise HTTPException(status_code=400, detail=f"notify must be one of: {', '.join(BULK_NOTIFY_MODES)}")
+    if len(body) > BULK_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Import larger than {BULK_MAX_BYTES} bytes")
+    resolver = bulk_import.NameResolver(
+        await laporan_repo.list_kategori_names(db.for_read()),
+        await laporan_repo.list_wilayah_names(db.for_read()),
+    )
+    # Parsing and validating up to BULK_MAX_ROWS rows takes seconds of CPU:
+    # keep it off the event loop so the worker goes on serving other requests
+    records, errors, failed, received = await asyncio.to_thread(_parse_bulk, body, fmt, resolver)
+
+    ids = []
+    if records and not dry_run:
+        summary = f"laporan baru dari import {source}" if source else "laporan baru dari import massal"
+        with metrics.JOB_DURATION.time("bulk_import"):
+            ids = await laporan_repo.bulk_create_laporan(
+                db, records, notify=notify, summary_text=summary
+            )
+
+    result = {
+        "success": True,
+        "format": fmt,
+        "dry_run": dry_run,
+        "received": received,
+        "valid": len(records),
+        "created": len(ids),
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
+    if return_ids:
+        result["ids"] = ids
+    return result
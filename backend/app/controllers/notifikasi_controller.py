@@ -4,18 +4,48 @@ Notifikasi controller: FastAPI endpoint handlers for notification operations
 from fastapi import HTTPException
 from typing import Optional, List
 from db.connection import Database
-from models.notifikasi import NotifikasiOut
+from models.notifikasi import LaporanSummary, NotifikasiExpandedOut, NotifikasiOut
 from repositories import notifikasi_repo
 
 
+EXPANDABLE = ("laporan",)
+
+
 async def list_notifikasi_handler(
-    unread_only: Optional[bool] = False, db: Database = None
+    unread_only: Optional[bool] = False, expand: Optional[str] = None, db: Database = None
 ) -> List[NotifikasiOut]:
     """
     GET /notifikasi
     List notifications for admin.
+    expand=laporan adds each notifikasi's laporan summary (same query).
     """
-    rows = await notifikasi_repo.list_notifikasi(db=db, unread_only=unread_only)
+    expanded = [e.strip() for e in (expand or "").split(",") if e.strip()]
+    if any(e not in EXPANDABLE for e in expanded):
+        raise HTTPException(status_code=400, detail=f"expand must be one of {list(EXPANDABLE)}")
+    if "laporan" in expanded:
+        rows = await notifikasi_repo.list_notifikasi(
+            db=db.for_read(), unread_only=unread_only, expand_laporan=True
+        )
+        return [
+            NotifikasiExpandedOut(
+                id_notifikasi=r[0],
+                id_laporan=r[1],
+                pesan=r[2],
+                status_baca=r[3],
+                created_at=str(r[4]) if r[4] else None,
+                laporan=LaporanSummary(
+                    id_laporan=r[1],
+                    judul_laporan=r[5],
+                    status=r[6],
+                    kategori_nama=r[7],
+                    kota=r[8],
+                    foto_url=r[9],
+                ) if r[5] is not None else None,
+            )
+            for r in rows
+        ]
+
+    rows = await notifikasi_repo.list_notifikasi(db=db.for_read(), unread_only=unread_only)
     return [
         NotifikasiOut(
             id_notifikasi=r[0],
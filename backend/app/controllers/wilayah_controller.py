@@ -0,0 +1,40 @@
+"""
+Wilayah controller: in-memory wilayah caches (search index, reverse geocoder)
+"""
+from typing import List, Optional
+from fastapi import HTTPException
+
+from db.connection import Database
+from repositories import laporan_repo
+from utils import geocoder, wilayah_index
+
+
+async def load_wilayah_caches(db: Database) -> dict:
+    """
+    (Re)build the wilayah search index and the reverse geocoder from one read
+    of the `wilayah` table. Called at startup and after kab/kota changes.
+    """
+    rows = await laporan_repo.list_wilayah_names(db)
+    index = wilayah_index.WilayahIndex(rows)
+    wilayah_index.set_index(index)
+    loaded = geocoder.build(rows, geocoder.read_centroids())
+    geocoder.set_geocoder(loaded)
+    return {"wilayah": len(rows), "search_entries": len(index), "geocoder_points": loaded.size}
+
+
+async def search_wilayah_handler(
+    q: str, limit: int = 10, type: Optional[str] = None, db: Database = None
+) -> List[dict]:
+    """
+    GET /wilayah/search?q=
+    Autocomplete over provinsi and kab/kota names, served from memory.
+    """
+    if type not in (None, "kota", "provinsi"):
+        raise HTTPException(status_code=400, detail="type must be 'kota' or 'provinsi'")
+    index = wilayah_index.get_index()
+    if index is None:
+        # Not loaded at startup (database was unavailable): build it now
+        rows = await laporan_repo.list_wilayah_names(db.for_read())
+        index = wilayah_index.WilayahIndex(rows)
+        wilayah_index.set_index(index)
+    return index.search(q, limit=limit, kind=type)
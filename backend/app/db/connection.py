@@ -1,39 +1,519 @@
 import os
+import sys
+import json
+import time
+import asyncio
+import contextlib
+import contextvars
+import logging
 import asyncpg
-from typing import Any, Optional, Sequence
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Sequence
 from dotenv import load_dotenv
 
+from db import queries
+from db.query_log import QueryLog
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Read replica (optional, see Database.for_read)
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "2"))
+REPLICA_CONNECT_TIMEOUT = float(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+# Cookie carrying the wall-clock time of the client's last write, so any
+# worker can keep that client's reads on the primary (ReadYourWritesMiddleware)
+WRITE_COOKIE = "db_wrote_at"
+
+# Per request: {"wrote_at": time from the cookie or this request's write, "set": bool}
+_request_writes: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "request_writes", default=None
+)
+
+# Plan every execution of a prepared statement for its actual parameters.
+# Registered list queries use `($n IS NULL OR ...)` filters; under the default
+# `auto` mode Postgres may switch them to one generic plan after five
+# executions, which cannot use the filter indexes. Planning these statements
+# is cheap next to a bad plan; prepare still saves the parse/describe trip.
+PLAN_CACHE_MODE = os.getenv("DB_PLAN_CACHE_MODE", "force_custom_plan")
+
+# Rows fetched per round trip by Database.cursor / Transaction.cursor
+CURSOR_PREFETCH = int(os.getenv("DB_CURSOR_PREFETCH", "500"))
+
+# Errors meaning the server could not be reached, as opposed to a failing query
+_CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+)
+
+REPLICA_LAG = queries.register("db.replica_lag", """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::float8
+""")
+
+
+def _query_name(query: str, frame) -> str:
+    """
+    Name used as the metrics label and as the caller in the slow-query log:
+    the registry name for registered queries (e.g. `laporan.list_by_kota`),
+    otherwise the repository function that issued it (`stats_repo.rebuild_laporan_stats`).
+    """
+    name = getattr(query, "name", None)
+    if name:
+        return name
+    module = frame.f_globals.get("__name__", "")
+    return f"{module.rsplit('.', 1)[-1]}.{frame.f_code.co_name}"
+
+
+def _affected_rows(status: str) -> int:
+    # asyncpg returns command tags such as "UPDATE 3" or "INSERT 0 1"
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError):
+        return 0
+
 
 class Database:
     def __init__(self):
         # Load DATABASE_URL from environment (set in .env file)
         self.dsn = os.environ.get("DATABASE_URL")
         self.pool: Optional[asyncpg.pool.Pool] = None
+        self.query_log = QueryLog()
+        self._explain_tasks = set()
+
+        # Optional streaming replica for read-heavy endpoints
+        self.replica_dsn = os.environ.get("DATABASE_REPLICA_URL")
+        self.replica_pool: Optional[asyncpg.pool.Pool] = None
+        self.replica_healthy = False
+        self.replica_lag = 0.0
+        self._replica_task: Optional[asyncio.Task] = None
+        # laporan_token -> monotonic time of that reporter's last write
+        self._recent_writes: Dict[str, float] = {}
+
+    async def _create_pool(self, dsn: str, name: str, **kwargs) -> asyncpg.pool.Pool:
+        async def init(conn: asyncpg.Connection):
+            await self._init_connection(conn, name)
+
+        return await asyncpg.create_pool(
+            dsn=dsn,
+            min_size=1,
+            max_size=5,
+            init=init,
+            # Room for every registered statement plus ad-hoc ones
+            statement_cache_size=max(100, 2 * len(queries.all_queries())),
+            server_settings={"plan_cache_mode": PLAN_CACHE_MODE},
+            **kwargs,
+        )
 
     async def connect(self):
         if not self.dsn:
             raise RuntimeError("DATABASE_URL environment variable not set")
-        self.pool = await asyncpg.create_pool(dsn=self.dsn, min_size=1, max_size=5)
+        self.pool = await self._create_pool(self.dsn, "primary")
+        metrics.track_pool(self.pool)
+
+        if self.replica_dsn:
+            # A replica that is down at startup must not block the app: the
+            # monitor keeps retrying and reads stay on the primary meanwhile.
+            self._replica_task = asyncio.get_running_loop().create_task(self._monitor_replica())
 
     async def disconnect(self):
+        if self._replica_task:
+            self._replica_task.cancel()
+        if self.replica_pool:
+            await self.replica_pool.close()
         if self.pool:
             await self.pool.close()
 
-    async def fetch(self, query: str, *args) -> Sequence[asyncpg.Record]:
+    async def _init_connection(self, conn: asyncpg.Connection, pool_name: str = "primary"):
+        """Pool `init` hook: prepare the registered statements on each new connection."""
+        with metrics.DB_CONNECTION_INIT.time(pool_name):
+            prepared = await queries.prepare_all(conn)
+        logger.debug("Prepared %d statements on new %s connection", prepared, pool_name)
+
+    # ------------------------------------------------------------------
+    # Read replica routing
+    # ------------------------------------------------------------------
+
+    async def _monitor_replica(self):
+        """Track replica health and replication lag; (re)create the pool when needed."""
+        while True:
+            try:
+                if self.replica_pool is None:
+                    self.replica_pool = await self._create_pool(
+                        self.replica_dsn, "replica", timeout=REPLICA_CONNECT_TIMEOUT
+                    )
+                    metrics.track_pool(self.replica_pool, "replica")
+                async with self.replica_pool.acquire(timeout=REPLICA_CONNECT_TIMEOUT) as conn:
+                    self.replica_lag = await conn.fetchval(REPLICA_LAG, timeout=REPLICA_CONNECT_TIMEOUT) or 0.0
+                if not self.replica_healthy:
+                    logger.info("Read replica available (lag %.1fs)", self.replica_lag)
+                self.replica_healthy = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.replica_healthy:
+                    logger.warning("Read replica unavailable, reading from primary: %s", e)
+                self.replica_healthy = False
+            metrics.DB_REPLICA_UP.set(1 if self.replica_healthy else 0)
+            metrics.DB_REPLICA_LAG.set(self.replica_lag)
+            await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+
+    def replica_available(self) -> bool:
+        return (
+            self.replica_pool is not None
+            and self.replica_healthy
+            and self.replica_lag <= REPLICA_MAX_LAG_SECONDS
+        )
+
+    def mark_write(self, token: Optional[str]):
+        """
+        Record that the reporter identified by `token` just wrote, so their reads
+        stay on the primary for the stickiness window (read-your-writes).
+
+        The per-process map only covers later requests served by this worker;
+        under ReadYourWritesMiddleware the write time is also sent back as the
+        WRITE_COOKIE cookie, which every worker honours.
+        """
+        if not self.replica_dsn:
+            return
+        holder = _request_writes.get()
+        if holder is not None:
+            holder["wrote_at"] = time.time()
+            holder["set"] = True
+        if not token:
+            return
+        now = time.monotonic()
+        self._recent_writes[str(token)] = now
+        if len(self._recent_writes) > 10000:
+            horizon = now - max(REPLICA_STICKY_SECONDS, REPLICA_MAX_LAG_SECONDS)
+            self._recent_writes = {t: at for t, at in self._recent_writes.items() if at > horizon}
+
+    def _is_sticky(self, token: Optional[str]) -> bool:
+        # Never shorter than the current replication lag
+        window = max(REPLICA_STICKY_SECONDS, self.replica_lag + 1.0)
+        holder = _request_writes.get()
+        if holder is not None and holder["wrote_at"] is not None:
+            if time.time() - holder["wrote_at"] < window:
+                return True
+        if not token:
+            return False
+        wrote_at = self._recent_writes.get(str(token))
+        if wrote_at is None:
+            return False
+        if time.monotonic() - wrote_at < window:
+            return True
+        self._recent_writes.pop(str(token), None)
+        return False
+
+    def _read_target(self, token: Optional[str]):
+        if self.replica_pool is None:
+            return self.pool, "no_replica"
+        if not self.replica_healthy:
+            return self.pool, "replica_down"
+        if self.replica_lag > REPLICA_MAX_LAG_SECONDS:
+            return self.pool, "lagging"
+        if self._is_sticky(token):
+            return self.pool, "sticky"
+        return self.replica_pool, "replica"
+
+    def for_read(self, token: Optional[str] = None) -> "ReadView":
+        """
+        Read-only view to pass to repository read functions. Calls go to the
+        replica when it is healthy and not lagging, unless this client wrote
+        recently (WRITE_COOKIE, or `token`, the reporter's laporan_token
+        cookie, on this worker); otherwise, and on connection failures, they
+        go to the primary.
+        """
+        return ReadView(self, token)
+
+    async def _read(self, method: str, query: str, args: tuple, name: str, token: Optional[str]) -> Any:
+        pool, reason = self._read_target(token)
+        if pool is self.pool:
+            metrics.DB_READ_ROUTING.inc("primary", reason)
+            return await self._run(method, query, args, name)
+        metrics.DB_READ_ROUTING.inc("replica", reason)
+        try:
+            return await self._run(method, query, args, name, pool=pool)
+        except _CONNECTION_ERRORS as e:
+            logger.warning("Replica read failed, retrying on primary: %s", e)
+            self.replica_healthy = False
+            metrics.DB_READ_ROUTING.inc("primary", "fallback")
+            return await self._run(method, query, args, name)
+
+    async def _run(
+        self, method: str, query: str, args: tuple, name: str,
+        pool: Optional[asyncpg.pool.Pool] = None,
+        conn: Optional[asyncpg.Connection] = None,
+        kwargs: Optional[dict] = None,
+        statement: Optional[str] = None,
+    ) -> Any:
+        """
+        Run `conn.<method>(query, *args, **kwargs)` with metrics and the slow-query
+        log, on `conn` when given (transactions) or else on a connection from `pool`.
+        `statement` is logged instead of `query` when `query` is not SQL (the
+        table of a COPY); such calls are never re-run for EXPLAIN.
+        """
+        pool = pool or self.pool
+        start = time.perf_counter()
+        acquired = start
+        error = None
+        result = None
+        try:
+            if conn is not None:
+                result = await getattr(conn, method)(query, *args, **(kwargs or {}))
+            else:
+                async with pool.acquire() as pooled:
+                    acquired = time.perf_counter()
+                    result = await getattr(pooled, method)(query, *args, **(kwargs or {}))
+        except Exception as e:
+            error = type(e).__name__
+            metrics.DB_QUERY_ERRORS.inc(name)
+            raise
+        finally:
+            if method == "fetch":
+                rows = len(result) if result is not None else 0
+            elif method in ("execute", "copy_records_to_table"):
+                rows = _affected_rows(result)
+            elif method == "executemany":
+                rows = len(args[0]) if error is None else 0
+            else:
+                rows = 0 if result is None else 1
+            # Statements inside a transaction may depend on its state (temp
+            # tables, locks), so they are never re-run for EXPLAIN.
+            explain_pool = None if conn is not None or statement is not None else pool
+            self._observe(statement or query, name, start, acquired, rows, args, error, explain_pool)
+        return result
+
+    def _observe(
+        self, query: str, name: str, start: float, acquired: float, rows: int,
+        args: tuple, error: Optional[str], explain_pool: Optional[asyncpg.pool.Pool],
+    ):
+        elapsed = time.perf_counter() - start
+        metrics.DB_QUERY_DURATION.observe(elapsed, name)
+        metrics.DB_QUERY_ROWS.inc(name, amount=rows)
+
+        entry = self.query_log.record(
+            query, name, elapsed * 1000, rows, (acquired - start) * 1000, args, error
+        )
+        if (
+            entry is not None and error is None and explain_pool is not None
+            and self.query_log.should_explain(query)
+        ):
+            task = asyncio.get_running_loop().create_task(self._explain(explain_pool, query, args, entry))
+            self._explain_tasks.add(task)
+            task.add_done_callback(self._explain_tasks.discard)
+
+    async def _iter_cursor(
+        self, conn: asyncpg.Connection, query: str, args: tuple, name: str, prefetch: int
+    ) -> AsyncIterator[asyncpg.Record]:
+        # Metrics cover the whole iteration, recorded once the cursor is exhausted or closed
+        start = time.perf_counter()
+        rows = 0
+        error = None
+        try:
+            async for record in conn.cursor(query, *args, prefetch=prefetch):
+                rows += 1
+                yield record
+        except Exception as e:
+            error = type(e).__name__
+            metrics.DB_QUERY_ERRORS.inc(name)
+            raise
+        finally:
+            self._observe(query, name, start, start, rows, args, error, None)
+
+    async def _cursor(self, query: str, args: tuple, name: str, prefetch: int) -> AsyncIterator[asyncpg.Record]:
         async with self.pool.acquire() as conn:
-            return await conn.fetch(query, *args)
+            # Server-side cursors only live inside a transaction
+            async with conn.transaction(readonly=True):
+                async for record in self._iter_cursor(conn, query, args, name, prefetch):
+                    yield record
+
+    async def _explain(self, pool: asyncpg.pool.Pool, query: str, args: tuple, entry: dict):
+        """Attach an EXPLAIN (ANALYZE, BUFFERS) plan to a sampled slow-query entry."""
+        try:
+            async with pool.acquire() as conn:
+                plan = await conn.fetchval(
+                    "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, *args
+                )
+            entry["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+        except Exception as e:
+            logger.info("EXPLAIN capture failed for %s: %s", entry.get("caller"), e)
+
+    async def fetch(self, query: str, *args) -> Sequence[asyncpg.Record]:
+        return await self._run("fetch", query, args, _query_name(query, sys._getframe(1)))
 
     async def fetchrow(self, query: str, *args) -> Optional[asyncpg.Record]:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow(query, *args)
+        return await self._run("fetchrow", query, args, _query_name(query, sys._getframe(1)))
 
     async def fetchval(self, query: str, *args) -> Any:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval(query, *args)
+        return await self._run("fetchval", query, args, _query_name(query, sys._getframe(1)))
 
     async def execute(self, query: str, *args) -> str:
+        return await self._run("execute", query, args, _query_name(query, sys._getframe(1)))
+
+    async def executemany(self, query: str, args: Iterable[Sequence]) -> None:
+        """Run `query` once per argument tuple, pipelined on a single connection."""
+        args = list(args)
+        await self._run("executemany", query, (args,), _query_name(query, sys._getframe(1)))
+
+    async def copy_records_to_table(
+        self, table_name: str, records: Iterable[Sequence],
+        columns: Optional[Sequence[str]] = None, schema_name: Optional[str] = None,
+    ) -> int:
+        """COPY `records` into `table_name`. Returns the number of rows copied."""
+        status = await self._run(
+            "copy_records_to_table", table_name, (), f"copy.{table_name}",
+            kwargs={"records": records, "columns": columns, "schema_name": schema_name},
+            statement=f"COPY {table_name}",
+        )
+        return _affected_rows(status)
+
+    def cursor(self, query: str, *args, prefetch: int = CURSOR_PREFETCH) -> AsyncIterator[asyncpg.Record]:
+        """
+        Iterate a large SELECT with a server-side cursor, `prefetch` rows per
+        round trip, instead of materialising the whole result:
+
+            async for row in db.cursor(SQL, arg):
+                ...
+
+        Holds one pooled connection (in a read-only transaction) until the loop ends.
+        """
+        return self._cursor(query, args, _query_name(query, sys._getframe(1)), prefetch)
+
+    @contextlib.asynccontextmanager
+    async def transaction(
+        self, isolation: Optional[str] = None, readonly: bool = False
+    ) -> AsyncIterator["Transaction"]:
+        """
+        Run several statements on one pooled connection in one transaction:
+
+            async with db.transaction() as tx:
+                row = await laporan_repo.create_laporan(tx, ...)
+                await notifikasi_repo.create_notifikasi(tx, ...)
+
+        The yielded Transaction has the same methods as Database, so repository
+        functions accept it in place of `db`. Commits on exit, rolls back if the
+        block raises.
+        """
         async with self.pool.acquire() as conn:
-            return await conn.execute(query, *args)
+            async with conn.transaction(isolation=isolation, readonly=readonly):
+                yield Transaction(self, conn)
+
+
+class Transaction:
+    """
+    Connection-bound view over Database (see Database.transaction). Every call
+    runs on the transaction's connection, with the usual metrics and logging.
+    """
+
+    def __init__(self, db: Database, conn: asyncpg.Connection):
+        self._db = db
+        self.connection = conn
+
+    async def fetch(self, query: str, *args) -> Sequence[asyncpg.Record]:
+        return await self._db._run("fetch", query, args, _query_name(query, sys._getframe(1)), conn=self.connection)
+
+    async def fetchrow(self, query: str, *args) -> Optional[asyncpg.Record]:
+        return await self._db._run("fetchrow", query, args, _query_name(query, sys._getframe(1)), conn=self.connection)
+
+    async def fetchval(self, query: str, *args) -> Any:
+        return await self._db._run("fetchval", query, args, _query_name(query, sys._getframe(1)), conn=self.connection)
+
+    async def execute(self, query: str, *args) -> str:
+        return await self._db._run("execute", query, args, _query_name(query, sys._getframe(1)), conn=self.connection)
+
+    async def executemany(self, query: str, args: Iterable[Sequence]) -> None:
+        args = list(args)
+        await self._db._run(
+            "executemany", query, (args,), _query_name(query, sys._getframe(1)), conn=self.connection
+        )
+
+    async def copy_records_to_table(
+        self, table_name: str, records: Iterable[Sequence],
+        columns: Optional[Sequence[str]] = None, schema_name: Optional[str] = None,
+    ) -> int:
+        status = await self._db._run(
+            "copy_records_to_table", table_name, (), f"copy.{table_name}", conn=self.connection,
+            kwargs={"records": records, "columns": columns, "schema_name": schema_name},
+            statement=f"COPY {table_name}",
+        )
+        return _affected_rows(status)
+
+    def cursor(self, query: str, *args, prefetch: int = CURSOR_PREFETCH) -> AsyncIterator[asyncpg.Record]:
+        return self._db._iter_cursor(
+            self.connection, query, args, _query_name(query, sys._getframe(1)), prefetch
+        )
+
+
+class ReadView:
+    """
+    Read-only facade over Database (see Database.for_read). Exposes the same
+    fetch methods, so repository read functions accept it in place of `db`.
+    """
+
+    def __init__(self, db: Database, token: Optional[str] = None):
+        self._db = db
+        self._token = token
+
+    async def fetch(self, query: str, *args) -> Sequence[asyncpg.Record]:
+        return await self._db._read("fetch", query, args, _query_name(query, sys._getframe(1)), self._token)
+
+    async def fetchrow(self, query: str, *args) -> Optional[asyncpg.Record]:
+        return await self._db._read("fetchrow", query, args, _query_name(query, sys._getframe(1)), self._token)
+
+    async def fetchval(self, query: str, *args) -> Any:
+        return await self._db._read("fetchval", query, args, _query_name(query, sys._getframe(1)), self._token)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware carrying read-your-writes stickiness across workers:
+    reads the WRITE_COOKIE cookie into the request context for
+    Database._is_sticky, and sets it on the response when the request called
+    Database.mark_write. Wall-clock based, so hosts need roughly synced clocks.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _cookie(scope) -> Optional[float]:
+        for name, value in scope.get("headers", ()):
+            if name != b"cookie":
+                continue
+            for part in value.decode("latin-1").split(";"):
+                key, _, raw = part.strip().partition("=")
+                if key == WRITE_COOKIE:
+                    try:
+                        return float(raw)
+                    except ValueError:
+                        return None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        holder = {"wrote_at": self._cookie(scope), "set": False}
+        reset = _request_writes.set(holder)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and holder["set"]:
+                max_age = int(max(REPLICA_STICKY_SECONDS, REPLICA_MAX_LAG_SECONDS)) + 1
+                cookie = f"{WRITE_COOKIE}={holder['wrote_at']:.3f}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_writes.reset(reset)
@@ -0,0 +1,95 @@
+"""
+Named query registry.
+
+Repositories register their SQL once at import time:
+
+    LIST_BY_TOKEN = queries.register("laporan.list_by_token", \"\"\"SELECT ...\"\"\")
+
+and pass the returned `Query` to `db.fetch(...)` like a plain string. Every
+registered statement is prepared on each new pooled connection (pool `init`
+hook), so the first request served by a cold connection skips the
+parse/plan/describe round trip, and the fixed query texts keep asyncpg's
+statement cache and Postgres plan reuse effective. The registry name is also
+used as the `query` label in metrics and the slow-query log.
+"""
+import logging
+import textwrap
+from typing import Dict, List
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+
+class Query(str):
+    """SQL text that also carries its registry name."""
+    name: str
+
+    def __new__(cls, name: str, sql: str):
+        obj = super().__new__(cls, textwrap.dedent(sql).strip())
+        obj.name = name
+        return obj
+
+
+_REGISTRY: Dict[str, Query] = {}
+
+
+def register(name: str, sql: str) -> Query:
+    """Register a single SQL statement under a unique name."""
+    query = Query(name, sql)
+    existing = _REGISTRY.get(name)
+    if existing is not None and existing != query:
+        raise ValueError(f"Query '{name}' is already registered with different SQL")
+    _REGISTRY[name] = query
+    return query
+
+
+def get(name: str) -> Query:
+    return _REGISTRY[name]
+
+
+def all_queries() -> List[Query]:
+    return list(_REGISTRY.values())
+
+
+def _is_cached(conn: asyncpg.Connection, query: Query) -> bool:
+    """Whether fetch()/execute() on `conn` will find `query` in its statement cache."""
+    cache = getattr(conn, "_stmt_cache", None)
+    if cache is None:
+        return False
+    # asyncpg keys the cache by (query, record_class, ignore_custom_codec)
+    record_class = conn._protocol.get_record_class()
+    return cache.get((query, record_class, False)) is not None
+
+
+async def prepare_all(conn: asyncpg.Connection) -> int:
+    """
+    Prepare every registered query into the connection's statement cache.
+    Failures (e.g. a table missing before the schema is applied) are logged and
+    skipped; that statement is simply prepared lazily on first use instead.
+    Returns the number of statements prepared.
+    """
+    # Connection.prepare() returns an uncached statement that is closed once
+    # dropped; _prepare(use_cache=True) is what fetch()/execute() look up.
+    # Both are asyncpg internals (requirements.txt pins the tested range), so
+    # the first statement is checked against the cache and warming is skipped,
+    # loudly, if asyncpg no longer stores it where fetch() looks.
+    prepare = getattr(conn, "_prepare", None)
+    if prepare is None:
+        logger.warning("asyncpg Connection._prepare is gone; statements are prepared lazily")
+        return 0
+    prepared = 0
+    for query in _REGISTRY.values():
+        try:
+            await prepare(query, use_cache=True)
+        except asyncpg.PostgresError as e:
+            logger.warning("Could not prepare %s: %s", query.name, e)
+            continue
+        if prepared == 0 and not _is_cached(conn, query):
+            logger.warning(
+                "asyncpg %s statement cache layout changed; statements are prepared lazily",
+                asyncpg.__version__,
+            )
+            return 0
+        prepared += 1
+    return prepared
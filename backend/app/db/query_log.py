@@ -0,0 +1,178 @@
+"""
+Query log: per-fingerprint aggregates and a bounded ring buffer of recent slow queries.
+
+Configured through environment variables:
+- SLOW_QUERY_MS              threshold for the slow log (default 200)
+- SLOW_QUERY_BUFFER          number of slow queries kept in memory (default 200)
+- SLOW_QUERY_EXPLAIN_SAMPLE  fraction of slow read-only queries to re-run with
+                             EXPLAIN (ANALYZE, BUFFERS) (default 0 = disabled)
+"""
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "200"))
+EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0"))
+
+# Upper bounds so a bug producing unique query texts can't grow memory forever
+MAX_FINGERPRINTS = 1000
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_WRITE_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|TRUNCATE|CREATE|ALTER|DROP|COPY)\b", re.I)
+
+_fingerprints: Dict[str, str] = {}
+
+
+def fingerprint(query: str) -> str:
+    """
+    Normalize a query so calls that differ only in literals or whitespace share
+    one fingerprint. Results are memoized per query text.
+    """
+    fp = _fingerprints.get(query)
+    if fp is None:
+        fp = _COMMENT_RE.sub(" ", query)
+        fp = _STRING_RE.sub("?", fp)
+        fp = _NUMBER_RE.sub("?", fp)
+        fp = _IN_LIST_RE.sub("(?)", fp)
+        fp = _SPACE_RE.sub(" ", fp).strip()
+        if len(_fingerprints) < MAX_FINGERPRINTS:
+            _fingerprints[query] = fp
+    return fp
+
+
+def redact(args: tuple) -> List[str]:
+    """Describe query parameters by type only, so values never reach the logs."""
+    out = []
+    for a in args:
+        if a is None:
+            out.append("NULL")
+        elif isinstance(a, (str, bytes, list, tuple)):
+            out.append(f"<{type(a).__name__} len={len(a)}>")
+        else:
+            out.append(f"<{type(a).__name__}>")
+    return out
+
+
+def is_read_only(query: str) -> bool:
+    head = query.lstrip().split(None, 1)[0].upper() if query.strip() else ""
+    return head in ("SELECT", "WITH") and not _WRITE_RE.search(query)
+
+
+class QueryLog:
+    """In-memory query statistics kept by the Database wrapper."""
+
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_MS,
+        buffer_size: int = SLOW_QUERY_BUFFER,
+        explain_sample_rate: float = EXPLAIN_SAMPLE_RATE,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.slow: deque = deque(maxlen=buffer_size)
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def record(
+        self,
+        query: str,
+        caller: str,
+        duration_ms: float,
+        rows: int,
+        pool_wait_ms: float,
+        args: tuple,
+        error: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Update the aggregates for this query. Returns the ring-buffer entry when
+        the query was slow (so a sampled EXPLAIN can be attached to it), else None.
+        """
+        fp = fingerprint(query)
+        agg = self.stats.get(fp)
+        if agg is None:
+            if len(self.stats) >= MAX_FINGERPRINTS:
+                fp = "<other>"
+                agg = self.stats.get(fp)
+            if agg is None:
+                agg = self.stats[fp] = {
+                    "calls": 0, "errors": 0, "rows": 0,
+                    "total_ms": 0.0, "max_ms": 0.0, "pool_wait_ms": 0.0,
+                    "slow": 0, "callers": set(),
+                }
+        agg["calls"] += 1
+        agg["rows"] += rows
+        agg["total_ms"] += duration_ms
+        agg["pool_wait_ms"] += pool_wait_ms
+        if duration_ms > agg["max_ms"]:
+            agg["max_ms"] = duration_ms
+        if error:
+            agg["errors"] += 1
+        if len(agg["callers"]) < 10:
+            agg["callers"].add(caller)
+
+        if duration_ms < self.threshold_ms:
+            return None
+
+        agg["slow"] += 1
+        params = redact(args)
+        entry = {
+            "at": time.time(),
+            "fingerprint": fp,
+            "caller": caller,
+            "duration_ms": round(duration_ms, 2),
+            "pool_wait_ms": round(pool_wait_ms, 2),
+            "rows": rows,
+            "params": params,
+            "error": error,
+            "plan": None,
+        }
+        self.slow.append(entry)
+        logger.warning(
+            "Slow query %.1fms (pool wait %.1fms, rows %d) caller=%s params=%s sql=%s",
+            duration_ms, pool_wait_ms, rows, caller, params, fp,
+        )
+        return entry
+
+    def should_explain(self, query: str) -> bool:
+        return (
+            self.explain_sample_rate > 0
+            and random.random() < self.explain_sample_rate
+            and is_read_only(query)
+        )
+
+    def snapshot(self, limit: int = 50) -> Dict[str, Any]:
+        fingerprints = sorted(self.stats.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain_sample_rate": self.explain_sample_rate,
+            "slow": list(self.slow)[-limit:][::-1],
+            "fingerprints": [
+                {
+                    "fingerprint": fp,
+                    "calls": a["calls"],
+                    "errors": a["errors"],
+                    "slow": a["slow"],
+                    "rows": a["rows"],
+                    "total_ms": round(a["total_ms"], 2),
+                    "mean_ms": round(a["total_ms"] / a["calls"], 3) if a["calls"] else 0.0,
+                    "max_ms": round(a["max_ms"], 2),
+                    "mean_pool_wait_ms": round(a["pool_wait_ms"] / a["calls"], 3) if a["calls"] else 0.0,
+                    "callers": sorted(a["callers"]),
+                }
+                for fp, a in fingerprints[:limit]
+            ],
+        }
+
+    def reset(self):
+        self.slow.clear()
+        self.stats.clear()
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 import sys
 import os
 
@@ -7,10 +8,14 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import asyncio
-from db.connection import Database
+import time
+from db.connection import Database, ReadYourWritesMiddleware
 from db.dependencies import set_db
-from routes import laporan_routes, notifikasi_routes, wilayah, admin_routes, kategori_routes
-from repositories import laporan_repo
+from routes import laporan_routes, notifikasi_routes, wilayah, admin_routes, kategori_routes, metrics_routes
+from repositories import laporan_repo, arsip_repo, idempotency_repo, outbox_repo
+from controllers.wilayah_controller import load_wilayah_caches
+from utils import geocoder, image_spool, notifikasi_writer, outbox, photo_hash, upload_sessions
+from utils import metrics
 
 # Initialize app and database
 app = FastAPI(
@@ -28,51 +33,146 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request counts, status codes and latency histograms (exposed at /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Read-your-writes across workers: the db_wrote_at cookie keeps a client's
+# reads on the primary right after it writes (see Database.for_read)
+app.add_middleware(ReadYourWritesMiddleware)
+
 db = Database()
 set_db(db)  # Make db available globally via dependencies
 
 
+# Startup maintenance (cleanup, archive, backfills) waits this long so a fresh
+# worker serves traffic first instead of blocking on a large UPDATE
+STARTUP_MAINTENANCE_DELAY = float(os.getenv("STARTUP_MAINTENANCE_DELAY", "30"))
+
+_background_tasks = []
+
+
+async def _warm_caches():
+    # Wilayah search index and reverse geocoder (in memory, read-only afterwards)
+    try:
+        loaded = await load_wilayah_caches(db)
+        print(f"[startup] Wilayah caches loaded: {loaded}")
+    except Exception as e:
+        print(f"[startup] Wilayah caches not loaded: {e}")
+    # Similar-photo index (later uploads are picked up incrementally)
+    try:
+        loaded = await photo_hash.index.refresh(db, force=True)
+        print(f"[startup] Photo hash index loaded: {loaded}")
+    except Exception as e:
+        print(f"[startup] Photo hash index not loaded: {e}")
+
+
+async def _cleanup_loop():
+    await asyncio.sleep(STARTUP_MAINTENANCE_DELAY)
+    triggered_by = 'startup'
+    while True:
+        try:
+            with metrics.JOB_DURATION.time("cleanup"):
+                affected = await laporan_repo.cleanup_old_laporan(db, outbox_channels=outbox.CHANNELS)
+            if affected:
+                print(f"[cleanup] Marked {affected} laporan(s) as 'Dihapus'")
+            try:
+                await laporan_repo.record_cleanup_log(db, affected, days=30, triggered_by=triggered_by)
+            except Exception:
+                print(f"[cleanup] Failed to record {triggered_by} cleanup log")
+        except Exception as e:
+            metrics.JOB_FAILURES.inc("cleanup")
+            print(f"[cleanup] Error during cleanup: {e}")
+        # Move 'Dihapus' and old 'Selesai' laporan into laporan_arsip
+        try:
+            with metrics.JOB_DURATION.time("archive"):
+                archived = await arsip_repo.archive_laporan(db)
+            if archived:
+                print(f"[cleanup] Archived {archived} laporan(s)")
+            try:
+                await laporan_repo.record_cleanup_log(
+                    db, archived, days=arsip_repo.ARCHIVE_SELESAI_DAYS, triggered_by='archive:scheduled'
+                )
+            except Exception:
+                print("[cleanup] Failed to record archive log")
+        except Exception as e:
+            metrics.JOB_FAILURES.inc("archive")
+            print(f"[cleanup] Error during archive: {e}")
+        try:
+            expired = await idempotency_repo.delete_expired(db)
+            if expired:
+                print(f"[cleanup] Removed {expired} expired idempotency key(s)")
+        except Exception as e:
+            print(f"[cleanup] Error removing idempotency keys: {e}")
+        try:
+            purged = await outbox_repo.purge_sent(db, outbox.RETENTION_DAYS)
+            if purged:
+                print(f"[cleanup] Removed {purged} sent outbox row(s)")
+        except Exception as e:
+            print(f"[cleanup] Error purging outbox: {e}")
+        try:
+            purged = await image_spool.purge_replicated(db)
+            if purged:
+                print(f"[cleanup] Removed {purged} replicated image(s) from the local spool")
+        except Exception as e:
+            print(f"[cleanup] Error purging image spool: {e}")
+        try:
+            purged = await laporan_repo.purge_changes(db)
+            if purged:
+                print(f"[cleanup] Removed {purged} old laporan change(s)")
+        except Exception as e:
+            print(f"[cleanup] Error purging laporan changes: {e}")
+        # Fill in id_kota for laporan that only have coordinates
+        if geocoder.ready():
+            try:
+                with metrics.JOB_DURATION.time("geocode_backfill"):
+                    scanned, updated = await laporan_repo.backfill_id_kota(db, geocoder.lookup)
+                if updated:
+                    print(f"[cleanup] Geocoded {updated} of {scanned} laporan without kota")
+            except Exception as e:
+                metrics.JOB_FAILURES.inc("geocode_backfill")
+                print(f"[cleanup] Error during geocode backfill: {e}")
+        triggered_by = 'scheduled'
+        # Sleep 24 hours
+        await asyncio.sleep(24 * 60 * 60)
+
+
+async def _upload_gc_loop():
+    # Resumable upload sessions abandoned by their client
+    while True:
+        await asyncio.sleep(upload_sessions.GC_INTERVAL)
+        try:
+            removed = await upload_sessions.sessions.collect_garbage()
+            if removed:
+                print(f"[cleanup] Removed {removed} expired upload session(s)")
+        except Exception as e:
+            print(f"[cleanup] Error removing upload sessions: {e}")
+
+
 @app.on_event("startup")
 async def startup():
     """Initialize database connection on startup"""
     await db.connect()
-    # Run an initial cleanup on startup and schedule daily cleanups
-    try:
-
-        # run one cleanup immediately and record it
-        affected = await laporan_repo.cleanup_old_laporan(db)
-        if affected:
-            print(f"[cleanup] Marked {affected} laporan(s) as 'Dihapus' on startup")
-        try:
-            await laporan_repo.record_cleanup_log(db, affected, days=30, triggered_by='startup')
-        except Exception:
-            # If logging fails, continue (don't block startup)
-            print("[cleanup] Failed to record cleanup log on startup")
-
-        async def _cleanup_loop():
-            while True:
-                try:
-                    affected = await laporan_repo.cleanup_old_laporan(db)
-                    if affected:
-                        print(f"[cleanup] Marked {affected} laporan(s) as 'Dihapus'")
-                    try:
-                        await laporan_repo.record_cleanup_log(db, affected, days=30, triggered_by='scheduled')
-                    except Exception:
-                        print("[cleanup] Failed to record scheduled cleanup log")
-                except Exception as e:
-                    print(f"[cleanup] Error during cleanup: {e}")
-                # Sleep 24 hours
-                await asyncio.sleep(24 * 60 * 60)
-
-        # Schedule background task (doesn't block startup)
-        asyncio.create_task(_cleanup_loop())
-    except Exception as e:
-        print(f"[startup] Cleanup scheduling failed: {e}")
+    notifikasi_writer.writer.start(db)
+    outbox.dispatcher.start(db)
+    os.makedirs(image_spool.SPOOL_DIR, exist_ok=True)
+    image_spool.replicator.start(db)
+    # Everything else runs in the background so the worker is ready as soon
+    # as the pool is open; the wilayah search loads its index on demand until then
+    _background_tasks.append(asyncio.create_task(_warm_caches()))
+    _background_tasks.append(asyncio.create_task(_cleanup_loop()))
+    _background_tasks.append(asyncio.create_task(_upload_gc_loop()))
 
 
 @app.on_event("shutdown")
 async def shutdown():
     """Close database connection on shutdown"""
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+    # Write out buffered notifikasi before the pool goes away
+    await notifikasi_writer.writer.stop()
+    await outbox.dispatcher.stop()
+    await image_spool.replicator.stop()
     await db.disconnect()
 
 
@@ -82,6 +182,10 @@ app.include_router(notifikasi_routes.router)
 app.include_router(wilayah.router)
 app.include_router(admin_routes.router)
 app.include_router(kategori_routes.router)
+app.include_router(metrics_routes.router)
+
+# Spooled uploads (and GitHub fallbacks) until replicated, see utils.image_spool
+app.mount(image_spool.URL_PREFIX, StaticFiles(directory=image_spool.SPOOL_DIR, check_dir=False), name="images")
 
 
 @app.get("/")
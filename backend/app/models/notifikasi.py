@@ -9,3 +9,18 @@ class NotifikasiOut(BaseModel):
     pesan: str
     status_baca: bool
     created_at: Optional[str]
+
+
+class LaporanSummary(BaseModel):
+    """Laporan fields shown next to a notifikasi (GET /notifikasi?expand=laporan)"""
+    id_laporan: int
+    judul_laporan: str
+    status: str
+    kategori_nama: Optional[str] = None
+    kota: Optional[str] = None
+    foto_url: Optional[str] = None
+
+
+class NotifikasiExpandedOut(NotifikasiOut):
+    """Notifikasi with its laporan summary (None if the laporan no longer exists)"""
+    laporan: Optional[LaporanSummary] = None
@@ -4,6 +4,14 @@ Admin repository: database query logic for admin operations
 from typing import Optional
 import asyncpg
 from db.connection import Database
+from db import queries
+
+
+GET_BY_USERNAME = queries.register("admin.get_by_username", """
+    SELECT id_admin, nama_admin, username, password_hash
+    FROM admin
+    WHERE username = $1
+""")
 
 
 async def get_admin_by_username(
@@ -12,12 +20,14 @@ async def get_admin_by_username(
     """
     Retrieve admin by username.
     """
-    query = """
-    SELECT id_admin, nama_admin, username, password_hash
-    FROM admin
-    WHERE username = $1
-    """
-    return await db.fetchrow(query, username)
+    return await db.fetchrow(GET_BY_USERNAME, username)
+
+
+CREATE = queries.register("admin.create", """
+    INSERT INTO admin (nama_admin, username, password_hash)
+    VALUES ($1, $2, $3)
+    RETURNING id_admin, nama_admin, username
+""")
 
 
 async def create_admin(
@@ -29,12 +39,14 @@ async def create_admin(
     """
     Create a new admin user.
     """
-    query = """
-    INSERT INTO admin (nama_admin, username, password_hash)
-    VALUES ($1, $2, $3)
-    RETURNING id_admin, nama_admin, username
-    """
-    return await db.fetchrow(query, nama_admin, username, password_hash)
+    return await db.fetchrow(CREATE, nama_admin, username, password_hash)
+
+
+GET_BY_ID = queries.register("admin.get_by_id", """
+    SELECT id_admin, nama_admin, username
+    FROM admin
+    WHERE id_admin = $1
+""")
 
 
 async def get_admin_by_id(
@@ -43,9 +55,4 @@ async def get_admin_by_id(
     """
     Retrieve admin by id.
     """
-    query = """
-    SELECT id_admin, nama_admin, username
-    FROM admin
-    WHERE id_admin = $1
-    """
-    return await db.fetchrow(query, admin_id)
+    return await db.fetchrow(GET_BY_ID, admin_id)
@@ -0,0 +1,137 @@
+"""
+Arsip repository: moves closed laporan out of the hot `laporan` table into
+`laporan_arsip` and serves the admin read paths over the archive
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Optional, Sequence
+import asyncpg
+from db.connection import Database
+from db import queries
+
+# 'Selesai' laporan stay in the hot table this many days after creation
+ARCHIVE_SELESAI_DAYS = int(os.getenv("ARCHIVE_SELESAI_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+
+
+# Columns shared by laporan and laporan_arsip
+_COLUMNS = """id_laporan, token_cookie, nama_pelapor, kontak_pelapor, email_pelapor,
+           judul_laporan, deskripsi, id_kota, tanggal_hilang, lokasi_hilang,
+           latitude, longitude, id_kategori, foto_url, status, created_at"""
+
+# A laporan archived again (e.g. restored, then closed once more) replaces
+# its earlier archive row instead of being dropped
+_UPDATE_ARCHIVED = ",\n            ".join(
+    f"{c.strip()} = EXCLUDED.{c.strip()}" for c in _COLUMNS.split(",") if c.strip() != "id_laporan"
+) + ",\n            archived_at = CURRENT_TIMESTAMP"
+
+# One batch: lock up to $2 archivable rows (skipping rows other transactions
+# hold), delete them from laporan and insert them into the archive, atomically.
+ARCHIVE_BATCH = queries.register("arsip.archive_batch", f"""
+    WITH moved AS (
+        DELETE FROM laporan
+        WHERE id_laporan IN (
+            SELECT id_laporan FROM laporan
+            WHERE status = 'Dihapus'
+               OR (status = 'Selesai' AND created_at < CURRENT_DATE - $1::int)
+            ORDER BY id_laporan
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {_COLUMNS}
+    ), logged AS (
+        -- Tells incremental clients (GET /laporan/changes) the row left the hot table
+        INSERT INTO laporan_changes (id_laporan, token_cookie, change, status)
+        SELECT id_laporan, token_cookie, 'archived', status FROM moved
+    )
+    INSERT INTO laporan_arsip ({_COLUMNS})
+    SELECT {_COLUMNS} FROM moved
+    ON CONFLICT (id_laporan) DO UPDATE SET
+            {_UPDATE_ARCHIVED}
+""")
+
+
+async def archive_batch(
+    db: Database, selesai_days: int = ARCHIVE_SELESAI_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE
+) -> int:
+    """
+    Move one batch of 'Dihapus' laporan and 'Selesai' laporan created more than
+    `selesai_days` days ago into laporan_arsip. Returns the number of rows moved.
+    """
+    status = await db.execute(ARCHIVE_BATCH, selesai_days, batch_size)
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError):
+        return 0
+
+
+async def archive_laporan(
+    db: Database,
+    selesai_days: int = ARCHIVE_SELESAI_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    pause: float = 0.05,
+) -> int:
+    """
+    Run archive batches until nothing is left (or `max_batches` is reached).
+    Each batch is its own short transaction; `pause` seconds between batches
+    leave room for regular traffic. Returns the total number of rows moved.
+    """
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = await archive_batch(db, selesai_days=selesai_days, batch_size=batch_size)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        await asyncio.sleep(pause)
+    return total
+
+
+LIST = queries.register("arsip.list", """
+    SELECT 
+        a.id_laporan, a.nama_pelapor, a.judul_laporan, a.kontak_pelapor, 
+        a.email_pelapor, a.deskripsi, a.tanggal_hilang, a.lokasi_hilang, a.latitude, a.longitude,
+        a.id_kategori, a.foto_url, k.nama_kategori, a.status, a.created_at,
+        w.id_kota, w.nama_kota, w.id_provinsi, w.nama_provinsi, a.archived_at
+    FROM laporan_arsip a
+    LEFT JOIN kategori k ON a.id_kategori = k.id_kategori
+    LEFT JOIN wilayah w ON a.id_kota = w.id_kota
+    WHERE ($1::varchar IS NULL OR a.status = $1)
+      AND ($2::timestamp IS NULL OR a.created_at < $2)
+    ORDER BY a.created_at DESC
+    LIMIT $3
+""")
+
+
+async def list_arsip(
+    db: Database,
+    status: Optional[str] = None,
+    before: Optional[datetime] = None,
+    limit: int = 100,
+) -> Sequence[asyncpg.Record]:
+    """
+    List archived laporan, newest first. Same leading columns as
+    laporan_repo.list_laporan plus `archived_at`. Page with `before` (created_at).
+    """
+    return await db.fetch(LIST, status or None, before, limit)
+
+
+GET_BY_ID = queries.register("arsip.get_by_id", """
+    SELECT 
+        a.id_laporan, a.nama_pelapor, a.judul_laporan, a.kontak_pelapor, 
+        a.email_pelapor, a.deskripsi, a.tanggal_hilang, a.lokasi_hilang, a.latitude, a.longitude,
+        a.id_kategori, a.foto_url, k.nama_kategori, a.status, a.created_at,
+        w.id_kota, w.nama_kota, w.id_provinsi, w.nama_provinsi, a.archived_at
+    FROM laporan_arsip a
+    LEFT JOIN kategori k ON a.id_kategori = k.id_kategori
+    LEFT JOIN wilayah w ON a.id_kota = w.id_kota
+    WHERE a.id_laporan = $1
+""")
+
+
+async def get_arsip_by_id(db: Database, id_laporan: int) -> Optional[asyncpg.Record]:
+    """Get one archived laporan with kategori and wilayah info."""
+    return await db.fetchrow(GET_BY_ID, id_laporan)
@@ -0,0 +1,131 @@
+"""
+Cluster repository: map clusters from the laporan_tiles aggregate
+"""
+import math
+import os
+from typing import List, Optional, Sequence, Tuple
+import asyncpg
+from db.connection import Database
+from db import queries
+
+# Grid levels kept in laporan_tiles (Web Mercator tile zooms); must match the
+# ARRAY[...] in laporan_tiles_apply / the initial fill in sql/schema.sql
+TILE_LEVELS = (4, 6, 8, 10, 12, 14)
+# A map tile at zoom z is clustered on the grid of level z + offset
+# (2 -> 4x4 cells per 256px tile, ~64px per cluster)
+ZOOM_OFFSET = int(os.getenv("CLUSTER_ZOOM_OFFSET", "2"))
+# Upper bound on grid cells (and so clusters) per request
+MAX_CELLS = int(os.getenv("CLUSTER_MAX_CELLS", "4096"))
+
+_MAX_LAT = 85.0511
+
+
+def tile_xy(latitude: float, longitude: float, zoom: int) -> Tuple[int, int]:
+    """Web Mercator tile of a point; same formula as laporan_tile_xy in SQL."""
+    n = 1 << zoom
+    lat = math.radians(min(max(latitude, -_MAX_LAT), _MAX_LAT))
+    x = math.floor((longitude + 180.0) / 360.0 * n)
+    y = math.floor((1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom: int, tx: int, ty: int) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a tile."""
+    n = 1 << zoom
+
+    def lat(y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return tx / n * 360.0 - 180.0, lat(ty + 1), (tx + 1) / n * 360.0 - 180.0, lat(ty)
+
+
+def tile_range(
+    bbox: Tuple[float, float, float, float], zoom: int
+) -> Tuple[int, int, int, int]:
+    """(tx_min, tx_max, ty_min, ty_max) covering bbox (min_lon, min_lat, max_lon, max_lat)."""
+    tx_min, ty_max = tile_xy(bbox[1], bbox[0], zoom)
+    tx_max, ty_min = tile_xy(bbox[3], bbox[2], zoom)
+    return tx_min, tx_max, ty_min, ty_max
+
+
+def choose_level(bbox: Tuple[float, float, float, float], map_zoom: int) -> int:
+    """
+    Finest stored level not finer than map_zoom + ZOOM_OFFSET whose cells in
+    the viewport stay within MAX_CELLS.
+    """
+    target = map_zoom + ZOOM_OFFSET
+    candidates = [z for z in TILE_LEVELS if z <= target] or [TILE_LEVELS[0]]
+    for level in reversed(candidates):
+        tx_min, tx_max, ty_min, ty_max = tile_range(bbox, level)
+        if (tx_max - tx_min + 1) * (ty_max - ty_min + 1) <= MAX_CELLS:
+            return level
+    return candidates[0]
+
+
+CLUSTERS = queries.register("cluster.list", """
+    SELECT c.tx, c.ty, c.jumlah, c.latitude, c.longitude, c.top_kategori, k.nama_kategori
+    FROM (
+        SELECT tx, ty, SUM(kat_jumlah)::int AS jumlah,
+               SUM(kat_lat) / SUM(kat_jumlah) AS latitude,
+               SUM(kat_lon) / SUM(kat_jumlah) AS longitude,
+               (array_agg(id_kategori ORDER BY kat_jumlah DESC, id_kategori))[1] AS top_kategori
+        FROM (
+            SELECT tx, ty, id_kategori, SUM(jumlah) AS kat_jumlah,
+                   SUM(sum_lat) AS kat_lat, SUM(sum_lon) AS kat_lon
+            FROM laporan_tiles
+            WHERE zoom = $1
+              AND tx BETWEEN $2 AND $3
+              AND ty BETWEEN $4 AND $5
+              AND status = ANY($6::text[])
+              AND ($7::int IS NULL OR id_kategori = $7)
+            GROUP BY tx, ty, id_kategori
+            HAVING SUM(jumlah) > 0
+        ) per_kategori
+        GROUP BY tx, ty
+    ) c
+    LEFT JOIN kategori k ON k.id_kategori = c.top_kategori
+    ORDER BY c.jumlah DESC
+""")
+
+
+async def get_clusters(
+    db: Database,
+    level: int,
+    tiles: Tuple[int, int, int, int],
+    statuses: Sequence[str],
+    id_kategori: Optional[int] = None,
+) -> List[asyncpg.Record]:
+    """
+    One row per non-empty grid cell of `level` within `tiles`
+    (tx_min, tx_max, ty_min, ty_max): count, centroid and the most common
+    kategori. Cost is bounded by the number of cells, not laporan.
+    """
+    return await db.fetch(CLUSTERS, level, *tiles, list(statuses), id_kategori)
+
+
+COUNT_ROWS = queries.register("cluster.count_rows", """
+    SELECT COUNT(*) FROM laporan_tiles
+""")
+
+
+REBUILD = queries.register("cluster.rebuild", """
+    INSERT INTO laporan_tiles (zoom, tx, ty, status, id_kategori, jumlah, sum_lat, sum_lon)
+    SELECT z, t.tx, t.ty, COALESCE(l.status, 'Aktif'), COALESCE(l.id_kategori, 0),
+           COUNT(*), SUM(l.latitude), SUM(l.longitude)
+    FROM laporan l
+    CROSS JOIN unnest($1::int[]) AS z
+    CROSS JOIN LATERAL laporan_tile_xy(l.latitude, l.longitude, z) t
+    WHERE l.latitude IS NOT NULL AND l.longitude IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5
+""")
+
+
+async def rebuild_tiles(db: Database) -> int:
+    """
+    Recompute laporan_tiles from laporan (repair tool; also drops empty cells).
+    Runs in one transaction. Returns the number of aggregate rows.
+    """
+    async with db.transaction() as tx:
+        await tx.execute("TRUNCATE laporan_tiles")
+        await tx.execute(REBUILD, list(TILE_LEVELS))
+        return await tx.fetchval(COUNT_ROWS)
@@ -0,0 +1,89 @@
+"""
+Foto hash repository: perceptual hashes of uploaded images (utils.photo_hash)
+"""
+from typing import List, Optional, Sequence, Tuple
+import asyncpg
+from db.connection import Database
+from db import queries
+
+
+# A new hash for an existing URL takes the writer's xid so other workers'
+# incremental refresh (list_since) picks up the change
+SAVE = queries.register("foto_hash.save", """
+    INSERT INTO foto_hash (foto_url, phash)
+    VALUES ($1, $2)
+    ON CONFLICT (foto_url) DO UPDATE
+    SET phash = EXCLUDED.phash,
+        xid = pg_current_xact_id(),
+        created_at = CURRENT_TIMESTAMP
+    WHERE foto_hash.phash <> EXCLUDED.phash
+""")
+
+
+async def save_hash(db: Database, foto_url: str, phash: int):
+    """
+    Store the (signed 64-bit) hash of an uploaded image.
+    """
+    await db.execute(SAVE, foto_url, phash)
+
+
+# Same commit-safe cursor as laporan.changes: only rows whose transaction is
+# older than every running one, so a late commit is never skipped
+LIST_SINCE = queries.register("foto_hash.list_since", """
+    SELECT s.xmin::text, h.xid, h.id_hash, h.foto_url, h.phash
+    FROM (SELECT pg_snapshot_xmin(pg_current_snapshot()) AS xmin) s
+    LEFT JOIN LATERAL (
+        SELECT xid::text AS xid, id_hash, foto_url, phash
+        FROM foto_hash
+        WHERE (xid, id_hash) > ($1::text::xid8, $2::bigint)
+          AND xid < s.xmin
+        ORDER BY xid, id_hash
+        LIMIT $3
+    ) h ON TRUE
+""")
+
+
+async def list_since(
+    db: Database, after_xid: int, after_id: int, limit: int
+) -> Tuple[int, List[Tuple[int, int, str, int]]]:
+    """
+    Hashes stored after the cursor (after_xid, after_id). Returns
+    (snapshot xmin, rows of (xid, id_hash, foto_url, phash)).
+    """
+    rows = await db.fetch(LIST_SINCE, str(after_xid), after_id, limit)
+    xmin = int(rows[0][0])
+    return xmin, [(int(r[1]), r[2], r[3], r[4]) for r in rows if r[2] is not None]
+
+
+LAPORAN_PHOTO = queries.register("foto_hash.laporan_photo", """
+    SELECT l.foto_url, h.phash
+    FROM laporan l
+    LEFT JOIN foto_hash h ON h.foto_url = l.foto_url
+    WHERE l.id_laporan = $1
+""")
+
+
+async def get_laporan_photo(db: Database, id_laporan: int) -> Optional[asyncpg.Record]:
+    """
+    (foto_url, phash) of a laporan; None if the laporan does not exist,
+    phash None if its photo was never fingerprinted.
+    """
+    return await db.fetchrow(LAPORAN_PHOTO, id_laporan)
+
+
+LAPORAN_BY_FOTO = queries.register("foto_hash.laporan_by_foto", """
+    SELECT id_laporan, judul_laporan, foto_url, status, created_at
+    FROM laporan
+    WHERE foto_url = ANY($1::text[])
+      AND id_laporan <> $2
+      AND status <> 'Dihapus'
+""")
+
+
+async def list_laporan_by_foto(
+    db: Database, foto_urls: List[str], exclude_id: int
+) -> Sequence[asyncpg.Record]:
+    """
+    Visible laporan using any of `foto_urls`, except `exclude_id`.
+    """
+    return await db.fetch(LAPORAN_BY_FOTO, foto_urls, exclude_id)
@@ -0,0 +1,207 @@
+"""
+Foto replikasi repository: locally spooled uploads waiting to be pushed to
+the remote image store (utils.image_spool)
+"""
+from typing import List, Optional, Sequence, Tuple
+import asyncpg
+from db.connection import Database
+from db import queries
+
+
+ENQUEUE = queries.register("foto_replikasi.enqueue", """
+    INSERT INTO foto_replikasi (nama_file, local_url, ukuran, host)
+    VALUES ($1, $2, $3, $4)
+""")
+
+
+async def enqueue(db: Database, nama_file: str, local_url: str, ukuran: int, host: str):
+    """
+    Queue a file spooled on `host` for replication.
+    """
+    await db.execute(ENQUEUE, nama_file, local_url, ukuran, host)
+
+
+# Same lease as outbox.claim: pushing next_attempt_at forward hides the rows
+# from other replicators until the lease runs out. The file only exists in
+# the spool of the host that stored it, so each host claims its own rows
+# (rows from before the host column are claimable anywhere)
+CLAIM = queries.register("foto_replikasi.claim", """
+    UPDATE foto_replikasi r
+    SET attempts = r.attempts + 1,
+        next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $2)
+    WHERE r.id_replikasi IN (
+        SELECT id_replikasi FROM foto_replikasi
+        WHERE state = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+          AND (host = $3 OR host IS NULL)
+        ORDER BY next_attempt_at
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING r.id_replikasi, r.nama_file, r.local_url, r.attempts
+""")
+
+
+async def claim_batch(
+    db: Database, limit: int, lease_seconds: float, host: str
+) -> Sequence[asyncpg.Record]:
+    """
+    Lease up to `limit` due files spooled on `host`:
+    (id_replikasi, nama_file, local_url, attempts).
+    """
+    return await db.fetch(CLAIM, limit, float(lease_seconds), host)
+
+
+MARK_DONE = queries.register("foto_replikasi.mark_done", """
+    UPDATE foto_replikasi r
+    SET state = 'done', remote_url = d.remote_url, replicated_at = CURRENT_TIMESTAMP, last_error = NULL
+    FROM unnest($1::bigint[], $2::text[]) AS d(id_replikasi, remote_url)
+    WHERE r.id_replikasi = d.id_replikasi AND r.state = 'pending'
+    RETURNING r.local_url, r.remote_url
+""")
+
+# foto_url rewrites for the rows mark_done / purge_done returned
+# ($1 local, $2 remote)
+REWRITE_LAPORAN = queries.register("foto_replikasi.rewrite_laporan", """
+    WITH upd AS (
+        UPDATE laporan l
+        SET foto_url = u.remote_url
+        FROM unnest($1::text[], $2::text[]) AS u(local_url, remote_url)
+        WHERE l.foto_url = u.local_url
+        RETURNING l.id_laporan, l.token_cookie, l.status
+    ), logged AS (
+        -- Incremental clients (GET /laporan/changes) refetch the new foto_url
+        INSERT INTO laporan_changes (id_laporan, token_cookie, change, status)
+        SELECT id_laporan, token_cookie, 'foto', status FROM upd
+    )
+    SELECT COUNT(*) FROM upd
+""")
+
+REWRITE_ARSIP = queries.register("foto_replikasi.rewrite_arsip", """
+    UPDATE laporan_arsip a
+    SET foto_url = u.remote_url
+    FROM unnest($1::text[], $2::text[]) AS u(local_url, remote_url)
+    WHERE a.foto_url = u.local_url
+""")
+
+# New xid so other workers' photo index refresh picks the new URL up
+REWRITE_FOTO_HASH = queries.register("foto_replikasi.rewrite_foto_hash", """
+    UPDATE foto_hash h
+    SET foto_url = u.remote_url, xid = pg_current_xact_id()
+    FROM unnest($1::text[], $2::text[]) AS u(local_url, remote_url)
+    WHERE h.foto_url = u.local_url
+""")
+
+
+async def mark_replicated(
+    db: Database, ids: Sequence[int], remote_urls: Sequence[str]
+) -> List[Tuple[str, str]]:
+    """
+    Record the remote URL of replicated files and point every laporan,
+    archived laporan and photo hash using the local URL at it, in one
+    transaction. Returns the (local_url, remote_url) pairs rewritten.
+    """
+    if not ids:
+        return []
+    async with db.transaction() as tx:
+        rows = await tx.fetch(MARK_DONE, list(ids), list(remote_urls))
+        if not rows:
+            return []
+        await _rewrite(tx, [r[0] for r in rows], [r[1] for r in rows])
+    return [(r[0], r[1]) for r in rows]
+
+
+async def _rewrite(tx, local_urls: List[str], remote_urls: List[str]) -> int:
+    """Point laporan, laporan_arsip and foto_hash at the remote URLs; returns the laporan rewritten."""
+    count = await tx.fetchval(REWRITE_LAPORAN, local_urls, remote_urls)
+    await tx.execute(REWRITE_ARSIP, local_urls, remote_urls)
+    await tx.execute(REWRITE_FOTO_HASH, local_urls, remote_urls)
+    return count
+
+
+MARK_FAILED = queries.register("foto_replikasi.mark_failed", """
+    UPDATE foto_replikasi r
+    SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => f.retry_in),
+        last_error = f.error
+    FROM unnest($1::bigint[], $2::float8[], $3::text[]) AS f(id_replikasi, retry_in, error)
+    WHERE r.id_replikasi = f.id_replikasi
+""")
+
+
+async def mark_failed(db: Database, ids: Sequence[int], retry_in: Sequence[float], errors: Sequence[str]):
+    """
+    Schedule failed files for another attempt after `retry_in` seconds.
+    Files are never given up on: the local copy keeps being served meanwhile.
+    """
+    if ids:
+        await db.execute(MARK_FAILED, list(ids), list(retry_in), list(errors))
+
+
+REMOTE_URL = queries.register("foto_replikasi.remote_url", """
+    SELECT remote_url FROM foto_replikasi
+    WHERE local_url = $1 AND state = 'done'
+""")
+
+
+async def get_remote_url(db: Database, local_url: str) -> Optional[str]:
+    """
+    Remote URL of a spooled file that has already been replicated.
+    """
+    return await db.fetchval(REMOTE_URL, local_url)
+
+
+BACKLOG = queries.register("foto_replikasi.backlog", """
+    SELECT COUNT(*), COALESCE(SUM(ukuran), 0)::bigint,
+           EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(created_at))::float8
+    FROM foto_replikasi
+    WHERE state = 'pending'
+""")
+
+
+async def get_backlog(db: Database) -> Tuple[int, int, Optional[float]]:
+    """
+    (files, bytes, age in seconds of the oldest) waiting for replication.
+    """
+    row = await db.fetchrow(BACKLOG)
+    return row[0], row[1], row[2]
+
+
+LIST_PENDING = queries.register("foto_replikasi.list_pending", """
+    SELECT id_replikasi, nama_file, ukuran, attempts, next_attempt_at, last_error, created_at
+    FROM foto_replikasi
+    WHERE state = 'pending'
+    ORDER BY created_at
+    LIMIT $1
+""")
+
+
+async def list_pending(db: Database, limit: int = 50) -> Sequence[asyncpg.Record]:
+    """
+    Oldest files still waiting for replication.
+    """
+    return await db.fetch(LIST_PENDING, limit)
+
+
+PURGE_DONE = queries.register("foto_replikasi.purge_done", """
+    DELETE FROM foto_replikasi
+    WHERE state = 'done' AND replicated_at < CURRENT_TIMESTAMP - make_interval(days => $1)
+    RETURNING nama_file, local_url, remote_url
+""")
+
+
+async def purge_replicated(db: Database, days: int) -> Tuple[List[Tuple[str, str, str]], int]:
+    """
+    Forget files replicated more than `days` days ago; returns their
+    (nama_file, local_url, remote_url) so the caller can delete the local
+    copies, and the number of laporan still pointing at a local URL.
+
+    A laporan inserted while mark_replicated was committing looked up the
+    remote URL before it existed and kept the local one, which that rewrite
+    could not see yet. The rewrite is run again here, in the same transaction
+    as the delete, so nothing still references a file about to be removed.
+    """
+    async with db.transaction() as tx:
+        rows = await tx.fetch(PURGE_DONE, days)
+        if not rows:
+            return [], 0
+        late = await _rewrite(tx, [r[1] for r in rows], [r[2] for r in rows])
+    return [(r[0], r[1], r[2]) for r in rows], late
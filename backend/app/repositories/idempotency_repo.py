@@ -0,0 +1,139 @@
+"""
+Idempotency repository: stored responses for Idempotency-Key replays
+"""
+import json
+import uuid
+from typing import Optional
+from db.connection import Database
+from db import queries
+
+
+CLAIM = queries.register("idempotency.claim", """
+    INSERT INTO idempotency_keys (scope, idem_key, request_hash, expires_at, lease_until, lease_token)
+    VALUES ($1, $2, $3, CURRENT_TIMESTAMP + make_interval(secs => $4),
+            CURRENT_TIMESTAMP + make_interval(secs => $5), $6::uuid)
+    ON CONFLICT (scope, idem_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash,
+            state = 'pending',
+            status_code = NULL,
+            response = NULL,
+            created_at = CURRENT_TIMESTAMP,
+            expires_at = EXCLUDED.expires_at,
+            lease_until = EXCLUDED.lease_until,
+            lease_token = EXCLUDED.lease_token
+        WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+           OR (idempotency_keys.state = 'pending'
+               AND idempotency_keys.lease_until < CURRENT_TIMESTAMP
+               AND idempotency_keys.request_hash = EXCLUDED.request_hash)
+    RETURNING idem_key
+""")
+
+
+async def claim_key(
+    db: Database, scope: str, key: str, request_hash: str, ttl_seconds: float, lease_seconds: float
+) -> Optional[str]:
+    """
+    Insert a 'pending' row for (scope, key) leased for `lease_seconds`, taking
+    over an expired row or a pending one whose owner let the lease run out
+    (crashed worker) for the same request. Returns the lease token if this
+    request now owns the key (pass it to renew/complete/release), None if
+    another request holds a live row for it.
+    """
+    lease_token = str(uuid.uuid4())
+    row = await db.fetchrow(
+        CLAIM, scope, key, request_hash, float(ttl_seconds), float(lease_seconds), lease_token
+    )
+    return lease_token if row is not None else None
+
+
+def _matched(status: str) -> bool:
+    try:
+        return int(status.rsplit(" ", 1)[-1]) > 0
+    except (AttributeError, ValueError):
+        return False
+
+
+RENEW = queries.register("idempotency.renew", """
+    UPDATE idempotency_keys
+    SET lease_until = CURRENT_TIMESTAMP + make_interval(secs => $3)
+    WHERE scope = $1 AND idem_key = $2 AND state = 'pending' AND lease_token = $4::uuid
+""")
+
+
+async def renew_key(db: Database, scope: str, key: str, lease_token: str, lease_seconds: float) -> bool:
+    """
+    Extend the lease of a pending key while its request is still running.
+    Returns False if the lease was lost (taken over by another request).
+    """
+    return _matched(await db.execute(RENEW, scope, key, float(lease_seconds), lease_token))
+
+
+GET = queries.register("idempotency.get", """
+    SELECT request_hash, state, status_code, response::text, expires_at
+    FROM idempotency_keys
+    WHERE scope = $1 AND idem_key = $2 AND expires_at >= CURRENT_TIMESTAMP
+""")
+
+
+async def get_key(db: Database, scope: str, key: str) -> Optional[dict]:
+    """
+    Get the live row for (scope, key) with its response decoded, or None.
+    """
+    row = await db.fetchrow(GET, scope, key)
+    if row is None:
+        return None
+    return {
+        "request_hash": row[0],
+        "state": row[1],
+        "status_code": row[2],
+        "response": json.loads(row[3]) if row[3] is not None else None,
+        "expires_at": row[4],
+    }
+
+
+COMPLETE = queries.register("idempotency.complete", """
+    UPDATE idempotency_keys
+    SET state = 'done', status_code = $3, response = $4::jsonb, lease_until = NULL
+    WHERE scope = $1 AND idem_key = $2 AND state = 'pending' AND lease_token = $5::uuid
+""")
+
+
+async def complete_key(
+    db: Database, scope: str, key: str, lease_token: str, status_code: int, response: dict
+) -> bool:
+    """
+    Store the response of the request that owns (scope, key) under `lease_token`.
+    Returns False if the lease was lost, in which case nothing is written.
+    """
+    status = await db.execute(COMPLETE, scope, key, status_code, json.dumps(response, default=str), lease_token)
+    return _matched(status)
+
+
+RELEASE = queries.register("idempotency.release", """
+    DELETE FROM idempotency_keys
+    WHERE scope = $1 AND idem_key = $2 AND state = 'pending' AND lease_token = $3::uuid
+""")
+
+
+async def release_key(db: Database, scope: str, key: str, lease_token: str) -> bool:
+    """
+    Drop a pending key whose request failed, so a retry runs again. Returns
+    False if the lease was lost (the row belongs to another request now).
+    """
+    return _matched(await db.execute(RELEASE, scope, key, lease_token))
+
+
+DELETE_EXPIRED = queries.register("idempotency.delete_expired", """
+    DELETE FROM idempotency_keys WHERE expires_at < CURRENT_TIMESTAMP
+""")
+
+
+async def delete_expired(db: Database) -> int:
+    """
+    Remove expired keys. Returns the number of rows deleted.
+    """
+    status = await db.execute(DELETE_EXPIRED)
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError):
+        return 0
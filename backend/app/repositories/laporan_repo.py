@@ -1,10 +1,38 @@
 """
 Laporan repository: database query logic for laporan operations
 """
-from typing import Optional, Sequence
+import functools
+import os
+from datetime import date, datetime
+from typing import Callable, List, Optional, Sequence, Tuple
 import asyncpg
 from uuid import uuid4
 from db.connection import Database
+from db import queries
+from repositories import outbox_repo
+
+
+# Write paths also append to laporan_changes (GET /laporan/changes) in the
+# same statement, so the change log can never miss a committed write.
+_LOG_CHANGES = (
+    "INSERT INTO laporan_changes (id_laporan, token_cookie, change, status) "
+    "SELECT id_laporan, token_cookie, '{change}', status FROM {source}"
+)
+
+CREATE = queries.register("laporan.create", f"""
+    WITH ins AS (
+        INSERT INTO laporan (nama_pelapor, kontak_pelapor, email_pelapor, judul_laporan, 
+                             deskripsi, tanggal_hilang, lokasi_hilang, latitude, longitude, id_kategori, foto_url, id_kota, token_cookie)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10,
+                -- A spooled upload that was already replicated gets its remote URL
+                COALESCE((SELECT remote_url FROM foto_replikasi WHERE local_url = $11 AND state = 'done'), $11),
+                $12, $13)
+        RETURNING id_laporan, token_cookie, nama_pelapor, judul_laporan, status
+    ), logged AS (
+        {_LOG_CHANGES.format(change="insert", source="ins")}
+    )
+    SELECT id_laporan, token_cookie, nama_pelapor, judul_laporan, status FROM ins
+""")
 
 
 async def create_laporan(
@@ -37,17 +65,11 @@ async def create_laporan(
     if not token_cookie:
         token_cookie = str(uuid4())
     
-    query = """
-    INSERT INTO laporan (nama_pelapor, kontak_pelapor, email_pelapor, judul_laporan, 
-                         deskripsi, tanggal_hilang, lokasi_hilang, latitude, longitude, id_kategori, foto_url, id_kota, token_cookie)
-    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
-    RETURNING id_laporan, token_cookie, nama_pelapor, judul_laporan, status
-    """
     # If caller provided a text `lokasi_hilang` (string), we don't have an
     # `id_kota` mapping here, so pass None for id_kota. If you want to persist
     # the raw text location, add a `lokasi_hilang` column to the DB schema.
     return await db.fetchrow(
-        query,
+        CREATE,
         nama_pelapor,
         kontak_pelapor,
         email_pelapor,
@@ -64,13 +86,158 @@ async def create_laporan(
     )
 
 
-async def get_laporan_by_token(
-    db: Database, token_cookie: str
-) -> Sequence[asyncpg.Record]:
+KATEGORI_NAMES = queries.register("laporan.kategori_names", """
+    SELECT id_kategori, nama_kategori FROM kategori
+""")
+
+WILAYAH_NAMES = queries.register("laporan.wilayah_names", """
+    SELECT id_kota, nama_kota, id_provinsi, nama_provinsi FROM wilayah
+""")
+
+
+async def list_kategori_names(db: Database) -> Sequence[asyncpg.Record]:
     """
-    Retrieve all laporan for a specific reporter (by token_cookie).
+    All kategori (id, name), for resolving names in bulk imports.
+    """
+    return await db.fetch(KATEGORI_NAMES)
+
+
+async def list_wilayah_names(db: Database) -> Sequence[asyncpg.Record]:
+    """
+    All kab/kota with their provinsi, for resolving names in bulk imports.
     """
-    query = """
+    return await db.fetch(WILAYAH_NAMES)
+
+
+# Columns COPY'd into the per-transaction staging table, in record order
+BULK_COLUMNS = (
+    "nama_pelapor", "kontak_pelapor", "email_pelapor", "judul_laporan", "deskripsi",
+    "id_kota", "tanggal_hilang", "lokasi_hilang", "latitude", "longitude",
+    "id_kategori", "foto_url",
+)
+
+# Not registered: the staging table only exists inside the import transaction,
+# so these cannot be prepared on pool connections.
+_BULK_STAGE = """
+    CREATE TEMP TABLE laporan_import (
+        row_no SERIAL,
+        nama_pelapor VARCHAR(100),
+        kontak_pelapor VARCHAR(100),
+        email_pelapor VARCHAR(100),
+        judul_laporan VARCHAR(150),
+        deskripsi TEXT,
+        id_kota INT,
+        tanggal_hilang DATE,
+        lokasi_hilang TEXT,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION,
+        id_kategori INT,
+        foto_url TEXT
+    ) ON COMMIT DROP
+"""
+
+# token_cookie and status take their column defaults. $1 selects the
+# notification mode: 'each' (one per laporan, like POST /laporan), 'summary'
+# (a single notification for the whole import, text $2) or 'none'.
+_BULK_INSERT = f"""
+    WITH ins AS (
+        INSERT INTO laporan (nama_pelapor, kontak_pelapor, email_pelapor, judul_laporan, deskripsi,
+                             id_kota, tanggal_hilang, lokasi_hilang, latitude, longitude, id_kategori, foto_url)
+        SELECT nama_pelapor, kontak_pelapor, email_pelapor, judul_laporan, deskripsi,
+               id_kota, tanggal_hilang, lokasi_hilang, latitude, longitude, id_kategori, foto_url
+        FROM laporan_import
+        ORDER BY row_no
+        RETURNING id_laporan, judul_laporan, token_cookie, status
+    ), logged AS (
+        {_LOG_CHANGES.format(change="insert", source="ins")}
+    ), notif_each AS (
+        INSERT INTO notifikasi (id_laporan, pesan)
+        SELECT id_laporan, 'Laporan baru: ' || judul_laporan FROM ins WHERE $1 = 'each'
+    ), notif_summary AS (
+        INSERT INTO notifikasi (id_laporan, pesan)
+        SELECT MIN(id_laporan), COUNT(*) || ' ' || $2::text FROM ins
+        WHERE $1 = 'summary'
+        HAVING COUNT(*) > 0
+    )
+    SELECT id_laporan FROM ins ORDER BY id_laporan
+"""
+
+
+async def bulk_create_laporan(
+    db: Database,
+    records: Sequence[tuple],
+    notify: str = "each",
+    summary_text: str = "laporan baru dari import massal",
+) -> List[int]:
+    """
+    Insert many laporan in one transaction: COPY `records` (tuples in
+    BULK_COLUMNS order) into a staging table, then move them into laporan and
+    create their notifikasi with one INSERT ... SELECT. The statement-level
+    stats and tiles triggers apply the whole batch as one grouped upsert at
+    the end of that statement, the last before commit, so their rollup rows
+    stay locked only briefly. Returns the new ids in record order.
+    """
+    async with db.transaction() as tx:
+        await tx.execute(_BULK_STAGE)
+        await tx.copy_records_to_table("laporan_import", records, columns=BULK_COLUMNS)
+        rows = await tx.fetch(_BULK_INSERT, notify, summary_text)
+    return [r[0] for r in rows]
+
+
+# Sparse fieldsets (`fields=` on GET /laporan, /laporan/mine, /laporan/{id},
+# /laporan/batch): output field -> the columns it is built from. Only those
+# columns are selected, and kategori / wilayah are joined only when a selected
+# column comes from them.
+FIELD_COLUMNS = {
+    "id_laporan": ("l.id_laporan",),
+    "nama_pelapor": ("l.nama_pelapor",),
+    "judul_laporan": ("l.judul_laporan",),
+    "nama_barang": ("l.judul_laporan",),
+    "kontak_pelapor": ("l.kontak_pelapor",),
+    "email_pelapor": ("l.email_pelapor",),
+    "deskripsi": ("l.deskripsi",),
+    "tanggal_hilang": ("l.tanggal_hilang",),
+    "lokasi_hilang": ("l.lokasi_hilang",),
+    "lokasi": ("l.lokasi_hilang", "w.nama_kota", "w.nama_provinsi"),
+    "kategori": ("k.nama_kategori",),
+    "kategori_nama": ("k.nama_kategori",),
+    "foto_url": ("l.foto_url",),
+    "status": ("l.status",),
+    "created_at": ("l.created_at",),
+}
+
+_COLUMN_ORDER = list(dict.fromkeys(c for columns in FIELD_COLUMNS.values() for c in columns))
+
+_JOINS = (
+    ("k", "LEFT JOIN kategori k ON l.id_kategori = k.id_kategori"),
+    ("w", "LEFT JOIN wilayah w ON l.id_kota = w.id_kota"),
+)
+
+
+def _field_columns(fields: Sequence[str]) -> Tuple[str, ...]:
+    """Columns for `fields`, in a fixed order so equal sets share one statement."""
+    wanted = {c for f in fields for c in FIELD_COLUMNS[f]}
+    return tuple(c for c in _COLUMN_ORDER if c in wanted)
+
+
+# Not registered: registered queries are prepared on every new connection and
+# there is one statement per column set. Each text is built once here and
+# then reused from asyncpg's statement cache like any other query.
+@functools.lru_cache(maxsize=256)
+def _sparse_query(name: str, columns: Tuple[str, ...], where: str, joins: Tuple[str, ...] = ()) -> queries.Query:
+    aliases = {c.split(".", 1)[0] for c in columns} | set(joins)
+    join_sql = "".join(f"\n    {sql}" for alias, sql in _JOINS if alias in aliases)
+    return queries.Query(
+        f"{name}.sparse",
+        f"""
+    SELECT {", ".join(columns)}
+    FROM laporan l{join_sql}
+    {where}
+""",
+    )
+
+
+LIST_BY_TOKEN = queries.register("laporan.list_by_token", """
     SELECT 
         l.id_laporan, l.nama_pelapor, l.judul_laporan, l.kontak_pelapor, 
         l.email_pelapor, l.deskripsi, l.tanggal_hilang, l.lokasi_hilang, l.latitude, l.longitude,
@@ -81,8 +248,36 @@ async def get_laporan_by_token(
     LEFT JOIN kategori k ON l.id_kategori = k.id_kategori
     WHERE token_cookie = $1
     ORDER BY l.created_at DESC
+""")
+
+
+async def get_laporan_by_token(
+    db: Database, token_cookie: str, fields: Optional[Sequence[str]] = None
+) -> Sequence[asyncpg.Record]:
     """
-    return await db.fetch(query, token_cookie)
+    Retrieve all laporan for a specific reporter (by token_cookie).
+    With `fields` only their columns are selected (see FIELD_COLUMNS).
+    """
+    if fields:
+        query = _sparse_query(
+            "laporan.list_by_token", _field_columns(fields),
+            "WHERE l.token_cookie = $1\n    ORDER BY l.created_at DESC",
+        )
+        return await db.fetch(query, token_cookie)
+    return await db.fetch(LIST_BY_TOKEN, token_cookie)
+
+
+MARK_FOUND = queries.register("laporan.mark_found", f"""
+    WITH upd AS (
+        UPDATE laporan 
+        SET status = 'Selesai' 
+        WHERE id_laporan = $1 AND token_cookie = $2 
+        RETURNING id_laporan, token_cookie, status
+    ), logged AS (
+        {_LOG_CHANGES.format(change="status", source="upd")}
+    )
+    SELECT id_laporan, status FROM upd
+""")
 
 
 async def mark_laporan_found(
@@ -92,13 +287,20 @@ async def mark_laporan_found(
     Mark a laporan as 'Selesai' (found) if token matches.
     Returns the updated row or None if not found/unauthorized.
     """
-    query = """
-    UPDATE laporan 
-    SET status = 'Selesai' 
-    WHERE id_laporan = $1 AND token_cookie = $2 
-    RETURNING id_laporan, status
-    """
-    return await db.fetchrow(query, id_laporan, token_cookie)
+    return await db.fetchrow(MARK_FOUND, id_laporan, token_cookie)
+
+
+DELETE = queries.register("laporan.delete", f"""
+    WITH upd AS (
+        UPDATE laporan 
+        SET status = 'Dihapus' 
+        WHERE id_laporan = $1 
+        RETURNING id_laporan, token_cookie, status
+    ), logged AS (
+        {_LOG_CHANGES.format(change="status", source="upd")}
+    )
+    SELECT id_laporan FROM upd
+""")
 
 
 async def delete_laporan(
@@ -108,23 +310,124 @@ async def delete_laporan(
     Mark a laporan as 'Dihapus' (deleted by admin).
     Returns the updated row or None if not found.
     """
-    query = """
-    UPDATE laporan 
-    SET status = 'Dihapus' 
-    WHERE id_laporan = $1 
-    RETURNING id_laporan
+    return await db.fetchrow(DELETE, id_laporan)
+
+
+# Rows are only returned once every transaction that could still write a
+# smaller xid has finished (xid below the snapshot's xmin), so advancing the
+# cursor past them never skips a row committed later. One round trip: the
+# xmin comes back even when there are no changes.
+CHANGES = queries.register("laporan.changes", """
+    SELECT s.xmin::text, c.xid, c.id_change, c.id_laporan, c.change, c.status, c.changed_at
+    FROM (SELECT pg_snapshot_xmin(pg_current_snapshot()) AS xmin) s
+    LEFT JOIN LATERAL (
+        SELECT xid::text AS xid, id_change, id_laporan, change, status, changed_at
+        FROM laporan_changes
+        WHERE (xid, id_change) > ($1::text::xid8, $2::bigint)
+          AND xid < s.xmin
+          AND ($3::uuid IS NULL OR token_cookie = $3::uuid)
+        ORDER BY xid, id_change
+        LIMIT $4
+    ) c ON TRUE
+""")
+
+
+async def list_changes(
+    db: Database,
+    since_xid: int,
+    since_id: int,
+    token_cookie: Optional[str] = None,
+    limit: int = 500,
+) -> Tuple[int, List[asyncpg.Record]]:
+    """
+    Changes after the cursor (since_xid, since_id) in commit-safe order,
+    optionally only for one reporter. Returns (snapshot xmin, rows); rows
+    are (xid, id_change, id_laporan, change, status, changed_at).
+    """
+    rows = await db.fetch(CHANGES, str(since_xid), since_id, token_cookie, limit)
+    xmin = int(rows[0][0])
+    return xmin, [
+        (int(r[1]), r[2], r[3], r[4], r[5], r[6]) for r in rows if r[2] is not None
+    ]
+
+
+# Change log rows are kept this long; older cursors must resync
+CHANGES_RETENTION_DAYS = int(os.getenv("LAPORAN_CHANGES_RETENTION_DAYS", "30"))
+
+CHANGES_HORIZON = queries.register("laporan.changes_horizon", """
+    SELECT xid::text, id_change FROM laporan_changes_horizon
+""")
+
+
+async def get_changes_horizon(db: Database) -> Optional[Tuple[int, int]]:
+    """
+    Largest (xid, id_change) purged from the change log so far (None before
+    the first purge). Cursors below it may have missed purged changes.
     """
-    return await db.fetchrow(query, id_laporan)
+    row = await db.fetchrow(CHANGES_HORIZON)
+    return (int(row[0]), row[1]) if row else None
+
+
+# Purged rows are not necessarily the oldest in cursor order (changed_at is
+# the transaction start), so the horizon is the largest cursor deleted and
+# only ever moves forward.
+PURGE_CHANGES = queries.register("laporan.purge_changes", """
+    WITH purged AS (
+        DELETE FROM laporan_changes
+        WHERE changed_at < CURRENT_TIMESTAMP - make_interval(days => $1)
+        RETURNING xid, id_change
+    ), newest AS (
+        SELECT xid, id_change FROM purged ORDER BY xid DESC, id_change DESC LIMIT 1
+    ), horizon AS (
+        INSERT INTO laporan_changes_horizon (id, xid, id_change)
+        SELECT 1, xid, id_change FROM newest
+        ON CONFLICT (id) DO UPDATE
+            SET xid = EXCLUDED.xid, id_change = EXCLUDED.id_change, purged_at = CURRENT_TIMESTAMP
+            WHERE (laporan_changes_horizon.xid, laporan_changes_horizon.id_change)
+                < (EXCLUDED.xid, EXCLUDED.id_change)
+    )
+    SELECT count(*) FROM purged
+""")
+
+
+async def purge_changes(db: Database, days: int = CHANGES_RETENTION_DAYS) -> int:
+    """
+    Delete change log rows older than `days` days and advance the purge
+    horizon past them. Returns the number of rows deleted.
+    """
+    return await db.fetchval(PURGE_CHANGES, days)
+
+
+GET_BY_ID = queries.register("laporan.get_by_id", """
+    SELECT 
+        l.id_laporan, l.nama_pelapor, l.judul_laporan, l.kontak_pelapor, 
+        l.email_pelapor, l.deskripsi, l.tanggal_hilang, l.lokasi_hilang, l.latitude, l.longitude,
+        l.id_kategori, l.foto_url, k.nama_kategori, l.status, l.created_at,
+        w.id_kota, w.nama_kota, w.id_provinsi, w.nama_provinsi
+    FROM laporan l
+    LEFT JOIN kategori k ON l.id_kategori = k.id_kategori
+    LEFT JOIN wilayah w ON l.id_kota = w.id_kota
+    WHERE l.id_laporan = $1
+""")
 
 
 async def get_laporan_by_id(
     db: Database,
-    id_laporan: int
+    id_laporan: int,
+    fields: Optional[Sequence[str]] = None
 ) -> asyncpg.Record:
     """
     Get a single laporan by ID with full details including kategori and wilayah info.
+    With `fields` only their columns are selected (see FIELD_COLUMNS).
     """
-    query = """
+    if fields:
+        query = _sparse_query("laporan.get_by_id", _field_columns(fields), "WHERE l.id_laporan = $1")
+        return await db.fetchrow(query, id_laporan)
+    return await db.fetchrow(GET_BY_ID, id_laporan)
+
+
+# Many ids in one round trip (GET /laporan/batch) instead of one GET_BY_ID each
+GET_BY_IDS = queries.register("laporan.get_by_ids", """
     SELECT 
         l.id_laporan, l.nama_pelapor, l.judul_laporan, l.kontak_pelapor, 
         l.email_pelapor, l.deskripsi, l.tanggal_hilang, l.lokasi_hilang, l.latitude, l.longitude,
@@ -133,24 +436,54 @@ async def get_laporan_by_id(
     FROM laporan l
     LEFT JOIN kategori k ON l.id_kategori = k.id_kategori
     LEFT JOIN wilayah w ON l.id_kota = w.id_kota
-    WHERE l.id_laporan = $1
-    """
-    return await db.fetchrow(query, id_laporan)
+    WHERE l.id_laporan = ANY($1::int[])
+""")
 
 
-async def list_laporan(
-    db: Database, 
-    status: Optional[str] = None, 
-    id_kategori: Optional[int] = None,
-    id_provinsi: Optional[int] = None,
-    id_kota: Optional[int] = None,
-    limit: int = 100
+async def get_laporan_by_ids(
+    db: Database,
+    ids: List[int],
+    fields: Optional[Sequence[str]] = None
 ) -> Sequence[asyncpg.Record]:
     """
-    List laporan (admin view) with full details including kategori.
-    Can filter by status, kategori, provinsi, or kota if provided.
+    Laporan with the given ids (same columns as get_laporan_by_id), in no
+    particular order; ids that do not exist are simply absent.
     """
-    query = """
+    if fields:
+        query = _sparse_query(
+            "laporan.get_by_ids", _field_columns(fields), "WHERE l.id_laporan = ANY($1::int[])"
+        )
+        return await db.fetch(query, ids)
+    return await db.fetch(GET_BY_IDS, ids)
+
+
+# Admin list: one statement per (location scope, sort) pair instead of one query
+# text per filter combination. Every other filter is a NULL-able parameter, so
+# the set of statements stays fixed. The unused `$n IS NULL OR ...` branches
+# are only folded away in a custom plan, built for the actual values; pooled
+# connections force those (db.connection.PLAN_CACHE_MODE), since a generic
+# plan for these statements cannot use the filter indexes.
+#
+# Even with custom plans not every combination is index-driven (indexes in
+# sql/schema.sql, section 8):
+# - no filter (or only a range on the sort column) and the kota scope with
+#   sort=created_at: walk an index in sort order and stop at LIMIT;
+# - status / id_kategori (`= ANY`, even with one value), the provinsi scope
+#   (several kota) and a date range on the other sort column: matching rows
+#   come from an index but are then top-N sorted, so cost grows with the
+#   number of matches;
+# - has_foto=true only has a created_at index, so with sort=tanggal_hilang it
+#   walks the tanggal_hilang index and filters; has_foto=false has no index.
+_LIST_WHERE = """WHERE ($1::varchar[] IS NULL OR l.status = ANY($1))
+      AND ($2::int[] IS NULL OR l.id_kategori = ANY($2))
+      AND ($3::date IS NULL OR l.tanggal_hilang >= $3)
+      AND ($4::date IS NULL OR l.tanggal_hilang <= $4)
+      AND ($5::timestamp IS NULL OR l.created_at >= $5)
+      AND ($6::timestamp IS NULL OR l.created_at < $6)
+      AND ($7::boolean IS NULL OR (l.foto_url IS NOT NULL) = $7)
+"""
+
+_LIST_SELECT = f"""
     SELECT 
         l.id_laporan, l.nama_pelapor, l.judul_laporan, l.kontak_pelapor, 
         l.email_pelapor, l.deskripsi, l.tanggal_hilang, l.lokasi_hilang, l.latitude, l.longitude,
@@ -159,66 +492,181 @@ async def list_laporan(
     FROM laporan l
     LEFT JOIN kategori k ON l.id_kategori = k.id_kategori
     LEFT JOIN wilayah w ON l.id_kota = w.id_kota
-    WHERE 1=1
+    {_LIST_WHERE}"""
+
+# scope -> (extra predicate, LIMIT placeholder)
+_LIST_SCOPES = {
+    "all": ("", "$8"),
+    # Filter on laporan.id_kota so the (id_kota, created_at) index applies
+    "provinsi": ("AND l.id_kota IN (SELECT id_kota FROM wilayah WHERE id_provinsi = $8)", "$9"),
+    "kota": ("AND l.id_kota = $8 AND ($9::int IS NULL OR w.id_provinsi = $9)", "$10"),
+}
+
+LIST_SORTS = {
+    "created_at": "ORDER BY l.created_at DESC",
+    "tanggal_hilang": "ORDER BY l.tanggal_hilang DESC NULLS LAST, l.created_at DESC",
+}
+
+_LIST_QUERIES = {
+    (scope, sort): queries.register(
+        f"laporan.list.{scope}.{sort}",
+        f"{_LIST_SELECT}      {where}\n    {order}\n    LIMIT {limit}",
+    )
+    for scope, (where, limit) in _LIST_SCOPES.items()
+    for sort, order in LIST_SORTS.items()
+}
+
+
+def _list_query(scope: str, sort: str, fields: Optional[Sequence[str]]) -> queries.Query:
+    if not fields:
+        return _LIST_QUERIES[scope, sort]
+    where, limit = _LIST_SCOPES[scope]
+    return _sparse_query(
+        f"laporan.list.{scope}.{sort}",
+        _field_columns(fields),
+        f"{_LIST_WHERE}      {where}\n    {LIST_SORTS[sort]}\n    LIMIT {limit}",
+        # The kota scope filters on w.id_provinsi
+        ("w",) if scope == "kota" else (),
+    )
+
+
+async def list_laporan(
+    db: Database, 
+    status: Optional[List[str]] = None, 
+    id_kategori: Optional[List[int]] = None,
+    id_provinsi: Optional[int] = None,
+    id_kota: Optional[int] = None,
+    tanggal_hilang_from: Optional[date] = None,
+    tanggal_hilang_to: Optional[date] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    has_foto: Optional[bool] = None,
+    sort: str = "created_at",
+    limit: int = 100,
+    fields: Optional[Sequence[str]] = None
+) -> Sequence[asyncpg.Record]:
     """
-    
-    params = []
-    param_count = 1
-    
-    if status:
-        query += f" AND l.status = ${param_count}"
-        params.append(status)
-        param_count += 1
-    
-    if id_kategori:
-        query += f" AND l.id_kategori = ${param_count}"
-        params.append(id_kategori)
-        param_count += 1
-    
-    if id_provinsi:
-        query += f" AND w.id_provinsi = ${param_count}"
-        params.append(id_provinsi)
-        param_count += 1
-    
+    List laporan (admin view) with full details including kategori.
+    status and id_kategori accept several values (matched with = ANY). Date
+    ranges are inclusive for tanggal_hilang and half-open [from, to) for created_at.
+    sort is 'created_at' (newest first) or 'tanggal_hilang' (most recent loss first).
+    With `fields` only their columns are selected (see FIELD_COLUMNS).
+    """
+    filters = (
+        list(status) if status else None,
+        list(id_kategori) if id_kategori else None,
+        tanggal_hilang_from,
+        tanggal_hilang_to,
+        created_from,
+        created_to,
+        has_foto,
+    )
+
     if id_kota:
-        query += f" AND w.id_kota = ${param_count}"
-        params.append(id_kota)
-        param_count += 1
-    
-    query += f" ORDER BY l.created_at DESC LIMIT ${param_count}"
-    params.append(limit)
-    
-    return await db.fetch(query, *params)
+        return await db.fetch(_list_query("kota", sort, fields), *filters, id_kota, id_provinsi or None, limit)
+    if id_provinsi:
+        return await db.fetch(_list_query("provinsi", sort, fields), *filters, id_provinsi, limit)
+    return await db.fetch(_list_query("all", sort, fields), *filters, limit)
+
+
+GEOCODE_PENDING = queries.register("laporan.geocode_pending", """
+    SELECT id_laporan, latitude, longitude
+    FROM laporan
+    WHERE id_kota IS NULL
+      AND latitude IS NOT NULL
+      AND longitude IS NOT NULL
+      AND id_laporan > $1
+    ORDER BY id_laporan
+    LIMIT $2
+""")
+
+SET_KOTA_MANY = queries.register("laporan.set_kota_many", """
+    UPDATE laporan l
+    SET id_kota = v.id_kota
+    FROM unnest($1::int[], $2::int[]) AS v(id_laporan, id_kota)
+    WHERE l.id_laporan = v.id_laporan
+      AND l.id_kota IS NULL
+""")
 
 
-async def cleanup_old_laporan(db: Database, days: int = 30) -> int:
+async def backfill_id_kota(
+    db: Database,
+    lookup: Callable[[float, float], Optional[int]],
+    batch_size: int = 1000,
+    max_batches: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Fill in id_kota for laporan that have coordinates but no kota, using
+    `lookup(latitude, longitude)` (the in-process reverse geocoder). Walks the
+    table in id order, one UPDATE per batch. Returns (scanned, updated).
+    """
+    last_id = 0
+    scanned = 0
+    updated = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = await db.fetch(GEOCODE_PENDING, last_id, batch_size)
+        if not rows:
+            break
+        batches += 1
+        scanned += len(rows)
+        last_id = rows[-1][0]
+        ids = []
+        kota = []
+        for id_laporan, latitude, longitude in rows:
+            id_kota = lookup(latitude, longitude)
+            if id_kota is not None:
+                ids.append(id_laporan)
+                kota.append(id_kota)
+        if ids:
+            status = await db.execute(SET_KOTA_MANY, ids, kota)
+            updated += int(status.rsplit(" ", 1)[-1])
+        if len(rows) < batch_size:
+            break
+    return scanned, updated
+
+
+# The window is a parameter (date - int = date) so every `days` value shares one statement
+CLEANUP_OLD = queries.register("laporan.cleanup_old", f"""
+    WITH upd AS (
+        UPDATE laporan
+        SET status = 'Dihapus'
+        WHERE status = 'Aktif'
+          AND tanggal_hilang IS NOT NULL
+          AND tanggal_hilang <= CURRENT_DATE - $1::int
+        RETURNING id_laporan, token_cookie, status
+    ), logged AS (
+        {_LOG_CHANGES.format(change="status", source="upd")}
+    )
+    SELECT id_laporan FROM upd
+""")
+
+
+async def cleanup_old_laporan(db: Database, days: int = 30, outbox_channels: Sequence[str] = ()) -> int:
     """
     Mark laporan older than `days` (based on `tanggal_hilang`) as 'Dihapus'.
     Returns the number of rows affected.
     This helps automatically hide/remove reports that are older than the allowed window.
+    Reporters are notified on `outbox_channels` (none by default).
     """
-    # Use a fixed-interval SQL expression for portability: 30 days -> INTERVAL '30 days'
-    query = f"""
-    UPDATE laporan
-    SET status = 'Dihapus'
-    WHERE status = 'Aktif'
-      AND tanggal_hilang IS NOT NULL
-      AND tanggal_hilang <= CURRENT_DATE - INTERVAL '{days} days'
-    RETURNING id_laporan
-    """
-    rows = await db.fetch(query)
+    async with db.transaction() as tx:
+        rows = await tx.fetch(CLEANUP_OLD, days)
+        # Reporters are told in the same transaction (delivered by the outbox dispatcher)
+        await outbox_repo.enqueue_status_change(tx, [r[0] for r in rows], "expired", outbox_channels)
     affected_count = len(rows) if rows is not None else 0
     return affected_count
 
 
-async def record_cleanup_log(db: Database, affected: int, days: int = 30, triggered_by: str = None):
-    """
-    Insert a record into cleanup_logs to track cleanup runs.
-    """
-    query = """
+RECORD_CLEANUP_LOG = queries.register("laporan.record_cleanup_log", """
     INSERT INTO cleanup_logs (triggered_by, days_window, affected_count)
     VALUES ($1, $2, $3)
     RETURNING id_log
+""")
+
+
+async def record_cleanup_log(db: Database, affected: int, days: int = 30, triggered_by: str = None):
+    """
+    Insert a record into cleanup_logs to track cleanup runs.
     """
-    row = await db.fetchrow(query, triggered_by, days, affected)
+    row = await db.fetchrow(RECORD_CLEANUP_LOG, triggered_by, days, affected)
     return row
@@ -1,9 +1,17 @@
 """
 Notifikasi repository: database query logic for notification operations
 """
-from typing import Optional, Sequence
+from typing import List, Optional, Sequence
 import asyncpg
 from db.connection import Database
+from db import queries
+
+
+CREATE = queries.register("notifikasi.create", """
+    INSERT INTO notifikasi (id_laporan, pesan)
+    VALUES ($1, $2)
+    RETURNING id_notifikasi, id_laporan, pesan, status_baca, created_at
+""")
 
 
 async def create_notifikasi(
@@ -12,36 +20,100 @@ async def create_notifikasi(
     """
     Create a new notification (triggered when laporan is created or updated).
     """
-    query = """
+    return await db.fetchrow(CREATE, id_laporan, pesan)
+
+
+CREATE_MANY = queries.register("notifikasi.create_many", """
     INSERT INTO notifikasi (id_laporan, pesan)
-    VALUES ($1, $2)
-    RETURNING id_notifikasi, id_laporan, pesan, status_baca, created_at
+    SELECT * FROM unnest($1::int[], $2::text[])
+""")
+
+
+async def create_notifikasi_many(db: Database, id_laporan: List[int], pesan: List[str]) -> int:
+    """
+    Insert many notifications in one statement (parallel lists). Returns the row count.
+    """
+    status = await db.execute(CREATE_MANY, id_laporan, pesan)
+    return int(status.rsplit(" ", 1)[-1])
+
+
+CREATE_MANY_EXISTING = queries.register("notifikasi.create_many_existing", """
+    INSERT INTO notifikasi (id_laporan, pesan)
+    SELECT n.id_laporan, n.pesan
+    FROM unnest($1::int[], $2::text[]) AS n(id_laporan, pesan)
+    WHERE n.id_laporan IS NULL
+       OR EXISTS (SELECT 1 FROM laporan l WHERE l.id_laporan = n.id_laporan)
+""")
+
+
+async def create_notifikasi_many_existing(db: Database, id_laporan: List[int], pesan: List[str]) -> int:
+    """
+    Like create_notifikasi_many, but skip notifications whose laporan no longer
+    exists (archived or deleted since they were queued). Returns the row count.
     """
-    return await db.fetchrow(query, id_laporan, pesan)
+    status = await db.execute(CREATE_MANY_EXISTING, id_laporan, pesan)
+    return int(status.rsplit(" ", 1)[-1])
+
+
+LIST_UNREAD = queries.register("notifikasi.list_unread", """
+    SELECT id_notifikasi, id_laporan, pesan, status_baca, created_at 
+    FROM notifikasi 
+    WHERE status_baca = FALSE 
+    ORDER BY created_at DESC
+""")
+
+LIST_ALL = queries.register("notifikasi.list", """
+    SELECT id_notifikasi, id_laporan, pesan, status_baca, created_at 
+    FROM notifikasi 
+    ORDER BY created_at DESC
+""")
+
+
+# expand=laporan: the laporan summary the dropdown shows, joined in the same
+# query instead of one GET /laporan/{id} per notifikasi
+_LIST_EXPANDED = """
+    SELECT n.id_notifikasi, n.id_laporan, n.pesan, n.status_baca, n.created_at,
+           l.judul_laporan, l.status, k.nama_kategori, w.nama_kota, l.foto_url
+    FROM notifikasi n
+    LEFT JOIN laporan l ON l.id_laporan = n.id_laporan
+    LEFT JOIN kategori k ON k.id_kategori = l.id_kategori
+    LEFT JOIN wilayah w ON w.id_kota = l.id_kota
+    {where}
+    ORDER BY n.created_at DESC
+"""
+
+LIST_UNREAD_EXPANDED = queries.register(
+    "notifikasi.list_unread_expanded", _LIST_EXPANDED.format(where="WHERE n.status_baca = FALSE")
+)
+
+LIST_ALL_EXPANDED = queries.register(
+    "notifikasi.list_expanded", _LIST_EXPANDED.format(where="")
+)
 
 
 async def list_notifikasi(
-    db: Database, unread_only: bool = False
+    db: Database, unread_only: bool = False, expand_laporan: bool = False
 ) -> Sequence[asyncpg.Record]:
     """
     List notifications for admin.
     If unread_only=True, only return unread notifications.
+    With expand_laporan=True each row also carries judul_laporan, status,
+    nama_kategori, nama_kota and foto_url of its laporan (NULL if gone).
     """
+    if expand_laporan:
+        return await db.fetch(LIST_UNREAD_EXPANDED if unread_only else LIST_ALL_EXPANDED)
     if unread_only:
-        query = """
-        SELECT id_notifikasi, id_laporan, pesan, status_baca, created_at 
-        FROM notifikasi 
-        WHERE status_baca = FALSE 
-        ORDER BY created_at DESC
-        """
-        return await db.fetch(query)
+        return await db.fetch(LIST_UNREAD)
     else:
-        query = """
-        SELECT id_notifikasi, id_laporan, pesan, status_baca, created_at 
-        FROM notifikasi 
-        ORDER BY created_at DESC
-        """
-        return await db.fetch(query)
+        return await db.fetch(LIST_ALL)
+
+
+MARK_READ = queries.register("notifikasi.mark_read", """
+    UPDATE notifikasi 
+    SET status_baca = TRUE 
+    WHERE id_notifikasi = $1 
+    RETURNING id_notifikasi, status_baca
+""")
 
 
 async def mark_notifikasi_read(
@@ -51,10 +123,4 @@ async def mark_notifikasi_read(
     Mark a notification as read (status_baca = TRUE).
     Returns the updated row or None if not found.
     """
-    query = """
-    UPDATE notifikasi 
-    SET status_baca = TRUE 
-    WHERE id_notifikasi = $1 
-    RETURNING id_notifikasi, status_baca
-    """
-    return await db.fetchrow(query, id_notifikasi)
+    return await db.fetchrow(MARK_READ, id_notifikasi)
@@ -0,0 +1,175 @@
+"""
+Outbox repository: reporter notifications queued with laporan status changes
+"""
+import json
+from typing import List, Optional, Sequence
+import asyncpg
+from db.connection import Database
+from db import queries
+
+
+# One row per enabled channel the reporter left contact details for:
+# 'email' -> email_pelapor, 'kontak' -> kontak_pelapor (phone / WhatsApp).
+ENQUEUE = queries.register("outbox.enqueue", """
+    INSERT INTO outbox (id_laporan, event, channel, recipient, payload)
+    SELECT l.id_laporan, $2, c.channel, c.recipient,
+           jsonb_build_object('judul_laporan', l.judul_laporan, 'nama_pelapor', l.nama_pelapor,
+                              'status', l.status) || $4::jsonb
+    FROM laporan l
+    CROSS JOIN LATERAL (VALUES ('email', l.email_pelapor), ('kontak', l.kontak_pelapor)) AS c(channel, recipient)
+    WHERE l.id_laporan = ANY($1::int[])
+      AND c.channel = ANY($3::text[])
+      AND NULLIF(btrim(c.recipient), '') IS NOT NULL
+""")
+
+
+async def enqueue_status_change(
+    db: Database,
+    id_laporan: Sequence[int],
+    event: str,
+    channels: Sequence[str],
+    extra: Optional[dict] = None,
+) -> int:
+    """
+    Queue a notification about `event` for the reporters of `id_laporan`.
+    Pass the Transaction that changed the status so both commit together.
+    Returns the number of outbox rows written.
+    """
+    if not id_laporan or not channels:
+        return 0
+    status = await db.execute(
+        ENQUEUE, list(id_laporan), event, list(channels), json.dumps(extra or {})
+    )
+    return int(status.rsplit(" ", 1)[-1])
+
+
+# Lease a batch: pushing next_attempt_at forward hides the rows from other
+# dispatchers until the lease runs out (e.g. this worker died mid-send).
+CLAIM = queries.register("outbox.claim", """
+    UPDATE outbox o
+    SET attempts = o.attempts + 1,
+        next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $2)
+    WHERE o.id_outbox IN (
+        SELECT id_outbox FROM outbox
+        WHERE state = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+        ORDER BY next_attempt_at
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.id_outbox, o.id_laporan, o.event, o.channel, o.recipient, o.payload::text, o.attempts
+""")
+
+
+async def claim_batch(db: Database, limit: int, lease_seconds: float) -> List[dict]:
+    """
+    Lease up to `limit` due outbox rows for delivery.
+    """
+    rows = await db.fetch(CLAIM, limit, float(lease_seconds))
+    return [
+        {
+            "id_outbox": r[0],
+            "id_laporan": r[1],
+            "event": r[2],
+            "channel": r[3],
+            "recipient": r[4],
+            "payload": json.loads(r[5]) if r[5] else {},
+            "attempts": r[6],
+        }
+        for r in rows
+    ]
+
+
+MARK_SENT = queries.register("outbox.mark_sent", """
+    UPDATE outbox
+    SET state = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL
+    WHERE id_outbox = ANY($1::bigint[])
+""")
+
+
+async def mark_sent(db: Database, ids: Sequence[int]):
+    """
+    Mark delivered rows as sent.
+    """
+    if ids:
+        await db.execute(MARK_SENT, list(ids))
+
+
+MARK_FAILED = queries.register("outbox.mark_failed", """
+    UPDATE outbox o
+    SET state = CASE WHEN o.attempts >= $4 THEN 'dead' ELSE 'pending' END,
+        next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => f.retry_in),
+        last_error = f.error
+    FROM unnest($1::bigint[], $2::float8[], $3::text[]) AS f(id_outbox, retry_in, error)
+    WHERE o.id_outbox = f.id_outbox
+""")
+
+
+async def mark_failed(
+    db: Database, ids: Sequence[int], retry_in: Sequence[float], errors: Sequence[str], max_attempts: int
+):
+    """
+    Schedule failed rows for another attempt after `retry_in` seconds, or
+    dead-letter them once they reached `max_attempts`.
+    """
+    if ids:
+        await db.execute(MARK_FAILED, list(ids), list(retry_in), list(errors), max_attempts)
+
+
+STATS = queries.register("outbox.stats", """
+    SELECT state, channel, COUNT(*), MIN(created_at)
+    FROM outbox
+    GROUP BY state, channel
+    ORDER BY state, channel
+""")
+
+
+async def get_stats(db: Database) -> Sequence[asyncpg.Record]:
+    """
+    Row counts and oldest row per (state, channel).
+    """
+    return await db.fetch(STATS)
+
+
+LIST_DEAD = queries.register("outbox.list_dead", """
+    SELECT id_outbox, id_laporan, event, channel, attempts, last_error, created_at
+    FROM outbox
+    WHERE state = 'dead'
+    ORDER BY created_at DESC
+    LIMIT $1
+""")
+
+
+async def list_dead(db: Database, limit: int = 50) -> Sequence[asyncpg.Record]:
+    """
+    Most recent dead-lettered rows (recipient omitted).
+    """
+    return await db.fetch(LIST_DEAD, limit)
+
+
+RETRY_DEAD = queries.register("outbox.retry_dead", """
+    UPDATE outbox
+    SET state = 'pending', attempts = 0, next_attempt_at = CURRENT_TIMESTAMP
+    WHERE state = 'dead' AND ($1::bigint[] IS NULL OR id_outbox = ANY($1))
+""")
+
+
+async def retry_dead(db: Database, ids: Optional[Sequence[int]] = None) -> int:
+    """
+    Put dead-lettered rows (all, or only `ids`) back in the queue.
+    """
+    status = await db.execute(RETRY_DEAD, list(ids) if ids else None)
+    return int(status.rsplit(" ", 1)[-1])
+
+
+PURGE_SENT = queries.register("outbox.purge_sent", """
+    DELETE FROM outbox
+    WHERE state = 'sent' AND sent_at < CURRENT_TIMESTAMP - make_interval(days => $1)
+""")
+
+
+async def purge_sent(db: Database, days: int = 7) -> int:
+    """
+    Delete rows delivered more than `days` days ago.
+    """
+    status = await db.execute(PURGE_SENT, days)
+    return int(status.rsplit(" ", 1)[-1])
@@ -0,0 +1,92 @@
+"""
+Stats repository: queries over the laporan_stats_harian rollup
+"""
+from typing import Optional, Sequence
+import asyncpg
+from db.connection import Database
+from db import queries
+
+
+TOTALS = queries.register("stats.totals", """
+    SELECT t.dimensi, t.status, t.id_kategori, k.nama_kategori,
+           t.id_provinsi, p.nama_provinsi, t.jumlah
+    FROM (
+        SELECT
+            CASE WHEN GROUPING(s.status) = 0 THEN 'status'
+                 WHEN GROUPING(s.id_kategori) = 0 THEN 'kategori'
+                 ELSE 'provinsi' END AS dimensi,
+            s.status, s.id_kategori, s.id_provinsi,
+            SUM(s.jumlah)::int AS jumlah
+        FROM laporan_stats_harian s
+        GROUP BY GROUPING SETS ((s.status), (s.id_kategori), (s.id_provinsi))
+        HAVING SUM(s.jumlah) <> 0
+    ) t
+    LEFT JOIN kategori k
+        ON t.dimensi = 'kategori' AND k.id_kategori = t.id_kategori
+    LEFT JOIN (SELECT DISTINCT id_provinsi, nama_provinsi FROM wilayah) p
+        ON t.dimensi = 'provinsi' AND p.id_provinsi = t.id_provinsi
+    ORDER BY t.dimensi, t.jumlah DESC
+""")
+
+
+async def get_totals(db: Database) -> Sequence[asyncpg.Record]:
+    """
+    All-time totals per status, kategori and provinsi in a single pass over the rollup.
+    Each row carries a `dimensi` column ('status', 'kategori' or 'provinsi').
+    """
+    return await db.fetch(TOTALS)
+
+
+TREND = queries.register("stats.trend", """
+    SELECT date_trunc($1, s.tanggal)::date AS bucket, s.id_provinsi,
+           SUM(s.jumlah)::int AS jumlah
+    FROM laporan_stats_harian s
+    WHERE s.tanggal >= CURRENT_DATE - $2::int
+      AND ($3::int IS NULL OR s.id_provinsi = $3)
+    GROUP BY 1, 2
+    HAVING SUM(s.jumlah) <> 0
+    ORDER BY 1, 2
+""")
+
+
+async def get_trend(
+    db: Database,
+    bucket: str = "day",
+    days: int = 30,
+    id_provinsi: Optional[int] = None,
+) -> Sequence[asyncpg.Record]:
+    """
+    Number of laporan created per time bucket ('day', 'week' or 'month') and provinsi
+    over the last `days` days. Cost depends on the number of rollup buckets, not laporan rows.
+    """
+    return await db.fetch(TREND, bucket, days, id_provinsi)
+
+
+COUNT_ROWS = queries.register("stats.count_rows", """
+    SELECT COUNT(*) FROM laporan_stats_harian
+""")
+
+
+REBUILD = queries.register("stats.rebuild", """
+    INSERT INTO laporan_stats_harian (tanggal, id_provinsi, id_kategori, status, jumlah)
+    SELECT COALESCE(l.created_at, CURRENT_TIMESTAMP)::date, COALESCE(w.id_provinsi, 0),
+           COALESCE(l.id_kategori, 0), COALESCE(l.status, 'Aktif'), COUNT(*)
+    FROM (
+        SELECT created_at, id_kota, id_kategori, status FROM laporan
+        UNION ALL
+        SELECT created_at, id_kota, id_kategori, status FROM laporan_arsip
+    ) l
+    LEFT JOIN wilayah w ON l.id_kota = w.id_kota
+    GROUP BY 1, 2, 3, 4
+""")
+
+
+async def rebuild_laporan_stats(db: Database) -> int:
+    """
+    Recompute the rollup from laporan and laporan_arsip (repair tool, e.g. after wilayah changes).
+    Runs in one transaction, so readers never see a half-built rollup. Returns the number of rollup rows.
+    """
+    async with db.transaction() as tx:
+        await tx.execute("TRUNCATE laporan_stats_harian")
+        await tx.execute(REBUILD)
+        return await tx.fetchval(COUNT_ROWS)
@@ -1,13 +1,17 @@
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from models.wilayah import Wilayah
+# SQLAlchemy is imported on first query, not at app import (worker cold start)
+
+async def get_all_provinsi(session):
+    from sqlalchemy import select
+    from models.wilayah import Wilayah
 
-async def get_all_provinsi(session: AsyncSession):
     # Return Wilayah objects grouped by id_provinsi, nama_provinsi
     result = await session.execute(select(Wilayah.id_provinsi, Wilayah.nama_provinsi).distinct())
     # Use namedtuple-like access for compatibility with improved endpoint
     return result.all()
 
-async def get_kota_by_provinsi(session: AsyncSession, id_provinsi: int):
+async def get_kota_by_provinsi(session, id_provinsi: int):
+    from sqlalchemy import select
+    from models.wilayah import Wilayah
+
     result = await session.execute(select(Wilayah).where(Wilayah.id_provinsi == id_provinsi))
     return result.scalars().all()
@@ -1,18 +1,18 @@
 """
 Admin routes for authentication and admin operations
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from datetime import datetime, timedelta
-import jwt
-import bcrypt
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
 from db.connection import Database
 from db.dependencies import get_db
 from models.admin import AdminLogin, AdminLoginResponse, AdminOut
 from repositories.admin_repo import get_admin_by_username, get_admin_by_id, create_admin
-from repositories import laporan_repo
+from repositories import laporan_repo, stats_repo, arsip_repo, outbox_repo, cluster_repo, foto_replikasi_repo
+from controllers.wilayah_controller import load_wilayah_caches
+from utils import geocoder, image_spool, metrics, outbox
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -24,12 +24,16 @@ ACCESS_TOKEN_EXPIRE_HOURS = 24
 
 def hash_password(password: str) -> str:
     """Hash password using bcrypt"""
+    import bcrypt  # imported on first use to keep worker start fast
+
     salt = bcrypt.gensalt()
     return bcrypt.hashpw(password.encode(), salt).decode()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
+    import bcrypt
+
     try:
         # hashed_password from DB is a string like "$2b$12$..."
         # bcrypt.checkpw expects: checkpw(password: bytes, hashed_password: bytes)
@@ -43,6 +47,8 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def create_access_token(admin_id: int, username: str, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
+    import jwt  # imported on first use to keep worker start fast
+
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -60,6 +66,8 @@ def create_access_token(admin_id: int, username: str, expires_delta: Optional[ti
 
 def verify_token(token: str) -> dict:
     """Verify JWT token and return payload"""
+    import jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
@@ -218,8 +226,8 @@ async def trigger_cleanup(
 
     admin_username = payload.get("username")
 
-    # Run cleanup
-    affected = await laporan_repo.cleanup_old_laporan(db, days=days)
+    # Run cleanup (reporters are notified through the outbox)
+    affected = await laporan_repo.cleanup_old_laporan(db, days=days, outbox_channels=outbox.CHANNELS)
     # Record cleanup log
     try:
         await laporan_repo.record_cleanup_log(db, affected, days=days, triggered_by=admin_username)
@@ -228,3 +236,340 @@ async def trigger_cleanup(
         return {"success": True, "affected": affected, "logged": False}
 
     return {"success": True, "affected": affected, "logged": True}
+
+
+def _laporan_row(r) -> dict:
+    """Admin view of a laporan / laporan_arsip row (laporan_repo column order)."""
+    out = {
+        "id_laporan": r["id_laporan"],
+        "nama_pelapor": r["nama_pelapor"],
+        "judul_laporan": r["judul_laporan"],
+        "kontak_pelapor": r["kontak_pelapor"],
+        "email_pelapor": r["email_pelapor"],
+        "deskripsi": r["deskripsi"],
+        "tanggal_hilang": str(r["tanggal_hilang"]) if r["tanggal_hilang"] else None,
+        "lokasi_hilang": r["lokasi_hilang"],
+        "latitude": r["latitude"],
+        "longitude": r["longitude"],
+        "id_kategori": r["id_kategori"],
+        "kategori_nama": r["nama_kategori"],
+        "foto_url": r["foto_url"],
+        "status": r["status"],
+        "created_at": str(r["created_at"]) if r["created_at"] else None,
+        "id_kota": r["id_kota"],
+        "nama_kota": r["nama_kota"],
+        "id_provinsi": r["id_provinsi"],
+        "nama_provinsi": r["nama_provinsi"],
+        "archived": False,
+    }
+    if "archived_at" in r.keys():
+        out["archived"] = True
+        out["archived_at"] = str(r["archived_at"]) if r["archived_at"] else None
+    return out
+
+
+@router.post("/arsip/run")
+async def run_archive(
+    token: str,
+    selesai_days: int = arsip_repo.ARCHIVE_SELESAI_DAYS,
+    batch_size: int = arsip_repo.ARCHIVE_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    db: Database = Depends(get_db)
+):
+    """
+    Move 'Dihapus' laporan and 'Selesai' laporan older than `selesai_days` out of
+    the hot table into laporan_arsip, in batches of `batch_size`.
+    """
+    payload = verify_token(token)
+    if batch_size < 1 or batch_size > 50000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="batch_size must be between 1 and 50000",
+        )
+
+    moved = await arsip_repo.archive_laporan(
+        db, selesai_days=selesai_days, batch_size=batch_size, max_batches=max_batches
+    )
+    try:
+        await laporan_repo.record_cleanup_log(
+            db, moved, days=selesai_days, triggered_by=f"archive:{payload.get('username')}"
+        )
+    except Exception:
+        return {"success": True, "archived": moved, "logged": False}
+
+    return {"success": True, "archived": moved, "logged": True}
+
+
+@router.get("/arsip")
+async def list_arsip(
+    token: str,
+    status_filter: Optional[str] = None,
+    before: Optional[datetime] = None,
+    limit: int = 100,
+    db: Database = Depends(get_db)
+):
+    """
+    List archived laporan, newest first. Page by passing the `created_at` of the
+    last row as `before`.
+    """
+    verify_token(token)
+    rows = await arsip_repo.list_arsip(db.for_read(), status=status_filter, before=before, limit=limit)
+    return [_laporan_row(r) for r in rows]
+
+
+@router.get("/laporan/{id_laporan}")
+async def get_laporan_any(
+    id_laporan: int,
+    token: str,
+    db: Database = Depends(get_db)
+):
+    """Get a laporan by id from the hot table or, if it was archived, from laporan_arsip."""
+    verify_token(token)
+    row = await laporan_repo.get_laporan_by_id(db, id_laporan)
+    if row is None:
+        row = await arsip_repo.get_arsip_by_id(db, id_laporan)
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Laporan not found",
+        )
+    return _laporan_row(row)
+
+
+@router.post("/geocode/backfill")
+async def geocode_backfill(
+    token: str,
+    batch_size: int = 1000,
+    max_batches: Optional[int] = None,
+    reload: bool = False,
+    db: Database = Depends(get_db)
+):
+    """
+    Fill in id_kota for laporan that have latitude/longitude but no kota, using
+    the in-process reverse geocoder. `reload` rebuilds it (and the wilayah
+    search index) from `wilayah` first, after kab/kota were added.
+    """
+    verify_token(token)
+    if batch_size < 1 or batch_size > 50000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="batch_size must be between 1 and 50000",
+        )
+    if reload or not geocoder.ready():
+        await load_wilayah_caches(db)
+    if not geocoder.ready():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Geocoder has no kab/kota centroids",
+        )
+
+    with metrics.JOB_DURATION.time("geocode_backfill"):
+        scanned, updated = await laporan_repo.backfill_id_kota(
+            db, geocoder.lookup, batch_size=batch_size, max_batches=max_batches
+        )
+    return {"success": True, "scanned": scanned, "updated": updated}
+
+
+@router.get("/outbox")
+async def get_outbox(token: str, dead_limit: int = 50, db: Database = Depends(get_db)):
+    """
+    Reporter notification outbox: row counts per state and channel (with the
+    oldest row, i.e. how far delivery is behind) and the latest dead-lettered rows.
+    """
+    verify_token(token)
+    dead_limit = max(1, min(dead_limit, 500))
+    stats = await outbox_repo.get_stats(db)
+    dead = await outbox_repo.list_dead(db, dead_limit)
+    return {
+        "dispatcher_running": outbox.dispatcher.running,
+        "channels": outbox.CHANNELS,
+        "stats": [
+            {
+                "state": r[0],
+                "channel": r[1],
+                "count": r[2],
+                "oldest": r[3].isoformat() if r[3] else None,
+            }
+            for r in stats
+        ],
+        "dead": [
+            {
+                "id_outbox": r["id_outbox"],
+                "id_laporan": r["id_laporan"],
+                "event": r["event"],
+                "channel": r["channel"],
+                "attempts": r["attempts"],
+                "last_error": r["last_error"],
+                "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+            }
+            for r in dead
+        ],
+    }
+
+
+@router.get("/foto-replikasi")
+async def get_foto_replikasi(token: str, limit: int = 50, db: Database = Depends(get_db)):
+    """
+    Local image spool: backlog waiting for replication to GitHub (files,
+    bytes, lag = age of the oldest) and the oldest pending files with their
+    last error.
+    """
+    verify_token(token)
+    limit = max(1, min(limit, 500))
+    files, size, lag = await foto_replikasi_repo.get_backlog(db)
+    pending = await foto_replikasi_repo.list_pending(db, limit)
+    return {
+        "replicator_running": image_spool.replicator.running,
+        "remote_configured": image_spool.replicator.remote_configured,
+        "backlog_files": files,
+        "backlog_bytes": size,
+        "lag_seconds": round(lag, 1) if lag is not None else None,
+        "pending": [
+            {
+                "id_replikasi": r["id_replikasi"],
+                "nama_file": r["nama_file"],
+                "ukuran": r["ukuran"],
+                "attempts": r["attempts"],
+                "next_attempt_at": r["next_attempt_at"].isoformat() if r["next_attempt_at"] else None,
+                "last_error": r["last_error"],
+                "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+            }
+            for r in pending
+        ],
+    }
+
+
+@router.post("/outbox/retry")
+async def retry_outbox(
+    token: str,
+    ids: Optional[List[int]] = Query(None),
+    db: Database = Depends(get_db)
+):
+    """
+    Re-queue dead-lettered outbox rows (all of them, or only `ids`).
+    """
+    verify_token(token)
+    requeued = await outbox_repo.retry_dead(db, ids)
+    outbox.dispatcher.wake()
+    return {"success": True, "requeued": requeued}
+
+
+@router.get("/stats")
+async def get_stats(
+    token: str,
+    bucket: str = "day",
+    days: int = 30,
+    id_provinsi: Optional[int] = None,
+    db: Database = Depends(get_db)
+):
+    """
+    Dashboard statistics served from the `laporan_stats_harian` rollup.
+    Returns all-time totals per status, kategori and provinsi, plus a trend series
+    (laporan created per `bucket`: day/week/month) per provinsi over the last `days` days.
+    """
+    verify_token(token)
+
+    if bucket not in ("day", "week", "month"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bucket must be one of: day, week, month",
+        )
+    if days < 1 or days > 3660:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="days must be between 1 and 3660",
+        )
+
+    totals = await stats_repo.get_totals(db)
+    trend_rows = await stats_repo.get_trend(db, bucket=bucket, days=days, id_provinsi=id_provinsi)
+
+    by_status = {}
+    by_kategori = []
+    by_provinsi = []
+    nama_provinsi = {}
+    for r in totals:
+        if r["dimensi"] == "status":
+            by_status[r["status"]] = r["jumlah"]
+        elif r["dimensi"] == "kategori":
+            by_kategori.append({
+                "id_kategori": r["id_kategori"] or None,
+                "nama_kategori": r["nama_kategori"],
+                "jumlah": r["jumlah"],
+            })
+        else:
+            nama_provinsi[r["id_provinsi"]] = r["nama_provinsi"]
+            by_provinsi.append({
+                "id_provinsi": r["id_provinsi"] or None,
+                "nama_provinsi": r["nama_provinsi"],
+                "jumlah": r["jumlah"],
+            })
+
+    # Group trend points into one series per provinsi
+    series = {}
+    for r in trend_rows:
+        key = r["id_provinsi"]
+        if key not in series:
+            series[key] = {
+                "id_provinsi": key or None,
+                "nama_provinsi": nama_provinsi.get(key),
+                "points": [],
+            }
+        series[key]["points"].append({"bucket": str(r["bucket"]), "jumlah": r["jumlah"]})
+
+    return {
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "by_kategori": by_kategori,
+        "by_provinsi": by_provinsi,
+        "trend": {
+            "bucket": bucket,
+            "days": days,
+            "series": list(series.values()),
+        },
+    }
+
+
+@router.post("/stats/rebuild")
+async def rebuild_stats(
+    token: str,
+    db: Database = Depends(get_db)
+):
+    """
+    Recompute the statistics rollup from the laporan table.
+    Only needed for repair; the rollup is normally maintained by a trigger.
+    """
+    verify_token(token)
+    rows = await stats_repo.rebuild_laporan_stats(db)
+    return {"success": True, "rollup_rows": rows}
+
+
+@router.post("/clusters/rebuild")
+async def rebuild_clusters(
+    token: str,
+    db: Database = Depends(get_db)
+):
+    """
+    Recompute the map tile aggregate (laporan_tiles) from the laporan table.
+    Only needed for repair; it is normally maintained by triggers.
+    """
+    verify_token(token)
+    rows = await cluster_repo.rebuild_tiles(db)
+    return {"success": True, "tile_rows": rows}
+
+
+@router.get("/debug/queries")
+async def debug_queries(
+    token: str,
+    limit: int = 50,
+    reset: bool = False,
+    db: Database = Depends(get_db)
+):
+    """
+    Recent slow queries (parameters redacted) and per-fingerprint aggregates
+    recorded by the Database wrapper. Pass `reset=true` to clear after reading.
+    """
+    verify_token(token)
+    snapshot = db.query_log.snapshot(limit=max(1, min(limit, 500)))
+    if reset:
+        db.query_log.reset()
+    return snapshot
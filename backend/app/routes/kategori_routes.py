@@ -1,17 +1,24 @@
 from fastapi import APIRouter, Depends
 from db.dependencies import get_db
 from db.connection import Database
+from db import queries
 from typing import List, Dict
 
 router = APIRouter(prefix="/kategori", tags=["kategori"])
 
+LIST_KATEGORI = queries.register(
+    "kategori.list", "SELECT id_kategori, nama_kategori FROM kategori ORDER BY id_kategori ASC"
+)
+GET_KATEGORI = queries.register(
+    "kategori.get", "SELECT id_kategori, nama_kategori FROM kategori WHERE id_kategori = $1"
+)
+
 
 @router.get("")
 async def get_all_kategori(db: Database = Depends(get_db)):
     """Get all product categories"""
     try:
-        query = "SELECT id_kategori, nama_kategori FROM kategori ORDER BY id_kategori ASC"
-        rows = await db.fetch(query)
+        rows = await db.for_read().fetch(LIST_KATEGORI)
         
         if not rows:
             return []
@@ -31,8 +38,7 @@ async def get_all_kategori(db: Database = Depends(get_db)):
 async def get_kategori_by_id(id_kategori: int, db: Database = Depends(get_db)):
     """Get specific category by ID"""
     try:
-        query = "SELECT id_kategori, nama_kategori FROM kategori WHERE id_kategori = $1"
-        row = await db.fetchrow(query, id_kategori)
+        row = await db.for_read().fetchrow(GET_KATEGORI, id_kategori)
         
         if not row:
             return {"error": "Kategori tidak ditemukan"}
@@ -1,8 +1,9 @@
 """
 Laporan routes: endpoint definitions for lost item reports
 """
-from fastapi import APIRouter, Response, Cookie, Depends, UploadFile, File
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Response, Cookie, Depends, UploadFile, File, Query, Header
+from datetime import date, datetime
+from typing import List, Optional
 import os
 import logging
 
@@ -10,7 +11,9 @@ from db.dependencies import get_db
 from db.connection import Database
 from models.laporan import LaporanCreate, LaporanOut
 from controllers import laporan_controller
-from utils.github_storage import GitHubStorage
+from routes.admin_routes import verify_token
+from repositories import foto_hash_repo
+from utils import idempotency, image_spool, metrics, photo_hash, upload_sessions
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/laporan", tags=["laporan"])
@@ -21,33 +24,144 @@ async def create_laporan(
     laporan: LaporanCreate,
     response: Response,
     db: Database = Depends(get_db),
-    laporan_token: Optional[str] = Cookie(None)
+    laporan_token: Optional[str] = Cookie(None),
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.HEADER)
 ):
-    """Create a new laporan (lost item report)"""
+    """
+    Create a new laporan (lost item report).
+    Send an Idempotency-Key header to make retries safe.
+    """
     return await laporan_controller.create_laporan_handler(
-        laporan=laporan, response=response, db=db, laporan_token=laporan_token
+        laporan=laporan, response=response, db=db, laporan_token=laporan_token,
+        idempotency_key=idempotency_key
+    )
+
+
+@router.post("/bulk")
+async def bulk_import_laporan(
+    request: Request,
+    token: str,
+    format: Optional[str] = None,
+    notify: str = "each",
+    dry_run: bool = False,
+    return_ids: bool = False,
+    source: Optional[str] = None,
+    db: Database = Depends(get_db)
+):
+    """
+    Bulk import laporan from a partner desk (admin only).
+    Send the file as the raw request body: CSV with a header row
+    (Content-Type: text/csv) or NDJSON (application/x-ndjson).
+    Columns are the POST /laporan fields; `kategori`, `kota` and `provinsi`
+    may be given by name instead of id_kategori / id_kota.
+    notify: each (one notifikasi per laporan), summary (one for the import) or none.
+    """
+    verify_token(token)
+    body = await request.body()
+    return await laporan_controller.bulk_import_handler(
+        body=body,
+        content_type=request.headers.get("content-type"),
+        fmt=format,
+        notify=notify,
+        dry_run=dry_run,
+        return_ids=return_ids,
+        source=source,
+        db=db
     )
 
 
 @router.get("/mine")
 async def get_my_laporan(
     laporan_token: Optional[str] = Cookie(None),
+    fields: Optional[str] = Query(None, description="comma-separated fields to return, e.g. judul_laporan,status,foto_url"),
     db: Database = Depends(get_db)
 ):
     """Get laporan for the current reporter (via cookie)"""
     return await laporan_controller.get_my_laporan_handler(
-        laporan_token=laporan_token, db=db
+        laporan_token=laporan_token, db=db, fields=fields
+    )
+
+
+# Registered before /{id_laporan} so "clusters" / "changes" / "batch" are not parsed as an id
+@router.get("/clusters")
+async def get_clusters(
+    bbox: str,
+    zoom: int,
+    status: str = "Aktif",
+    id_kategori: Optional[int] = None,
+    db: Database = Depends(get_db)
+):
+    """
+    Map clusters for the viewport: `bbox=min_lon,min_lat,max_lon,max_lat` and
+    the map `zoom`. Each cluster has a count, centroid, most common kategori
+    and the cell bounds (zoom in on them to split the cluster).
+    `status` is a comma-separated list (default Aktif).
+    """
+    return await laporan_controller.get_clusters_handler(
+        bbox=bbox, zoom=zoom, status=status, id_kategori=id_kategori, db=db
+    )
+
+
+@router.get("/changes")
+async def get_changes(
+    since: Optional[str] = None,
+    limit: int = 500,
+    mine: bool = False,
+    laporan_token: Optional[str] = Cookie(None),
+    db: Database = Depends(get_db)
+):
+    """
+    Incremental sync: laporan created, changed status or archived since the
+    `since` cursor (the `next` of the previous call). `mine=true` limits the
+    feed to the reporter's own laporan (cookie required).
+    """
+    return await laporan_controller.get_changes_handler(
+        since=since, limit=limit, mine=mine, laporan_token=laporan_token, db=db
+    )
+
+
+@router.get("/batch")
+async def get_laporan_batch(
+    ids: str = Query(..., description="comma-separated id_laporan, at most 100"),
+    fields: Optional[str] = Query(None, description="comma-separated fields to return, e.g. judul_laporan,status,foto_url"),
+    db: Database = Depends(get_db),
+    laporan_token: Optional[str] = Cookie(None)
+):
+    """
+    Several laporan by id in one request (e.g. the laporan referenced by a
+    page of notifikasi) instead of one GET /laporan/{id} each.
+    """
+    return await laporan_controller.get_laporan_batch_handler(
+        ids=ids, db=db, laporan_token=laporan_token, fields=fields
     )
 
 
 @router.get("/{id_laporan}")
 async def get_laporan_detail(
     id_laporan: int,
-    db: Database = Depends(get_db)
+    fields: Optional[str] = Query(None, description="comma-separated fields to return, e.g. judul_laporan,status,foto_url"),
+    db: Database = Depends(get_db),
+    laporan_token: Optional[str] = Cookie(None)
 ):
-    """Get a single laporan by ID with full details"""
+    """Get a single laporan by ID with full details (or only `fields`)"""
     return await laporan_controller.get_laporan_by_id_handler(
-        id_laporan=id_laporan, db=db
+        id_laporan=id_laporan, db=db, laporan_token=laporan_token, fields=fields
+    )
+
+
+@router.get("/{id_laporan}/similar-photos")
+async def get_similar_photos(
+    id_laporan: int,
+    max_distance: int = photo_hash.DEFAULT_MAX_DISTANCE,
+    limit: int = 20,
+    db: Database = Depends(get_db)
+):
+    """
+    Laporan whose photo looks like this laporan's photo (perceptual hash
+    Hamming distance up to `max_distance` of 64 bits, max 16), nearest first.
+    """
+    return await laporan_controller.similar_photos_handler(
+        id_laporan=id_laporan, max_distance=max_distance, limit=limit, db=db
     )
 
 
@@ -77,54 +191,199 @@ async def delete_laporan(
 
 @router.get("")
 async def list_all_laporan(
-    status: Optional[str] = None,
-    id_kategori: Optional[int] = None,
+    status: Optional[List[str]] = Query(None),
+    id_kategori: Optional[List[int]] = Query(None),
     id_provinsi: Optional[int] = None,
     id_kota: Optional[int] = None,
+    tanggal_hilang_from: Optional[date] = None,
+    tanggal_hilang_to: Optional[date] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    has_foto: Optional[bool] = None,
+    sort: str = "created_at",
     limit: int = 100,
-    db: Database = Depends(get_db)
+    fields: Optional[str] = Query(None, description="comma-separated fields to return, e.g. judul_laporan,status,foto_url"),
+    db: Database = Depends(get_db),
+    laporan_token: Optional[str] = Cookie(None)
 ):
-    """List laporan with optional filters (kategori, provinsi, kota, status)"""
+    """
+    List laporan with optional filters (kategori, provinsi, kota, status).
+    Repeat status / id_kategori to match several values, e.g. ?status=Aktif&status=Selesai.
+    sort: created_at (default) or tanggal_hilang.
+    fields: only these fields per laporan (id_laporan is always included).
+    """
     return await laporan_controller.list_laporan_handler(
         status=status,
         id_kategori=id_kategori,
         id_provinsi=id_provinsi,
         id_kota=id_kota,
+        tanggal_hilang_from=tanggal_hilang_from,
+        tanggal_hilang_to=tanggal_hilang_to,
+        created_from=created_from,
+        created_to=created_to,
+        has_foto=has_foto,
+        sort=sort,
         limit=limit,
-        db=db
+        db=db,
+        laporan_token=laporan_token,
+        fields=fields
     )
 
 
+async def _fingerprint(db: Database, url: str, content: bytes):
+    """Perceptual hash for similar-photo search; never fails the upload."""
+    try:
+        with metrics.UPLOAD_STAGE_DURATION.time("fingerprint"):
+            value = await photo_hash.fingerprint(content)
+            if value is None:
+                return
+            await foto_hash_repo.save_hash(db, url, photo_hash.to_signed(value))
+        photo_hash.index.add(url, value)
+    except Exception as e:
+        logger.warning(f"Could not store photo fingerprint for {url}: {e}")
+
+
+async def _store_image(db: Database, content: bytes, filename: str) -> dict:
+    """Commit a validated image to storage (single-shot and resumable uploads)."""
+    # Local durable spool; pushed to GitHub in the background (utils.image_spool)
+    with metrics.UPLOAD_STAGE_DURATION.time("spool"):
+        url = await image_spool.store(db, content, filename)
+    metrics.UPLOADS.inc("success")
+    if url:
+        await _fingerprint(db, url, content)
+
+    return {
+        "success": True,
+        "url": url,
+        "message": "File berhasil diupload"
+    }
+
+
 @router.post("/upload-image")
-async def upload_image(file: UploadFile = File(...)):
-    """Upload image to GitHub storage"""
+async def upload_image(
+    response: Response,
+    file: UploadFile = File(...),
+    db: Database = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.HEADER)
+):
+    """
+    Upload image to GitHub storage.
+    Send an Idempotency-Key header so a retried upload is not stored twice.
+    """
     try:
         # Validate file type
         if not file.content_type.startswith('image/'):
+            metrics.UPLOADS.inc("rejected")
             return {
                 "success": False,
                 "message": "Hanya file gambar yang diizinkan"
             }
 
         # Read content and validate size (5MB max)
-        content = await file.read()
+        with metrics.UPLOAD_STAGE_DURATION.time("read"):
+            content = await file.read()
         if len(content) > 5 * 1024 * 1024:
+            metrics.UPLOADS.inc("rejected")
             return {
                 "success": False,
                 "message": "Ukuran file tidak boleh lebih dari 5MB"
             }
 
-        # Upload to GitHub (pass raw bytes to avoid temp files)
-        github_storage = GitHubStorage()
-        url = github_storage.upload_file(content, filename=file.filename)
+        async def _store():
+            return await _store_image(db, content, file.filename), True
 
+        if not idempotency_key:
+            result, _ = await _store()
+            return result
+
+        result, replayed = await idempotency.store.run(
+            db, "laporan.upload_image", idempotency_key,
+            idempotency.request_hash(file.filename, content), _store,
+        )
+        if replayed:
+            metrics.UPLOADS.inc("replayed")
+            response.headers["Idempotent-Replayed"] = "true"
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        metrics.UPLOADS.inc("error")
+        logger.exception(f"Upload error: {str(e)}")
         return {
-            "success": True,
-            "url": url,
-            "message": "File berhasil diupload"
+            "success": False,
+            "message": f"Gagal upload file: {str(e)}"
         }
 
+
+# --- Resumable uploads (see utils.upload_sessions) ---
+
+def _upload_headers(session: dict) -> dict:
+    return {
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["length"]),
+        "Cache-Control": "no-store",
+    }
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload(
+    response: Response,
+    filename: str = Query(..., max_length=255),
+    content_type: str = Query(..., max_length=100),
+    upload_length: int = Header(..., alias="Upload-Length"),
+):
+    """
+    Start a resumable image upload of `Upload-Length` bytes (5MB max).
+    Send the bytes with PATCH /laporan/uploads/{upload_id}, then finalize.
+    """
+    session = await upload_sessions.sessions.create(filename, content_type, upload_length)
+    response.headers["Location"] = f"{router.prefix}/uploads/{session['upload_id']}"
+    response.headers.update(_upload_headers(session))
+    return session
+
+
+@router.head("/uploads/{upload_id}")
+async def upload_offset(upload_id: str):
+    """Current offset (bytes received) of an upload, to resume after a dropped connection."""
+    session = await upload_sessions.sessions.status(upload_id)
+    return Response(status_code=200, headers=_upload_headers(session))
+
+
+@router.patch("/uploads/{upload_id}", status_code=204)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+):
+    """
+    Append the raw request body at `Upload-Offset`, which must equal the
+    server's current offset (409 otherwise; ask HEAD and resume from there).
+    """
+    received = bytearray()
+    with metrics.UPLOAD_STAGE_DURATION.time("read"):
+        async for chunk in request.stream():
+            received.extend(chunk)
+            if len(received) > upload_sessions.MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Data melebihi Upload-Length")
+    offset = await upload_sessions.sessions.append(upload_id, upload_offset, bytes(received))
+    return Response(status_code=204, headers={"Upload-Offset": str(offset)})
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, db: Database = Depends(get_db)):
+    """
+    Store a complete upload (same response as POST /laporan/upload-image).
+    Safe to retry: a finalized upload returns its stored result.
+    """
+    try:
+        return await upload_sessions.sessions.finalize(
+            upload_id, lambda content, filename: _store_image(db, content, filename)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
+        metrics.UPLOADS.inc("error")
         logger.exception(f"Upload error: {str(e)}")
         return {
             "success": False,
@@ -132,6 +391,12 @@ async def upload_image(file: UploadFile = File(...)):
         }
 
 
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def cancel_upload(upload_id: str):
+    """Abandon an upload and free its spool space."""
+    await upload_sessions.sessions.delete(upload_id)
+    return Response(status_code=204)
+
 
 @router.post("/logout")
 async def logout(response: Response):
@@ -0,0 +1,14 @@
+"""
+Metrics route: Prometheus scrape endpoint
+"""
+from fastapi import APIRouter, Response
+
+from utils import metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Expose request, database, pool, job and upload metrics in Prometheus text format"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -14,11 +14,16 @@ router = APIRouter(prefix="/notifikasi", tags=["notifikasi"])
 @router.get("")
 async def list_notifikasi(
     unread_only: Optional[bool] = False,
+    expand: Optional[str] = None,
     db: Database = Depends(get_db)
 ):
-    """List notifications for admin"""
+    """
+    List notifications for admin.
+    `expand=laporan` embeds each laporan's summary (judul, status, kategori,
+    kota, foto) so the dropdown needs no per-item GET /laporan/{id}.
+    """
     return await notifikasi_controller.list_notifikasi_handler(
-        unread_only=unread_only, db=db
+        unread_only=unread_only, expand=expand, db=db
     )
 
 
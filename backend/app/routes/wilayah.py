@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from db.session import get_async_session
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from db.connection import Database
+from db.dependencies import get_db
+from db.session import get_read_session
+from controllers import wilayah_controller
 from repositories.wilayah_repository import get_all_provinsi, get_kota_by_provinsi
 
 router = APIRouter(prefix="/wilayah", tags=["Wilayah"])
 
 @router.get("/provinsi")
-async def provinsi(session: AsyncSession = Depends(get_async_session)):
+async def provinsi(session=Depends(get_read_session)):
     data = await get_all_provinsi(session)
     # Remove duplicates and return sorted list
     seen = set()
@@ -20,9 +23,23 @@ async def provinsi(session: AsyncSession = Depends(get_async_session)):
     return provinsi_list
 
 @router.get("/kota/{id_provinsi}")
-async def kota(id_provinsi: int, session: AsyncSession = Depends(get_async_session)):
+async def kota(id_provinsi: int, session=Depends(get_read_session)):
     data = await get_kota_by_provinsi(session, id_provinsi)
     # Return sorted list of cities for the province
     kota_list = [{"id_kota": k.id_kota, "nama_kota": k.nama_kota} for k in data]
     kota_list.sort(key=lambda x: x["nama_kota"])
     return kota_list
+
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = 10,
+    type: Optional[str] = None,
+    db: Database = Depends(get_db)
+):
+    """
+    Autocomplete provinsi and kab/kota names ("sura" -> Kota Surabaya), case-
+    and accent-insensitive, typo-tolerant. `type=kota|provinsi` restricts results.
+    Served from an in-memory index built at startup.
+    """
+    return await wilayah_controller.search_wilayah_handler(q=q, limit=limit, type=type, db=db)
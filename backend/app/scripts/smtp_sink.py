@@ -0,0 +1,89 @@
+"""
+Minimal SMTP sink for trying the outbox email channel locally.
+
+Accepts every message and prints sender, recipients, subject and body; nothing
+is delivered. Speaks just enough SMTP for smtplib (EHLO/HELO, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT); no STARTTLS or AUTH, so leave SMTP_USER and
+SMTP_STARTTLS unset.
+
+Usage (from backend/app):
+    python scripts/smtp_sink.py --port 1025
+    SMTP_HOST=127.0.0.1 SMTP_PORT=1025 uvicorn main:app
+"""
+import argparse
+import asyncio
+from email import message_from_bytes, policy
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    async def reply(line: str):
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    sender = None
+    recipients = []
+    await reply("220 smtp-sink ready")
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                await reply("250-smtp-sink")
+                await reply("250 8BITMIME")
+            elif verb == "HELO":
+                await reply("250 smtp-sink")
+            elif verb == "MAIL":
+                sender = command.split(":", 1)[1].strip()
+                recipients = []
+                await reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip())
+                await reply("250 OK")
+            elif verb == "DATA":
+                await reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = await reader.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    # Undo dot-stuffing
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                message = message_from_bytes(b"".join(lines), policy=policy.default)
+                body = message.get_body(("plain",))
+                print(f"--- from {sender} to {', '.join(recipients)}")
+                print(f"Subject: {message['Subject']}")
+                print(body.get_content() if body is not None else "")
+                await reply("250 OK: queued")
+            elif verb == "RSET":
+                sender, recipients = None, []
+                await reply("250 OK")
+            elif verb == "NOOP":
+                await reply("250 OK")
+            elif verb == "QUIT":
+                await reply("221 Bye")
+                break
+            else:
+                await reply("502 Command not implemented")
+    finally:
+        writer.close()
+
+
+async def main(host: str, port: int):
+    server = await asyncio.start_server(_handle, host, port)
+    print(f"SMTP sink listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -69,3 +69,410 @@ CREATE TABLE IF NOT EXISTS cleanup_logs (
     days_window INT,
     affected_count INT
 );
+
+-- 7. Rollup harian untuk statistik dashboard admin.
+-- Satu baris per (tanggal dibuat, provinsi, kategori, status). Dijaga secara
+-- inkremental oleh trigger per statement di bawah sehingga /admin/stats tidak
+-- perlu GROUP BY atas seluruh tabel laporan. id_provinsi/id_kategori 0 = tidak
+-- diketahui.
+CREATE TABLE IF NOT EXISTS laporan_stats_harian (
+    tanggal DATE NOT NULL,
+    id_provinsi INT NOT NULL DEFAULT 0,
+    id_kategori INT NOT NULL DEFAULT 0,
+    status VARCHAR(50) NOT NULL,
+    jumlah INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tanggal, id_provinsi, id_kategori, status)
+);
+
+-- Versi lama: satu upsert per baris (trigger FOR EACH ROW)
+DROP TRIGGER IF EXISTS laporan_stats_sync ON laporan;
+DROP FUNCTION IF EXISTS laporan_stats_apply(TIMESTAMP, INT, INT, VARCHAR, INT);
+
+-- Apply deltas (-1 old row / +1 new row) per bucket in one grouped upsert.
+-- Buckets are upserted in key order so concurrent statements lock the hot
+-- rows in the same order.
+CREATE OR REPLACE FUNCTION laporan_stats_apply(
+    p_created_at TIMESTAMP[], p_id_kota INT[], p_id_kategori INT[], p_status VARCHAR[], p_delta INT[]
+) RETURNS VOID AS $$
+    INSERT INTO laporan_stats_harian (tanggal, id_provinsi, id_kategori, status, jumlah)
+    SELECT COALESCE(d.created_at, CURRENT_TIMESTAMP)::date, COALESCE(w.id_provinsi, 0),
+           COALESCE(d.id_kategori, 0), COALESCE(d.status, 'Aktif'), SUM(d.delta)
+    FROM unnest(p_created_at, p_id_kota, p_id_kategori, p_status, p_delta)
+        AS d(created_at, id_kota, id_kategori, status, delta)
+    LEFT JOIN wilayah w ON w.id_kota = d.id_kota
+    GROUP BY 1, 2, 3, 4
+    HAVING SUM(d.delta) <> 0
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (tanggal, id_provinsi, id_kategori, status)
+    DO UPDATE SET jumlah = laporan_stats_harian.jumlah + EXCLUDED.jumlah;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION laporan_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM laporan_stats_apply(
+            array_agg(created_at), array_agg(id_kota), array_agg(id_kategori), array_agg(status),
+            array_agg(1)
+        ) FROM new_rows
+        HAVING COUNT(*) > 0;
+    ELSE
+        -- Only rows whose status, kota or kategori changed
+        PERFORM laporan_stats_apply(
+            array_agg(d.created_at), array_agg(d.id_kota), array_agg(d.id_kategori), array_agg(d.status),
+            array_agg(d.delta)
+        )
+        FROM old_rows o
+        JOIN new_rows n USING (id_laporan)
+        CROSS JOIN LATERAL (VALUES
+            (o.created_at, o.id_kota, o.id_kategori, o.status, -1),
+            (n.created_at, n.id_kota, n.id_kategori, n.status, 1)
+        ) AS d(created_at, id_kota, id_kategori, status, delta)
+        WHERE (o.status, o.id_kota, o.id_kategori) IS DISTINCT FROM (n.status, n.id_kota, n.id_kategori)
+        HAVING COUNT(*) > 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Per statement with transition tables (like laporan_tiles below): a bulk
+-- import or cleanup applies one grouped upsert instead of one per row.
+-- Transition tables allow only one event per trigger and no column list.
+-- DELETE is not tracked: archived laporan keep counting.
+DROP TRIGGER IF EXISTS laporan_stats_insert ON laporan;
+CREATE TRIGGER laporan_stats_insert
+    AFTER INSERT ON laporan REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION laporan_stats_trigger();
+DROP TRIGGER IF EXISTS laporan_stats_update ON laporan;
+CREATE TRIGGER laporan_stats_update
+    AFTER UPDATE ON laporan REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION laporan_stats_trigger();
+
+-- Isi awal rollup untuk database yang sudah berisi laporan
+INSERT INTO laporan_stats_harian (tanggal, id_provinsi, id_kategori, status, jumlah)
+SELECT COALESCE(l.created_at, CURRENT_TIMESTAMP)::date, COALESCE(w.id_provinsi, 0), COALESCE(l.id_kategori, 0),
+       COALESCE(l.status, 'Aktif'), COUNT(*)
+FROM laporan l
+LEFT JOIN wilayah w ON l.id_kota = w.id_kota
+WHERE NOT EXISTS (SELECT 1 FROM laporan_stats_harian)
+GROUP BY 1, 2, 3, 4;
+
+-- 8. Indeks untuk GET /laporan, /laporan/mine, cleanup dan notifikasi.
+-- Tanpa filter selektif planner menelusuri indeks urutan (created_at /
+-- tanggal_hilang) dan berhenti di LIMIT, begitu juga satu kota dengan
+-- (id_kota, created_at). Filter status/kategori memakai indeks (kolom filter,
+-- created_at) untuk mencari baris lalu diurutkan; has_foto dengan
+-- sort=tanggal_hilang tidak punya indeks. Lihat komentar di
+-- laporan_repo.list_laporan.
+CREATE INDEX IF NOT EXISTS idx_laporan_created_at
+    ON laporan (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_laporan_status_created_at
+    ON laporan (status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_laporan_kategori_created_at
+    ON laporan (id_kategori, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_laporan_kota_created_at
+    ON laporan (id_kota, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_laporan_tanggal_hilang
+    ON laporan (tanggal_hilang DESC NULLS LAST, created_at DESC);
+-- Juga dipakai job cleanup (status = 'Aktif' AND tanggal_hilang <= ...)
+CREATE INDEX IF NOT EXISTS idx_laporan_status_tanggal_hilang
+    ON laporan (status, tanggal_hilang DESC NULLS LAST, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_laporan_foto_created_at
+    ON laporan (created_at DESC) WHERE foto_url IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_laporan_token_created_at
+    ON laporan (token_cookie, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_wilayah_provinsi
+    ON wilayah (id_provinsi);
+CREATE INDEX IF NOT EXISTS idx_notifikasi_created_at
+    ON notifikasi (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notifikasi_unread_created_at
+    ON notifikasi (created_at DESC) WHERE status_baca = FALSE;
+-- FK ON DELETE CASCADE dari laporan
+CREATE INDEX IF NOT EXISTS idx_notifikasi_laporan
+    ON notifikasi (id_laporan);
+
+-- 9. Arsip laporan (hot/cold split).
+-- Laporan 'Dihapus' dan laporan 'Selesai' yang sudah lama dipindahkan per batch
+-- dari `laporan` ke tabel ini oleh arsip_repo.archive_laporan, sehingga tabel
+-- `laporan` dan indeksnya hanya sebesar laporan yang masih relevan. Kolom sama
+-- dengan `laporan` (id_laporan dipertahankan) ditambah waktu pengarsipan.
+-- Notifikasi milik laporan yang diarsipkan ikut terhapus (ON DELETE CASCADE);
+-- rollup statistik tidak berubah karena trigger tidak menangani DELETE.
+CREATE TABLE IF NOT EXISTS laporan_arsip (
+    id_laporan INT PRIMARY KEY,
+    token_cookie UUID,
+    nama_pelapor VARCHAR(100) NOT NULL,
+    kontak_pelapor VARCHAR(100),
+    email_pelapor VARCHAR(100),
+    judul_laporan VARCHAR(150) NOT NULL,
+    deskripsi TEXT,
+    id_kota INT,
+    tanggal_hilang DATE,
+    lokasi_hilang TEXT,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    id_kategori INT,
+    foto_url TEXT,
+    status VARCHAR(50),
+    created_at TIMESTAMP,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_laporan_arsip_created_at
+    ON laporan_arsip (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_laporan_arsip_status_created_at
+    ON laporan_arsip (status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_laporan_arsip_token
+    ON laporan_arsip (token_cookie);
+
+-- 10. Reverse geocoding backfill
+-- Laporan yang punya koordinat tetapi belum punya id_kota (diisi oleh job
+-- backfill geocoder); indeks parsial tetap kecil karena baris yang sudah
+-- terisi keluar dari indeks.
+CREATE INDEX IF NOT EXISTS idx_laporan_geocode_pending
+    ON laporan (id_laporan)
+    WHERE id_kota IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL;
+
+-- 11. Idempotency-Key untuk POST /laporan dan upload gambar.
+-- Satu baris per (scope, kunci): 'pending' selama request pertama berjalan,
+-- lalu 'done' dengan respons yang disimpan untuk diputar ulang saat klien
+-- mengirim ulang request yang sama. Baris kedaluwarsa dihapus oleh job harian.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope VARCHAR(50) NOT NULL,
+    idem_key VARCHAR(100) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    state VARCHAR(10) NOT NULL DEFAULT 'pending',
+    status_code INT,
+    response JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    -- Baris 'pending' milik request yang masih berjalan (diperpanjang selama
+    -- berjalan); lewat dari ini worker-nya dianggap mati dan key boleh diambil alih
+    lease_until TIMESTAMP,
+    -- Ditulis oleh setiap claim; renew/complete/release hanya berlaku untuk
+    -- pemilik lease ini, bukan request yang sudah diambil alih
+    lease_token UUID,
+    PRIMARY KEY (scope, idem_key)
+);
+-- Tabel yang dibuat sebelum kolom lease_until / lease_token ada
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP;
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS lease_token UUID;
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at
+    ON idempotency_keys (expires_at);
+
+-- 12. Outbox notifikasi untuk pelapor (email / kontak).
+-- Ditulis dalam transaksi yang sama dengan perubahan status laporan, lalu
+-- dikirim oleh dispatcher di background. Baris 'pending' diambil dengan lease
+-- (next_attempt_at dimajukan) sehingga beberapa worker tidak mengirim ganda;
+-- setelah OUTBOX_MAX_ATTEMPTS gagal baris menjadi 'dead' (dead letter).
+-- Tanpa FK ke laporan: baris tetap ada walau laporannya diarsipkan.
+CREATE TABLE IF NOT EXISTS outbox (
+    id_outbox BIGSERIAL PRIMARY KEY,
+    id_laporan INT,
+    event VARCHAR(30) NOT NULL,
+    channel VARCHAR(20) NOT NULL,
+    recipient VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    state VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending
+    ON outbox (next_attempt_at) WHERE state = 'pending';
+CREATE INDEX IF NOT EXISTS idx_outbox_state_created_at
+    ON outbox (state, created_at);
+
+-- 13. Log perubahan laporan untuk sinkronisasi inkremental (GET /laporan/changes).
+-- Satu baris per laporan baru dan per perubahan status, ditulis oleh query
+-- tulis di laporan_repo dalam statement yang sama. Kursor klien adalah
+-- (xid, id_change): xid transaksi penulis (pg_current_xact_id()) dan hanya
+-- baris dengan xid < pg_snapshot_xmin(...) yang dikirim, sehingga baris dari
+-- transaksi yang commit belakangan tidak pernah terlewat oleh kursor.
+-- token_cookie disalin agar feed per pelapor tidak perlu JOIN ke laporan.
+-- Baris lebih tua dari LAPORAN_CHANGES_RETENTION_DAYS dihapus oleh job harian.
+CREATE TABLE IF NOT EXISTS laporan_changes (
+    id_change BIGSERIAL PRIMARY KEY,
+    xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    id_laporan INT NOT NULL,
+    token_cookie UUID,
+    change VARCHAR(10) NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_laporan_changes_cursor
+    ON laporan_changes (xid, id_change);
+CREATE INDEX IF NOT EXISTS idx_laporan_changes_token_cursor
+    ON laporan_changes (token_cookie, xid, id_change);
+CREATE INDEX IF NOT EXISTS idx_laporan_changes_changed_at
+    ON laporan_changes (changed_at);
+-- Kursor (xid, id_change) terbesar yang pernah dihapus oleh job harian (satu
+-- baris). Kursor klien di bawahnya mungkin melewatkan perubahan yang sudah
+-- dihapus, jadi feed menjawab reset: true dan klien memuat ulang daftar.
+CREATE TABLE IF NOT EXISTS laporan_changes_horizon (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    xid XID8 NOT NULL,
+    id_change BIGINT NOT NULL,
+    purged_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 14. Agregat tile multi-resolusi untuk peta (GET /laporan/clusters).
+-- Satu baris per (zoom, tile x, tile y, status, kategori) pada beberapa level
+-- grid Web Mercator (zoom 4, 6, 8, 10, 12, 14; harus sama dengan
+-- TILE_LEVELS di repositories/cluster_repo.py), berisi jumlah laporan dan
+-- jumlah lat/lon untuk centroid. Dijaga inkremental oleh trigger per
+-- statement (transition table), sehingga import massal dan cleanup
+-- mengagregasi delta sekali per statement, bukan per baris. Laporan tanpa
+-- koordinat tidak masuk; laporan yang diarsipkan (DELETE) dikurangi.
+CREATE TABLE IF NOT EXISTS laporan_tiles (
+    zoom SMALLINT NOT NULL,
+    tx INT NOT NULL,
+    ty INT NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    id_kategori INT NOT NULL DEFAULT 0,
+    jumlah INT NOT NULL DEFAULT 0,
+    sum_lat DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_lon DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (zoom, tx, ty, status, id_kategori)
+);
+
+CREATE OR REPLACE FUNCTION laporan_tile_xy(
+    p_lat DOUBLE PRECISION, p_lon DOUBLE PRECISION, p_zoom INT, OUT tx INT, OUT ty INT
+) AS $$
+    SELECT LEAST(GREATEST(floor((p_lon + 180.0) / 360.0 * n)::int, 0), n - 1),
+           LEAST(GREATEST(floor((1.0 - ln(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi()) / 2.0 * n)::int, 0), n - 1)
+    FROM (SELECT 1 << p_zoom AS n, LEAST(GREATEST(p_lat, -85.0511), 85.0511) AS lat) c
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Apply deltas (-1 old row / +1 new row) at every level in one upsert
+CREATE OR REPLACE FUNCTION laporan_tiles_apply(
+    p_lat DOUBLE PRECISION[], p_lon DOUBLE PRECISION[], p_status VARCHAR[], p_id_kategori INT[], p_delta INT[]
+) RETURNS VOID AS $$
+    INSERT INTO laporan_tiles (zoom, tx, ty, status, id_kategori, jumlah, sum_lat, sum_lon)
+    SELECT z, t.tx, t.ty, COALESCE(d.status, 'Aktif'), COALESCE(d.id_kategori, 0),
+           SUM(d.delta), SUM(d.delta * d.latitude), SUM(d.delta * d.longitude)
+    FROM unnest(p_lat, p_lon, p_status, p_id_kategori, p_delta) AS d(latitude, longitude, status, id_kategori, delta)
+    CROSS JOIN unnest(ARRAY[4, 6, 8, 10, 12, 14]) AS z
+    CROSS JOIN LATERAL laporan_tile_xy(d.latitude, d.longitude, z) t
+    WHERE d.latitude IS NOT NULL AND d.longitude IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5
+    HAVING SUM(d.delta) <> 0
+    ON CONFLICT (zoom, tx, ty, status, id_kategori) DO UPDATE
+    SET jumlah = laporan_tiles.jumlah + EXCLUDED.jumlah,
+        sum_lat = laporan_tiles.sum_lat + EXCLUDED.sum_lat,
+        sum_lon = laporan_tiles.sum_lon + EXCLUDED.sum_lon;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION laporan_tiles_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM laporan_tiles_apply(
+            array_agg(latitude), array_agg(longitude), array_agg(status), array_agg(id_kategori),
+            array_agg(1)
+        ) FROM new_rows WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        HAVING COUNT(*) > 0;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM laporan_tiles_apply(
+            array_agg(latitude), array_agg(longitude), array_agg(status), array_agg(id_kategori),
+            array_agg(-1)
+        ) FROM old_rows WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        HAVING COUNT(*) > 0;
+    ELSE
+        -- Only rows whose position, status or kategori changed (skips e.g. id_kota backfills)
+        PERFORM laporan_tiles_apply(
+            array_agg(d.latitude), array_agg(d.longitude), array_agg(d.status), array_agg(d.id_kategori),
+            array_agg(d.delta)
+        )
+        FROM old_rows o
+        JOIN new_rows n USING (id_laporan)
+        CROSS JOIN LATERAL (VALUES
+            (o.latitude, o.longitude, o.status, o.id_kategori, -1),
+            (n.latitude, n.longitude, n.status, n.id_kategori, 1)
+        ) AS d(latitude, longitude, status, id_kategori, delta)
+        WHERE (o.latitude, o.longitude, o.status, o.id_kategori)
+              IS DISTINCT FROM (n.latitude, n.longitude, n.status, n.id_kategori)
+        HAVING COUNT(*) > 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow only one event per trigger
+DROP TRIGGER IF EXISTS laporan_tiles_insert ON laporan;
+CREATE TRIGGER laporan_tiles_insert
+    AFTER INSERT ON laporan REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION laporan_tiles_trigger();
+DROP TRIGGER IF EXISTS laporan_tiles_update ON laporan;
+CREATE TRIGGER laporan_tiles_update
+    AFTER UPDATE ON laporan REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION laporan_tiles_trigger();
+DROP TRIGGER IF EXISTS laporan_tiles_delete ON laporan;
+CREATE TRIGGER laporan_tiles_delete
+    AFTER DELETE ON laporan REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION laporan_tiles_trigger();
+
+-- Isi awal agregat untuk database yang sudah berisi laporan
+INSERT INTO laporan_tiles (zoom, tx, ty, status, id_kategori, jumlah, sum_lat, sum_lon)
+SELECT z, t.tx, t.ty, COALESCE(l.status, 'Aktif'), COALESCE(l.id_kategori, 0),
+       COUNT(*), SUM(l.latitude), SUM(l.longitude)
+FROM laporan l
+CROSS JOIN unnest(ARRAY[4, 6, 8, 10, 12, 14]) AS z
+CROSS JOIN LATERAL laporan_tile_xy(l.latitude, l.longitude, z) t
+WHERE l.latitude IS NOT NULL AND l.longitude IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM laporan_tiles)
+GROUP BY 1, 2, 3, 4, 5;
+
+-- 15. Sidik jari foto (perceptual hash) untuk GET /laporan/{id}/similar-photos.
+-- dHash 64-bit (disimpan sebagai BIGINT bertanda) per foto yang diupload,
+-- dihitung saat upload. Indeks pencarian (multi-index hash) ada di memori
+-- tiap worker dan dimuat ulang secara inkremental dengan kursor (xid, id_hash)
+-- seperti laporan_changes, agar baris yang commit belakangan tidak terlewat.
+CREATE TABLE IF NOT EXISTS foto_hash (
+    id_hash BIGSERIAL PRIMARY KEY,
+    xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    foto_url TEXT NOT NULL UNIQUE,
+    phash BIGINT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_foto_hash_cursor
+    ON foto_hash (xid, id_hash);
+-- Mencari laporan dari foto_url hasil pencarian
+CREATE INDEX IF NOT EXISTS idx_laporan_foto_url
+    ON laporan (foto_url) WHERE foto_url IS NOT NULL;
+
+-- 16. Spool foto lokal dan replikasi ke penyimpanan remote (GitHub).
+-- Setiap upload ditulis dulu ke disk lokal (fsync) dan langsung dijawab dengan
+-- URL /static/images/...; satu baris 'pending' per file lalu didorong ke remote
+-- oleh replikator di background (lease + backoff seperti outbox). Setelah
+-- berhasil, foto_url di laporan, laporan_arsip dan foto_hash diganti ke URL
+-- remote (state 'done'); file lokal dan barisnya dihapus oleh job harian
+-- setelah IMAGE_SPOOL_RETENTION_DAYS. Sebelum file dihapus, rewrite diulang
+-- untuk laporan yang disimpan dengan URL lokal saat replikasi sedang commit.
+-- Spool ada di disk tiap host, jadi baris hanya di-claim oleh host yang
+-- menyimpannya (kolom host).
+CREATE TABLE IF NOT EXISTS foto_replikasi (
+    id_replikasi BIGSERIAL PRIMARY KEY,
+    nama_file VARCHAR(255) NOT NULL UNIQUE,
+    local_url TEXT NOT NULL,
+    remote_url TEXT,
+    ukuran INT NOT NULL,
+    -- Host yang menyimpan file di spool lokalnya (NULL: baris lama, host mana pun)
+    host VARCHAR(255),
+    state VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    replicated_at TIMESTAMP
+);
+-- Tabel yang dibuat sebelum kolom host ada
+ALTER TABLE foto_replikasi ADD COLUMN IF NOT EXISTS host VARCHAR(255);
+CREATE INDEX IF NOT EXISTS idx_foto_replikasi_pending
+    ON foto_replikasi (next_attempt_at) WHERE state = 'pending';
+CREATE INDEX IF NOT EXISTS idx_foto_replikasi_local_url
+    ON foto_replikasi (local_url);
+CREATE INDEX IF NOT EXISTS idx_foto_replikasi_replicated_at
+    ON foto_replikasi (replicated_at) WHERE state = 'done';
+CREATE INDEX IF NOT EXISTS idx_laporan_arsip_foto_url
+    ON laporan_arsip (foto_url) WHERE foto_url IS NOT NULL;
@@ -0,0 +1,48 @@
+"""
+GET /laporan/changes must answer reset: true to any cursor that may have
+missed purged changes, including the "xmin:0" cursors idle polls return.
+"""
+import pytest
+
+from controllers import laporan_controller
+from repositories import laporan_repo
+
+pytestmark = pytest.mark.anyio
+
+
+async def _poll(db, since=None):
+    return await laporan_controller.get_changes_handler(since=since, laporan_token=None, db=db)
+
+
+async def _log_old_change(db, days_ago: int):
+    await db.execute(
+        """
+        INSERT INTO laporan_changes (id_laporan, change, status, changed_at)
+        VALUES (0, 'status', 'Selesai', CURRENT_TIMESTAMP - make_interval(days => $1))
+        """,
+        days_ago,
+    )
+
+
+async def test_idle_cursor_is_reset_after_purge(db):
+    idle = (await _poll(db))["next"]
+    assert idle.endswith(":0")
+
+    await _log_old_change(db, laporan_repo.CHANGES_RETENTION_DAYS + 1)
+    assert await laporan_repo.purge_changes(db) >= 1
+
+    response = await _poll(db, idle)
+    assert response["reset"] is True
+    assert response["changes"] == []
+
+    # The cursor handed out with the reset is past the horizon
+    assert (await _poll(db, response["next"]))["reset"] is False
+
+
+async def test_cursor_past_the_horizon_is_not_reset(db):
+    await _log_old_change(db, laporan_repo.CHANGES_RETENTION_DAYS + 1)
+    await laporan_repo.purge_changes(db)
+
+    cursor = (await _poll(db))["next"]
+    assert (await _poll(db, cursor))["reset"] is False
+    assert (await _poll(db, "0"))["reset"] is True
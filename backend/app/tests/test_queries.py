@@ -0,0 +1,30 @@
+"""
+db.queries.prepare_all warms asyncpg's private statement cache; these tests
+fail if an asyncpg upgrade moves it, instead of the warming silently stopping.
+"""
+import pytest
+
+from db import queries
+from repositories import laporan_repo
+
+pytestmark = pytest.mark.anyio
+
+SELECT_ONE = queries.register("test.select_one", "SELECT $1::int + 1")
+
+
+async def test_prepare_all_fills_the_cache_fetch_uses(db):
+    async with db.pool.acquire() as conn:
+        # Warmed by the pool's init hook (queries.prepare_all)
+        for query in (SELECT_ONE, laporan_repo.GET_BY_ID, laporan_repo.CHANGES_HORIZON):
+            assert queries._is_cached(conn, query), query.name
+
+        size = len(conn._stmt_cache)
+        assert await conn.fetchval(SELECT_ONE, 1) == 2
+        assert await conn.fetchrow(laporan_repo.GET_BY_ID, -1) is None
+        # Served from the warmed entries, not prepared again
+        assert len(conn._stmt_cache) == size
+
+
+async def test_pool_connections_use_custom_plans(db):
+    async with db.pool.acquire() as conn:
+        assert await conn.fetchval("SHOW plan_cache_mode") == "force_custom_plan"
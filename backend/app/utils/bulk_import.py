@@ -0,0 +1,166 @@
+"""
+Parsing and validation for bulk laporan imports (POST /laporan/bulk).
+
+Partner desks send CSV (header row) or NDJSON (one JSON object per line) with
+the LaporanCreate fields. kategori and kota may be given by name instead of id
+(`kategori`, `kota`, optionally `provinsi` to disambiguate); names are resolved
+in memory against the kategori/wilayah tables, loaded once per import.
+"""
+import csv
+import io
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models.laporan import LaporanCreate
+from utils.names import normalize_name, strip_kota_prefix
+
+FORMATS = ("csv", "ndjson")
+
+# Lengths of the laporan columns LaporanCreate does not bound itself
+_MAX_LENGTHS = {"kontak_pelapor": 100, "email_pelapor": 100}
+
+# Name columns accepted in place of ids
+_NAME_ALIASES = {
+    "kategori": "kategori", "nama_kategori": "kategori",
+    "kota": "kota", "nama_kota": "kota",
+    "provinsi": "provinsi", "nama_provinsi": "provinsi",
+}
+
+
+def detect_format(content_type: Optional[str]) -> str:
+    content_type = (content_type or "").lower()
+    if "ndjson" in content_type or "jsonl" in content_type or "json" in content_type:
+        return "ndjson"
+    return "csv"
+
+
+def iter_rows(text: str, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Yield (line number, row dict, parse error) for each data row. Empty CSV
+    cells become None; keys are lower-cased.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        if reader.fieldnames:
+            reader.fieldnames = [(f or "").strip().lower() for f in reader.fieldnames]
+        for row in reader:
+            data = {}
+            for key, value in row.items():
+                if key is None:
+                    # More cells than header columns
+                    continue
+                if isinstance(value, str):
+                    value = value.strip() or None
+                data[key] = value
+            if any(v is not None for v in data.values()):
+                yield reader.line_num, data, None
+        return
+
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield line_no, None, "each line must be a JSON object"
+            continue
+        yield line_no, {str(k).lower(): v for k, v in data.items()}, None
+
+
+class NameResolver:
+    """In-memory kategori / kota / provinsi name -> id lookup."""
+
+    def __init__(self, kategori_rows, wilayah_rows):
+        self.kategori: Dict[str, int] = {}
+        self.kategori_ids = set()
+        for r in kategori_rows:
+            self.kategori[normalize_name(r["nama_kategori"])] = r["id_kategori"]
+            self.kategori_ids.add(r["id_kategori"])
+
+        self.provinsi: Dict[str, int] = {}
+        # name (with and without the Kota/Kabupaten prefix) -> [(id_kota, id_provinsi)]
+        self.kota: Dict[str, List[Tuple[int, int]]] = {}
+        self.kota_ids = set()
+        for r in wilayah_rows:
+            self.provinsi[normalize_name(r["nama_provinsi"])] = r["id_provinsi"]
+            self.kota_ids.add(r["id_kota"])
+            entry = (r["id_kota"], r["id_provinsi"])
+            name = normalize_name(r["nama_kota"])
+            self.kota.setdefault(name, []).append(entry)
+            bare = strip_kota_prefix(name)
+            if bare != name:
+                self.kota.setdefault(bare, []).append(entry)
+
+    def resolve_kategori(self, name: str) -> Tuple[Optional[int], Optional[str]]:
+        id_kategori = self.kategori.get(normalize_name(name))
+        if id_kategori is None:
+            return None, f"unknown kategori '{name}'"
+        return id_kategori, None
+
+    def resolve_kota(self, name: str, provinsi: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+        candidates = self.kota.get(normalize_name(name), [])
+        if provinsi:
+            id_provinsi = self.provinsi.get(normalize_name(provinsi))
+            if id_provinsi is None:
+                return None, f"unknown provinsi '{provinsi}'"
+            candidates = [c for c in candidates if c[1] == id_provinsi]
+        # The same kota listed twice (e.g. "Surabaya" and "Kota Surabaya") is not ambiguous
+        ids = sorted({c[0] for c in candidates})
+        if not ids:
+            return None, f"unknown kota '{name}'"
+        if len(ids) > 1:
+            return None, f"ambiguous kota '{name}', use the full name (Kota/Kabupaten) or add provinsi"
+        return ids[0], None
+
+
+def validate_row(data: dict, resolver: NameResolver) -> Tuple[Optional[LaporanCreate], List[dict]]:
+    """
+    Resolve names to ids and validate one row with LaporanCreate.
+    Returns (laporan, []) or (None, errors).
+    """
+    errors = []
+    fields = {}
+    names = {}
+    for key, value in data.items():
+        if key in _NAME_ALIASES:
+            if value is not None:
+                names[_NAME_ALIASES[key]] = str(value).strip()
+        else:
+            fields[key] = value
+
+    if fields.get("id_kategori") is None and names.get("kategori"):
+        fields["id_kategori"], error = resolver.resolve_kategori(names["kategori"])
+        if error:
+            errors.append({"field": "kategori", "message": error})
+    if fields.get("id_kota") is None and names.get("kota"):
+        fields["id_kota"], error = resolver.resolve_kota(names["kota"], names.get("provinsi"))
+        if error:
+            errors.append({"field": "kota", "message": error})
+
+    try:
+        laporan = LaporanCreate(**fields)
+    except ValidationError as e:
+        for err in e.errors():
+            errors.append({
+                "field": ".".join(str(p) for p in err.get("loc", ())),
+                "message": err.get("msg"),
+            })
+        return None, errors
+
+    if laporan.id_kategori is not None and laporan.id_kategori not in resolver.kategori_ids:
+        errors.append({"field": "id_kategori", "message": f"unknown id_kategori {laporan.id_kategori}"})
+    if laporan.id_kota is not None and laporan.id_kota not in resolver.kota_ids:
+        errors.append({"field": "id_kota", "message": f"unknown id_kota {laporan.id_kota}"})
+    for field, max_length in _MAX_LENGTHS.items():
+        value = getattr(laporan, field)
+        if value is not None and len(value) > max_length:
+            errors.append({"field": field, "message": f"at most {max_length} characters"})
+
+    if errors:
+        return None, errors
+    return laporan, []
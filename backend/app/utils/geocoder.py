@@ -0,0 +1,161 @@
+"""
+Offline reverse geocoding: (latitude, longitude) -> id_kota.
+
+Built at startup from the bundled kab/kota centroids (data/wilayah_kabkota.csv)
+matched by name to the rows of `wilayah`, and held in a 2-d KD-tree, so a
+lookup is a nearest-centroid search over ~500 points in process (a few
+microseconds) and never touches the database. A point further than
+GEOCODER_MAX_KM from every centroid (at sea, outside Indonesia, swapped
+lat/lon) is left unresolved.
+"""
+import csv
+import logging
+import math
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from utils.names import normalize_name, strip_kota_prefix
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = os.getenv(
+    "GEOCODER_DATA",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "wilayah_kabkota.csv"),
+)
+MAX_KM = float(os.getenv("GEOCODER_MAX_KM", "150"))
+
+_KM_PER_DEGREE = 111.32
+
+
+class _Node:
+    __slots__ = ("x", "y", "id_kota", "axis", "left", "right")
+
+    def __init__(self, x: float, y: float, id_kota: int, axis: int):
+        self.x = x
+        self.y = y
+        self.id_kota = id_kota
+        self.axis = axis
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+
+class ReverseGeocoder:
+    """
+    Nearest kab/kota centroid lookup. Points are projected equirectangularly
+    (longitude scaled by cos(latitude)), accurate enough at Indonesia's latitudes.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float, int]], max_km: float = MAX_KM):
+        self.size = len(points)
+        self.max_sq = (max_km / _KM_PER_DEGREE) ** 2
+        self._root = self._build([(self._x(lat, lon), lat, id_kota) for lat, lon, id_kota in points], 0)
+
+    @staticmethod
+    def _x(lat: float, lon: float) -> float:
+        return lon * math.cos(math.radians(lat))
+
+    def _build(self, items: List[Tuple[float, float, int]], depth: int) -> Optional[_Node]:
+        if not items:
+            return None
+        axis = depth % 2
+        items.sort(key=lambda p: p[axis])
+        mid = len(items) // 2
+        x, y, id_kota = items[mid]
+        node = _Node(x, y, id_kota, axis)
+        node.left = self._build(items[:mid], depth + 1)
+        node.right = self._build(items[mid + 1:], depth + 1)
+        return node
+
+    def lookup(self, latitude: Optional[float], longitude: Optional[float]) -> Optional[int]:
+        """id_kota of the nearest centroid within the distance limit, else None."""
+        if latitude is None or longitude is None or self._root is None:
+            return None
+        if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+            return None
+        qx = self._x(latitude, longitude)
+        qy = latitude
+        best_sq = self.max_sq
+        best_id = None
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            dx = qx - node.x
+            dy = qy - node.y
+            dist_sq = dx * dx + dy * dy
+            if dist_sq < best_sq:
+                best_sq = dist_sq
+                best_id = node.id_kota
+            diff = dx if node.axis == 0 else dy
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            # Push the far side first so the near side is searched (and prunes) first
+            if far is not None and diff * diff < best_sq:
+                stack.append(far)
+            if near is not None:
+                stack.append(near)
+        return best_id
+
+
+def read_centroids(path: str = DATA_PATH) -> List[dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            {
+                "nama_provinsi": r["nama_provinsi"],
+                "nama_kota": r["nama_kota"],
+                "latitude": float(r["latitude"]),
+                "longitude": float(r["longitude"]),
+            }
+            for r in csv.DictReader(f)
+        ]
+
+
+def build(wilayah_rows, centroids: List[dict], max_km: float = MAX_KM) -> ReverseGeocoder:
+    """
+    Match `wilayah` rows (id_kota, nama_kota, id_provinsi, nama_provinsi) to
+    centroids by name: exact first, then without the Kota/Kabupaten prefix
+    ("Bandung" in older seeds is Kota Bandung), preferring the same provinsi.
+    Rows without a centroid are not geocodable.
+    """
+    exact = {}
+    bare = {}
+    for c in centroids:
+        name = normalize_name(c["nama_kota"])
+        exact.setdefault(name, []).append(c)
+        # Older seeds store bare city names for kota, not kabupaten
+        if name.startswith("kota "):
+            bare.setdefault(strip_kota_prefix(name), []).append(c)
+
+    points = []
+    unmatched = 0
+    for r in wilayah_rows:
+        name = normalize_name(r["nama_kota"])
+        candidates = exact.get(name) or bare.get(name) or []
+        if len(candidates) > 1:
+            provinsi = normalize_name(r["nama_provinsi"])
+            candidates = [c for c in candidates if normalize_name(c["nama_provinsi"]) == provinsi]
+        if len(candidates) != 1:
+            unmatched += 1
+            continue
+        points.append((candidates[0]["latitude"], candidates[0]["longitude"], r["id_kota"]))
+
+    if unmatched:
+        logger.info("Geocoder: %d wilayah rows have no centroid", unmatched)
+    return ReverseGeocoder(points, max_km=max_km)
+
+
+_geocoder: Optional[ReverseGeocoder] = None
+
+
+def set_geocoder(geocoder: Optional[ReverseGeocoder]):
+    global _geocoder
+    _geocoder = geocoder
+
+
+def lookup(latitude: Optional[float], longitude: Optional[float]) -> Optional[int]:
+    """Module-level lookup against the geocoder loaded at startup (None before that)."""
+    if _geocoder is None:
+        return None
+    return _geocoder.lookup(latitude, longitude)
+
+
+def ready() -> bool:
+    return _geocoder is not None and _geocoder.size > 0
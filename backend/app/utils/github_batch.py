@@ -0,0 +1,222 @@
+"""
+Batched GitHub image store over the Git Data API (used by the image spool
+replicator, utils.image_spool).
+
+The contents API behind GitHubStorage.upload_file costs two or three
+sequential calls per image (get_contents, then create_file/update_file) and
+one commit each. push_many() writes a whole batch as a single commit:
+
+    blob per file -> one tree (on top of the branch head) -> one commit -> ref update
+
+i.e. N + 4 calls and one commit for N images. If the branch moved meanwhile
+(ref update rejected as not a fast-forward) the tree and commit are rebuilt
+on the new head; blobs are content-addressed and reused.
+
+All calls share one long-lived httpx client (keep-alive connection pool).
+Writes are sent one at a time, at least GITHUB_WRITE_INTERVAL apart, as
+GitHub asks for content-creating requests. Responses are watched for rate
+limits: Retry-After and an exhausted X-RateLimit-Remaining pause every call
+until the reset, and when the remaining budget runs low calls are spread
+evenly over the rest of the window. A pause longer than
+GITHUB_RATE_LIMIT_MAX_WAIT raises RateLimited so the caller backs off instead
+of holding its lease.
+"""
+import asyncio
+import base64
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+REPO = os.getenv("GITHUB_REPO", "dabson254/images-kasir")
+BRANCH = os.getenv("GITHUB_BRANCH", "main")
+IMAGE_DIR = "images"
+RAW_URL = "https://raw.githubusercontent.com/{repo}/{branch}/{path}"
+
+WRITE_INTERVAL = float(os.getenv("GITHUB_WRITE_INTERVAL", "0.2"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "60"))
+# Below this many remaining calls, spread the rest over the window
+RATE_LIMIT_LOW = int(os.getenv("GITHUB_RATE_LIMIT_LOW", "100"))
+REQUEST_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "30"))
+MAX_RETRIES = 3
+REF_RETRIES = 3
+
+
+class RateLimited(Exception):
+    """GitHub asked us to wait longer than RATE_LIMIT_MAX_WAIT."""
+
+
+class GitHubBatchStore:
+    def __init__(self, token: str, repo: str = REPO, branch: str = BRANCH):
+        self.token = token
+        self.repo = repo
+        self.branch = branch
+        self._client = None
+        self._write_lock = asyncio.Lock()
+        self._last_write = 0.0
+        # Monotonic time before which no call is made, and the minimum gap
+        # between calls while the rate-limit budget is low
+        self._paused_until = 0.0
+        self._spacing = 0.0
+        self._last_call = 0.0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx  # only needed once replication runs
+
+            self._client = httpx.AsyncClient(
+                base_url=API_URL,
+                timeout=REQUEST_TIMEOUT,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=120),
+                headers={
+                    "Authorization": f"Bearer {self.token}",
+                    "Accept": "application/vnd.github+json",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                    "User-Agent": "laporan-barang-hilang",
+                },
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- pacing -----------------------------------------------------------
+
+    async def _wait_turn(self):
+        now = time.monotonic()
+        wait = max(self._paused_until - now, self._last_call + self._spacing - now)
+        if wait > RATE_LIMIT_MAX_WAIT:
+            raise RateLimited(f"GitHub rate limit, retry in {wait:.0f}s")
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._last_call = time.monotonic()
+
+    def _observe(self, response):
+        """Update pacing from the rate-limit headers of a response."""
+        headers = response.headers
+        now = time.monotonic()
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        reset_in = max(float(reset) - time.time(), 0.0) if reset else 0.0
+        if remaining is not None:
+            remaining = int(remaining)
+            metrics.GITHUB_RATE_LIMIT_REMAINING.set(remaining)
+            self._spacing = reset_in / remaining if 0 < remaining < RATE_LIMIT_LOW else 0.0
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + float(retry_after))
+        elif remaining == 0:
+            self._paused_until = max(self._paused_until, now + reset_in + 1)
+        elif response.status_code in (403, 429) and "rate limit" in response.text.lower():
+            # Secondary rate limit without a hint: GitHub asks for at least a minute
+            self._paused_until = max(self._paused_until, now + 60)
+
+    async def _request(self, method: str, path: str, json: Optional[dict] = None) -> dict:
+        path = f"/repos/{self.repo}{path}"
+        for attempt in range(MAX_RETRIES + 1):
+            if method == "GET":
+                await self._wait_turn()
+                response = await self.client.request(method, path)
+            else:
+                async with self._write_lock:
+                    gap = self._last_write + WRITE_INTERVAL - time.monotonic()
+                    if gap > 0:
+                        await asyncio.sleep(gap)
+                    await self._wait_turn()
+                    response = await self.client.request(method, path, json=json)
+                    self._last_write = time.monotonic()
+            metrics.GITHUB_API_REQUESTS.inc(method, str(response.status_code))
+            self._observe(response)
+            retry = response.status_code in (429, 502, 503, 504) or (
+                response.status_code == 403 and self._paused_until > time.monotonic()
+            )
+            if retry and attempt < MAX_RETRIES:
+                if self._paused_until <= time.monotonic():
+                    await asyncio.sleep(2 ** attempt)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    # --- Git Data API -----------------------------------------------------
+
+    async def _head(self) -> Tuple[str, str]:
+        """(commit sha, tree sha) of the branch head."""
+        ref = await self._request("GET", f"/git/ref/heads/{self.branch}")
+        commit_sha = ref["object"]["sha"]
+        commit = await self._request("GET", f"/git/commits/{commit_sha}")
+        return commit_sha, commit["tree"]["sha"]
+
+    async def _blob(self, path: Path) -> str:
+        content = await asyncio.to_thread(path.read_bytes)
+        encoded = base64.b64encode(content).decode()
+        blob = await self._request("POST", "/git/blobs", {"content": encoded, "encoding": "base64"})
+        return blob["sha"]
+
+    def url(self, name: str) -> str:
+        return RAW_URL.format(repo=self.repo, branch=self.branch, path=f"{IMAGE_DIR}/{name}")
+
+    async def push_many(self, files: Sequence[Tuple[str, Path]], message: Optional[str] = None) -> Dict[str, str]:
+        """
+        Commit files (name, local path) to images/<name> in one commit.
+        Returns {name: public URL}. Raises if the batch could not be committed.
+        """
+        import httpx
+
+        if not files:
+            return {}
+        blobs = [(name, await self._blob(path)) for name, path in files]
+        tree_entries = [
+            {"path": f"{IMAGE_DIR}/{name}", "mode": "100644", "type": "blob", "sha": sha}
+            for name, sha in blobs
+        ]
+        message = message or (
+            f"Add {files[0][0]}" if len(files) == 1 else f"Add {len(files)} images"
+        )
+        for attempt in range(REF_RETRIES):
+            head_sha, tree_sha = await self._head()
+            tree = await self._request("POST", "/git/trees", {"base_tree": tree_sha, "tree": tree_entries})
+            commit = await self._request(
+                "POST", "/git/commits", {"message": message, "tree": tree["sha"], "parents": [head_sha]}
+            )
+            try:
+                await self._request(
+                    "PATCH", f"/git/refs/heads/{self.branch}", {"sha": commit["sha"], "force": False}
+                )
+            except httpx.HTTPStatusError as e:
+                # 422: the branch moved since _head(); rebuild on the new head
+                if e.response.status_code == 422 and attempt < REF_RETRIES - 1:
+                    logger.info("GitHub branch %s moved, retrying commit", self.branch)
+                    continue
+                raise
+            metrics.GITHUB_COMMIT_FILES.observe(len(files))
+            return {name: self.url(name) for name, _ in files}
+
+
+_store: Optional[GitHubBatchStore] = None
+
+
+def get_store() -> Optional[GitHubBatchStore]:
+    """Shared store (one connection pool per worker); None without GITHUB_TOKEN."""
+    global _store
+    token = os.getenv("GITHUB_TOKEN")
+    if not token:
+        return None
+    if _store is None:
+        _store = GitHubBatchStore(token)
+    return _store
+
+
+async def close():
+    global _store
+    if _store is not None:
+        await _store.aclose()
+        _store = None
@@ -1,4 +1,3 @@
-from github import Github
 import os
 import logging
 #from dotenv import load_dotenv  # Tidak perlu lagi
@@ -19,6 +18,10 @@ class GitHubStorage:
         
         try:
             if self.token:
+                # PyGithub is only needed when a token is configured; importing
+                # it lazily keeps it off the worker start path
+                from github import Github
+
                 self.gh = Github(self.token)
                 self.repo = self.gh.get_repo("dabson254/images-kasir")
                 self.is_online = True
@@ -94,30 +97,7 @@ class GitHubStorage:
                 logger.info("Running in offline mode, saving locally only")
                 return f"/static/images/{file_name}"
 
-            # Log the attempt
-            logger.info(f"Attempting to upload {file_name} to GitHub")
-
-            try:
-                # Check if file exists on repo
-                existing_file = self.repo.get_contents(f"images/{file_name}")
-                # Update existing file
-                self.repo.update_file(
-                    f"images/{file_name}",
-                    f"Update {file_name}",
-                    content,
-                    existing_file.sha
-                )
-                logger.info(f"Updated existing file: {file_name}")
-            except Exception:
-                # Create new file
-                self.repo.create_file(
-                    f"images/{file_name}",
-                    f"Add {file_name}",
-                    content
-                )
-                logger.info(f"Created new file: {file_name}")
-
-            return f"https://raw.githubusercontent.com/dabson254/images-kasir/main/images/{file_name}"
+            return self.push(content, file_name)
 
         except Exception as e:
             logger.exception(f"GitHub upload failed: {str(e)}")
@@ -130,6 +110,40 @@ class GitHubStorage:
             except Exception:
                 return None
 
+    def push(self, content: bytes, file_name: str) -> str:
+        """
+        Create or update images/<file_name> in the repository and return its
+        public URL. Unlike upload_file this raises on failure (used by the
+        image spool replicator, which retries).
+        """
+        if not self.is_online:
+            raise RuntimeError("GitHub storage is offline")
+
+        # Log the attempt
+        logger.info(f"Attempting to upload {file_name} to GitHub")
+
+        try:
+            # Check if file exists on repo
+            existing_file = self.repo.get_contents(f"images/{file_name}")
+            # Update existing file
+            self.repo.update_file(
+                f"images/{file_name}",
+                f"Update {file_name}",
+                content,
+                existing_file.sha
+            )
+            logger.info(f"Updated existing file: {file_name}")
+        except Exception:
+            # Create new file
+            self.repo.create_file(
+                f"images/{file_name}",
+                f"Add {file_name}",
+                content
+            )
+            logger.info(f"Created new file: {file_name}")
+
+        return f"https://raw.githubusercontent.com/dabson254/images-kasir/main/images/{file_name}"
+
     def ensure_images_directory(self):
         try:
             self.repo.get_contents("images")
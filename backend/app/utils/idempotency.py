@@ -0,0 +1,199 @@
+"""
+Idempotency-Key support for non-idempotent POSTs (laporan create, image upload).
+
+The first request with a given key claims it in `idempotency_keys` and runs;
+its response is stored and replayed for retries with the same key, so a retry
+never creates a second laporan, notifikasi or stored image. Duplicates that
+arrive while the first request is still running wait for it: in-process via
+a shared future, across workers by polling the row. Completed responses are
+also kept in a small in-memory cache so most replays skip the database.
+
+A pending row carries a short lease that its owner renews while the request
+runs. If the worker dies mid-request (OOM, SIGKILL, deploy) the lease lapses
+after LEASE_SECONDS and a retry of the same request takes the key over,
+instead of getting 409 until the key expires.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from repositories import idempotency_repo
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 100
+TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+# How long a duplicate waits for the original request before giving up with 409
+WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "15"))
+# Pending rows not renewed for this long are taken over by a retry
+LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30"))
+CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+
+def request_hash(*parts: Any) -> str:
+    """Fingerprint of the request payload; bytes are hashed as-is, the rest as JSON."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(hashlib.sha256(part).digest())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(
+        self, ttl: float = TTL_SECONDS, wait: float = WAIT_SECONDS,
+        cache_size: int = CACHE_SIZE, lease: float = LEASE_SECONDS,
+    ):
+        self.ttl = ttl
+        self.wait = wait
+        self.lease = lease
+        self.cache_size = cache_size
+        # (scope, key) -> (expires at, request hash, response)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, str, dict]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def _remember(self, k: Tuple[str, str], request_hash: str, response: dict, ttl: float):
+        self._cache[k] = (time.monotonic() + ttl, request_hash, response)
+        self._cache.move_to_end(k)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _cached(self, k: Tuple[str, str]) -> Optional[Tuple[str, dict]]:
+        entry = self._cache.get(k)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._cache.pop(k, None)
+            return None
+        return entry[1], entry[2]
+
+    @staticmethod
+    def _check_hash(stored: str, request_hash: str):
+        if stored != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail=f"{HEADER} was already used for a different request",
+            )
+
+    async def run(
+        self,
+        db,
+        scope: str,
+        key: str,
+        request_hash: str,
+        fn: Callable[[], Awaitable[Tuple[dict, bool]]],
+    ) -> Tuple[dict, bool]:
+        """
+        Run `fn` at most once per (scope, key). `fn` returns (response, store);
+        responses with store=False (e.g. a failed upload reported in the body)
+        release the key so the client can retry. Returns (response, replayed).
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+
+        k = (scope, key)
+        deadline = time.monotonic() + self.wait
+        delay = 0.05
+        while True:
+            cached = self._cached(k)
+            if cached is not None:
+                self._check_hash(cached[0], request_hash)
+                return cached[1], True
+
+            pending = self._inflight.get(k)
+            if pending is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise HTTPException(status_code=409, detail=f"A request with this {HEADER} is still in progress")
+                try:
+                    await asyncio.wait_for(asyncio.shield(pending), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            lease_token = await idempotency_repo.claim_key(db, scope, key, request_hash, self.ttl, self.lease)
+            if lease_token is not None:
+                return await self._run_owner(db, k, lease_token, request_hash, fn), False
+
+            row = await idempotency_repo.get_key(db, scope, key)
+            if row is None:
+                # Released or expired in the meantime: try to claim again
+                continue
+            self._check_hash(row["request_hash"], request_hash)
+            if row["state"] == "done":
+                self._remember(k, request_hash, row["response"], self.ttl)
+                return row["response"], True
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail=f"A request with this {HEADER} is still in progress")
+            # Owned by another worker: poll until it completes (or its lease
+            # lapses and the next claim takes it over)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    async def _run_owner(self, db, k: Tuple[str, str], lease_token: str, request_hash: str, fn) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[k] = future
+        renewer = asyncio.get_running_loop().create_task(self._renew(db, k, lease_token))
+        try:
+            try:
+                response, store = await fn()
+            except BaseException:
+                renewer.cancel()
+                await self._release(db, k, lease_token)
+                raise
+            renewer.cancel()
+            if store:
+                # The writes already happened: a failure to store the response
+                # must not turn the request into an error. The row is left
+                # pending rather than released, so retries elsewhere wait (and
+                # this worker replays from memory) instead of writing again
+                # until the lease lapses.
+                self._remember(k, request_hash, response, self.ttl)
+                try:
+                    if not await idempotency_repo.complete_key(db, k[0], k[1], lease_token, 200, response):
+                        # Lease lost: another request took the key over and
+                        # its response is the one replayed from now on
+                        logger.warning("Lost the lease on %s %s before storing the response", HEADER, k)
+                        self._cache.pop(k, None)
+                except Exception as e:
+                    logger.warning("Could not store response for %s %s: %s", HEADER, k, e)
+            else:
+                await self._release(db, k, lease_token)
+            return response
+        finally:
+            renewer.cancel()
+            self._inflight.pop(k, None)
+            if not future.done():
+                future.set_result(None)
+
+    async def _renew(self, db, k: Tuple[str, str], lease_token: str):
+        """Keep the pending row's lease alive while its request runs."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                if not await idempotency_repo.renew_key(db, k[0], k[1], lease_token, self.lease):
+                    logger.warning("Lost the lease on %s %s while the request was running", HEADER, k)
+                    return
+            except Exception as e:
+                logger.warning("Could not renew %s %s: %s", HEADER, k, e)
+
+    async def _release(self, db, k: Tuple[str, str], lease_token: str):
+        try:
+            if not await idempotency_repo.release_key(db, k[0], k[1], lease_token):
+                logger.info("%s %s was taken over before release; left to its new owner", HEADER, k)
+        except Exception as e:
+            logger.warning("Could not release %s %s: %s", HEADER, k, e)
+
+
+store = IdempotencyStore()
@@ -0,0 +1,230 @@
+"""
+Durable local image spool with asynchronous replication to the remote store.
+
+Uploads are committed to local disk first (written, fsynced and renamed into
+IMAGE_SPOOL_DIR) and answered with their `/static/images/<name>` URL, which
+the app serves from the same directory, so an upload costs a local write
+whether or not GitHub is reachable. Each file gets a `foto_replikasi` row;
+the replicator in this module leases due rows in batches (like the outbox
+dispatcher), pushes each batch to GitHub as one commit (utils.github_batch)
+and, once the commit lands, rewrites foto_url in laporan, laporan_arsip and
+foto_hash to the remote URL in one transaction. Failed pushes are retried with exponential backoff and
+never dropped; the local copy keeps being served meanwhile. Without
+GITHUB_TOKEN files simply stay local.
+
+Spooled names are made unique (timestamp + random prefix), so two phones
+uploading "image.jpg" no longer overwrite each other remotely. Local copies
+of replicated files are deleted by the daily job after
+IMAGE_SPOOL_RETENTION_DAYS (clients may still hold the local URL until then);
+the rewrite is repeated first for laporan that stored the local URL while
+replication was committing.
+
+The spool is local disk, so each file's row records the host that stored it
+(IMAGE_SPOOL_HOST, default the hostname) and only that host replicates it.
+
+Backlog (files / bytes pending) and replication lag (age of the oldest
+pending file) are exported as metrics and on GET /admin/foto-replikasi.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import secrets
+import socket
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from repositories import foto_replikasi_repo
+from utils import github_batch, metrics, photo_hash
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+SPOOL_DIR = Path(os.getenv("IMAGE_SPOOL_DIR", str(APP_DIR / "static" / "images")))
+# Where SPOOL_DIR is served; also the prefix GitHubStorage falls back to
+URL_PREFIX = "/static/images"
+POLL_SECONDS = float(os.getenv("IMAGE_REPLICATION_POLL_SECONDS", "5"))
+BATCH_SIZE = int(os.getenv("IMAGE_REPLICATION_BATCH_SIZE", "50"))
+# Must exceed the time a whole batch can take to push, or files are pushed twice
+LEASE_SECONDS = float(os.getenv("IMAGE_REPLICATION_LEASE_SECONDS", "600"))
+BACKOFF_BASE = float(os.getenv("IMAGE_REPLICATION_BACKOFF_SECONDS", "30"))
+BACKOFF_MAX = float(os.getenv("IMAGE_REPLICATION_BACKOFF_MAX_SECONDS", str(60 * 60)))
+RETENTION_DAYS = int(os.getenv("IMAGE_SPOOL_RETENTION_DAYS", "7"))
+# Must be stable across restarts and unique per spool directory
+HOST = os.getenv("IMAGE_SPOOL_HOST") or socket.gethostname()
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def spool_name(filename: Optional[str]) -> str:
+    """Unique, URL-safe file name keeping the client's name as a suffix."""
+    base = _UNSAFE.sub("_", os.path.basename(filename or "")).strip("._") or "image"
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(4)}-{base[-100:]}"
+
+
+def _write_durable(path: Path, content: bytes):
+    os.makedirs(path.parent, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # Make the rename itself survive a crash
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+async def store(db, content: bytes, filename: Optional[str]) -> str:
+    """
+    Commit an upload to the local spool and queue it for replication.
+    Returns the local URL (rewritten to the remote one once replicated).
+    """
+    name = spool_name(filename)
+    path = SPOOL_DIR / name
+    await asyncio.to_thread(_write_durable, path, content)
+    url = f"{URL_PREFIX}/{name}"
+    try:
+        await foto_replikasi_repo.enqueue(db, name, url, len(content), HOST)
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    replicator.wake()
+    return url
+
+
+async def purge_replicated(db, days: int = RETENTION_DAYS) -> int:
+    """Delete local copies of files replicated more than `days` ago."""
+    purged, late = await foto_replikasi_repo.purge_replicated(db, days)
+    if late:
+        logger.info("Rewrote %d laporan still using a local image URL before purging", late)
+    for _, local_url, remote_url in purged:
+        photo_hash.index.rename(local_url, remote_url)
+
+    def _unlink():
+        for name, _, _ in purged:
+            (SPOOL_DIR / name).unlink(missing_ok=True)
+
+    await asyncio.to_thread(_unlink)
+    return len(purged)
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter: ~30s, 1m, 2m, ... capped at BACKOFF_MAX."""
+    delay = min(BACKOFF_BASE * (2 ** max(attempts - 1, 0)), BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class Replicator:
+    def __init__(self, batch_size: int = BATCH_SIZE, poll_seconds: float = POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.db = None
+        # (files, bytes, age of the oldest in seconds) at the last poll
+        self.backlog: Tuple[int, int, Optional[float]] = (0, 0, None)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        metrics.IMAGE_SPOOL_BACKLOG.set_function(
+            lambda: {("files",): self.backlog[0], ("bytes",): self.backlog[1]}
+        )
+        metrics.IMAGE_REPLICATION_LAG.set_function(lambda: {(): self.backlog[2] or 0.0})
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def remote_configured(self) -> bool:
+        return github_batch.get_store() is not None
+
+    def start(self, db):
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await github_batch.close()
+
+    def wake(self):
+        """Replicate soon instead of at the next poll (called after spooling)."""
+        if self.running:
+            self._wakeup.set()
+
+    async def replicate_once(self) -> int:
+        """Lease one batch and push it as a single commit. Returns the number of files handled."""
+        store = github_batch.get_store()
+        if store is None:
+            return 0
+        rows = await foto_replikasi_repo.claim_batch(self.db, self.batch_size, LEASE_SECONDS, HOST)
+        if not rows:
+            return 0
+
+        exists = await asyncio.to_thread(lambda: [(SPOOL_DIR / r[1]).is_file() for r in rows])
+        present = [r for r, ok in zip(rows, exists) if ok]
+        failed = [(r, "FileNotFoundError: not in this host's spool") for r, ok in zip(rows, exists) if not ok]
+        if present:
+            try:
+                urls = await store.push_many([(r[1], SPOOL_DIR / r[1]) for r in present])
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"[:500]
+                failed.extend((r, error) for r in present)
+            else:
+                rewritten = await foto_replikasi_repo.mark_replicated(
+                    self.db, [r[0] for r in present], [urls[r[1]] for r in present]
+                )
+                for local_url, remote_url in rewritten:
+                    photo_hash.index.rename(local_url, remote_url)
+                metrics.IMAGE_REPLICATIONS.inc("replicated", amount=len(present))
+        if failed:
+            metrics.IMAGE_REPLICATIONS.inc("error", amount=len(failed))
+            logger.warning("Image replication failed for %d file(s), e.g. %s: %s",
+                           len(failed), failed[0][0][1], failed[0][1])
+            await foto_replikasi_repo.mark_failed(
+                self.db,
+                [r[0] for r, _ in failed],
+                [retry_delay(r[3]) for r, _ in failed],
+                [error for _, error in failed],
+            )
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                self.backlog = await foto_replikasi_repo.get_backlog(self.db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Image spool backlog check failed: %s", e)
+            try:
+                with metrics.JOB_DURATION.time("image_replication"):
+                    handled = await self.replicate_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.JOB_FAILURES.inc("image_replication")
+                logger.warning("Image replication failed: %s", e)
+                handled = 0
+            if handled >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+replicator = Replicator()
@@ -0,0 +1,314 @@
+"""
+Lightweight Prometheus-style metrics (text exposition format 0.0.4).
+
+Kept dependency-free and cheap on the hot path: label values are passed
+positionally, samples live in plain dicts keyed by label tuples and histogram
+buckets are located with bisect. Everything runs on the event loop thread, so
+no locking is needed.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds. Covers fast DB lookups up to slow GitHub uploads.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _REGISTRY.append(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Gauge whose value is either set directly or computed at scrape time by a
+    callback returning {label tuple: value} (used for pool saturation).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._callbacks: List[Callable[[], Dict[Tuple, float]]] = []
+
+    def set(self, value: float, *labelvalues):
+        self._values[labelvalues] = value
+
+    def set_function(self, fn: Callable[[], Dict[Tuple, float]]):
+        self._callbacks.append(fn)
+
+    def render(self) -> List[str]:
+        values = dict(self._values)
+        for fn in self._callbacks:
+            try:
+                values.update(fn())
+            except Exception:
+                # A failing callback must never break the scrape
+                continue
+        lines = self._header()
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label tuple -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labelvalues):
+        state = self._values.get(labelvalues)
+        if state is None:
+            state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def time(self, *labelvalues) -> "_Timer":
+        """Context manager observing the elapsed wall time of its block."""
+        return _Timer(self, labelvalues)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+        return False
+
+
+def render() -> str:
+    """Render every registered metric in Prometheus text format."""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by method, route template and status code",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route template",
+    ("method", "route"),
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Database call duration (including pool acquire) by query name",
+    ("query",),
+)
+DB_QUERY_ROWS = Counter(
+    "db_query_rows_total", "Rows returned or affected by query name", ("query",),
+)
+DB_QUERY_ERRORS = Counter(
+    "db_query_errors_total", "Failed database calls by query name", ("query",),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connection pool state (size, idle, in_use, max) by pool",
+    ("pool", "state"),
+)
+
+DB_CONNECTION_INIT = Histogram(
+    "db_connection_init_seconds", "Time spent preparing registered statements on a new pool connection",
+    ("pool",),
+)
+
+DB_READ_ROUTING = Counter(
+    "db_read_routing_total", "Read queries by target pool and routing reason", ("target", "reason"),
+)
+DB_REPLICA_UP = Gauge(
+    "db_replica_up", "1 if the read replica answered the last health check",
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds", "Replication lag of the read replica at the last health check",
+)
+
+JOB_DURATION = Histogram(
+    "background_job_duration_seconds", "Background job run duration by job name", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0),
+)
+JOB_FAILURES = Counter(
+    "background_job_failures_total", "Failed background job runs by job name", ("job",),
+)
+
+NOTIFIKASI_PENDING = Gauge(
+    "notifikasi_pending", "Notifikasi waiting in the writer (buffered) or held for a digest", ("state",),
+)
+NOTIFIKASI_WRITES = Counter(
+    "notifikasi_writes_total",
+    "Notifikasi written, folded into a digest, digests emitted, or dropped as unwritable", ("result",),
+)
+NOTIFIKASI_FLUSH_SIZE = Histogram(
+    "notifikasi_flush_size", "Rows per notifikasi writer flush",
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000),
+)
+
+OUTBOX_DELIVERIES = Counter(
+    "outbox_deliveries_total", "Reporter notification deliveries by channel and result (sent, error, dead)",
+    ("channel", "result"),
+)
+OUTBOX_SEND_DURATION = Histogram(
+    "outbox_send_duration_seconds", "Time to hand one outbox message to its channel", ("channel",),
+)
+
+UPLOAD_STAGE_DURATION = Histogram(
+    "upload_stage_duration_seconds", "Image upload pipeline duration by stage", ("stage",),
+)
+UPLOADS = Counter(
+    "uploads_total", "Image uploads by result", ("result",),
+)
+IMAGE_SPOOL_BACKLOG = Gauge(
+    "image_spool_backlog", "Spooled images not yet replicated to the remote store", ("unit",),
+)
+IMAGE_REPLICATION_LAG = Gauge(
+    "image_replication_lag_seconds", "Age of the oldest spooled image waiting for replication",
+)
+IMAGE_REPLICATIONS = Counter(
+    "image_replications_total", "Spooled image pushes to the remote store by result", ("result",),
+)
+GITHUB_API_REQUESTS = Counter(
+    "github_api_requests_total", "GitHub API calls made by the image store by method and status", ("method", "status"),
+)
+GITHUB_RATE_LIMIT_REMAINING = Gauge(
+    "github_rate_limit_remaining", "X-RateLimit-Remaining of the last GitHub API response",
+)
+GITHUB_COMMIT_FILES = Histogram(
+    "github_commit_files", "Images per GitHub commit", buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+UPLOAD_SESSION_BYTES = Gauge(
+    "upload_session_bytes", "Spool space reserved by unfinished resumable uploads",
+)
+
+
+def track_pool(pool, name: str = "primary"):
+    """Expose saturation gauges for an asyncpg pool, computed at scrape time."""
+    def _collect() -> Dict[Tuple, float]:
+        size = pool.get_size()
+        idle = pool.get_idle_size()
+        return {
+            (name, "size"): size,
+            (name, "idle"): idle,
+            (name, "in_use"): size - idle,
+            (name, "max"): pool.get_max_size(),
+        }
+    DB_POOL_CONNECTIONS.set_function(_collect)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request count, status and latency per route
+    template (e.g. `/laporan/{id_laporan}`), so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(method, path, str(status_code))
+            HTTP_LATENCY.observe(time.perf_counter() - start, method, path)
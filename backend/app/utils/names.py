@@ -0,0 +1,20 @@
+"""
+Name normalisation shared by the bulk import name resolver and the geocoder.
+"""
+import unicodedata
+
+KOTA_PREFIXES = ("kota ", "kabupaten ", "kab. ", "kab ")
+
+
+def normalize_name(name: str) -> str:
+    """Case-, accent- and whitespace-insensitive key for name lookups."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return " ".join(ascii_name.lower().split())
+
+
+def strip_kota_prefix(normalized: str) -> str:
+    """'kota bandung' / 'kabupaten bandung' -> 'bandung' (expects a normalized name)."""
+    for prefix in KOTA_PREFIXES:
+        if normalized.startswith(prefix):
+            return normalized[len(prefix):]
+    return normalized
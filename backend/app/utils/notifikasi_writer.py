@@ -0,0 +1,242 @@
+"""
+Buffered notifikasi writer.
+
+Request handlers hand notifications to `writer.submit(...)` instead of doing a
+single-row INSERT each: the writer flushes the buffer every
+NOTIFIKASI_FLUSH_MS milliseconds (or as soon as NOTIFIKASI_BATCH_SIZE items
+are waiting) with one multi-row INSERT, so a burst of reports costs one
+round trip and one WAL flush per batch instead of per report.
+
+Bursts of new laporan in one kota are coalesced: after
+NOTIFIKASI_DIGEST_THRESHOLD notifications for the same kota within
+NOTIFIKASI_DIGEST_WINDOW seconds, further ones are held and written as a
+single digest ("12 laporan baru di Kota Surabaya") when the window closes.
+
+Delivery: items stay buffered while the database is unreachable (flushes
+failing with a connection error are retried with backoff), and `stop()`
+writes out held digests and drains the buffer, so a graceful shutdown loses
+nothing. A crash loses at most the items of the last few milliseconds. Any
+other failure is blamed on the rows, not the database: the batch is written
+again skipping notifikasi whose laporan was archived or deleted meanwhile,
+then row by row, and rows that still fail are dropped (logged and counted as
+`notifikasi_writes_total{result="dropped"}`) so one bad row cannot block
+every later notifikasi.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+
+from repositories import notifikasi_repo
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+FLUSH_MS = float(os.getenv("NOTIFIKASI_FLUSH_MS", "20"))
+BATCH_SIZE = int(os.getenv("NOTIFIKASI_BATCH_SIZE", "500"))
+# submit() waits for a flush once this many items are buffered
+MAX_BUFFER = int(os.getenv("NOTIFIKASI_MAX_BUFFER", "10000"))
+DIGEST_THRESHOLD = int(os.getenv("NOTIFIKASI_DIGEST_THRESHOLD", "5"))  # 0 disables digests
+DIGEST_WINDOW = float(os.getenv("NOTIFIKASI_DIGEST_WINDOW", "60"))
+# How long stop() keeps retrying to drain the buffer
+SHUTDOWN_TIMEOUT = float(os.getenv("NOTIFIKASI_SHUTDOWN_TIMEOUT", "10"))
+
+# Failures of the database rather than of the rows: keep the batch and retry
+_RETRYABLE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.InterfaceError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.InsufficientResourcesError,
+    asyncpg.QueryCanceledError,
+    asyncpg.TransactionRollbackError,
+)
+
+
+class _DigestGroup:
+    __slots__ = ("label", "window_start", "count", "held")
+
+    def __init__(self, label: Optional[str], now: float):
+        self.label = label
+        self.window_start = now
+        self.count = 0
+        self.held: List[int] = []
+
+
+class NotifikasiWriter:
+    def __init__(
+        self,
+        flush_ms: float = FLUSH_MS,
+        batch_size: int = BATCH_SIZE,
+        max_buffer: int = MAX_BUFFER,
+        digest_threshold: int = DIGEST_THRESHOLD,
+        digest_window: float = DIGEST_WINDOW,
+    ):
+        self.flush_interval = flush_ms / 1000.0
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.digest_threshold = digest_threshold
+        self.digest_window = digest_window
+        self.db = None
+        self._buffer: List[Tuple[int, str]] = []
+        self._groups: Dict[object, _DigestGroup] = {}
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        metrics.NOTIFIKASI_PENDING.set_function(
+            lambda: {("buffered",): len(self._buffer), ("held",): sum(len(g.held) for g in self._groups.values())}
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, db):
+        self.db = db
+        self._closing = False
+        # Events bind to the running loop on first use; recreate them per start
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout: float = SHUTDOWN_TIMEOUT):
+        """Write out held digests and everything buffered, then stop."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error("Dropping %d notifikasi that could not be written at shutdown", len(self._buffer))
+        self._task = None
+
+    async def submit(
+        self, db, id_laporan: int, pesan: str,
+        digest_key: object = None, digest_label: Optional[str] = None,
+    ):
+        """
+        Queue one notifikasi. Notifications with a `digest_key` (e.g. the
+        laporan's id_kota) are coalesced into a digest during bursts;
+        `digest_label` names the group in the digest text.
+        """
+        if not self.running:
+            # Writer not started (scripts, shutdown in progress): write directly
+            await notifikasi_repo.create_notifikasi(db, id_laporan=id_laporan, pesan=pesan)
+            return
+
+        if digest_key is not None and self.digest_threshold > 0:
+            now = time.monotonic()
+            group = self._groups.get(digest_key)
+            if group is None:
+                group = self._groups[digest_key] = _DigestGroup(digest_label, now)
+            group.count += 1
+            if group.count > self.digest_threshold:
+                group.held.append(id_laporan)
+                metrics.NOTIFIKASI_WRITES.inc("digested")
+                return
+
+        self._buffer.append((id_laporan, pesan))
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        while len(self._buffer) >= self.max_buffer and self.running:
+            # Backpressure: the database is behind, wait for the next flush
+            self._flushed.clear()
+            await self._flushed.wait()
+
+    def _emit_digests(self, force: bool = False):
+        now = time.monotonic()
+        for key, group in list(self._groups.items()):
+            if not force and now - group.window_start < self.digest_window:
+                continue
+            if group.held:
+                where = f" di {group.label}" if group.label else ""
+                # Points at the newest laporan of the burst; the count covers the held ones
+                self._buffer.append((group.held[-1], f"{len(group.held)} laporan baru{where}"))
+                metrics.NOTIFIKASI_WRITES.inc("digest")
+            del self._groups[key]
+
+    async def _flush(self) -> bool:
+        batch = self._buffer[:self.batch_size]
+        if not batch:
+            return True
+        try:
+            await notifikasi_repo.create_notifikasi_many(
+                self.db, [b[0] for b in batch], [b[1] for b in batch]
+            )
+            written = len(batch)
+        except _RETRYABLE_ERRORS as e:
+            logger.warning("Notifikasi flush of %d failed, will retry: %s", len(batch), e)
+            return False
+        except Exception as e:
+            logger.warning("Notifikasi flush of %d rejected, writing it without the bad rows: %s", len(batch), e)
+            written = await self._salvage(batch)
+            if written is None:
+                return False
+        del self._buffer[:len(batch)]
+        dropped = len(batch) - written
+        if dropped:
+            metrics.NOTIFIKASI_WRITES.inc("dropped", amount=dropped)
+        metrics.NOTIFIKASI_WRITES.inc("written", amount=written)
+        metrics.NOTIFIKASI_FLUSH_SIZE.observe(len(batch))
+        self._flushed.set()
+        return True
+
+    async def _salvage(self, batch: List[Tuple[int, str]]) -> Optional[int]:
+        """
+        Write what can be written of a rejected batch: first in one statement
+        without the rows whose laporan is gone (the usual cause, an FK
+        violation after arsip/delete), then row by row. Returns the number of
+        rows written, or None if the database became unreachable meanwhile.
+        """
+        try:
+            return await notifikasi_repo.create_notifikasi_many_existing(
+                self.db, [b[0] for b in batch], [b[1] for b in batch]
+            )
+        except _RETRYABLE_ERRORS as e:
+            logger.warning("Notifikasi flush of %d failed, will retry: %s", len(batch), e)
+            return None
+        except Exception:
+            pass
+        written = 0
+        for i, (id_laporan, pesan) in enumerate(batch):
+            try:
+                await notifikasi_repo.create_notifikasi(self.db, id_laporan=id_laporan, pesan=pesan)
+                written += 1
+            except _RETRYABLE_ERRORS as e:
+                # Keep the rows not tried yet; the ones written are done
+                logger.warning("Notifikasi flush failed after %d rows, will retry: %s", i, e)
+                del self._buffer[:i]
+                metrics.NOTIFIKASI_WRITES.inc("written", amount=written)
+                if i > written:
+                    metrics.NOTIFIKASI_WRITES.inc("dropped", amount=i - written)
+                return None
+            except Exception as e:
+                logger.error("Dropping notifikasi for laporan %s: %s", id_laporan, e)
+        return written
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            closing = self._closing
+            if self._groups:
+                self._emit_digests(force=closing)
+            ok = True
+            while self._buffer and ok:
+                ok = await self._flush()
+            if closing and not self._buffer and not self._groups:
+                return
+            backoff = self.flush_interval if ok else min(max(backoff * 2, 0.1), 5.0)
+
+
+writer = NotifikasiWriter()
@@ -0,0 +1,255 @@
+"""
+Outbox dispatcher: delivers reporter notifications queued in the `outbox` table.
+
+Status changes write outbox rows in their own transaction (see
+outbox_repo.enqueue_status_change); this background task leases due rows in
+batches, renders them and hands them to the channel named in the row, with
+at most OUTBOX_CONCURRENCY_<CHANNEL> sends in flight per channel. Failures are
+retried with exponential backoff; after OUTBOX_MAX_ATTEMPTS the row is
+dead-lettered (state 'dead') for an admin to inspect and retry.
+
+Channels:
+- email: SMTP (SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_STARTTLS,
+  SMTP_FROM). Without SMTP_HOST messages are only logged. For local testing
+  run `python scripts/smtp_sink.py` and set SMTP_HOST=127.0.0.1 SMTP_PORT=1025.
+- kontak: logged only; stand-in for an SMS / WhatsApp gateway.
+Other deliveries can be plugged in with `register_channel(name, channel)`.
+"""
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import time
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Tuple
+
+from repositories import outbox_repo
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Channels rows are queued for (reporter contact fields that get notified)
+CHANNELS = [c.strip() for c in os.getenv("OUTBOX_CHANNELS", "email").split(",") if c.strip()]
+POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+# Must exceed the time a whole batch can take to send, or rows may be sent twice
+LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "900"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", str(6 * 60 * 60)))
+SEND_TIMEOUT = float(os.getenv("OUTBOX_SEND_TIMEOUT", "30"))
+RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+# Texts per event; payload keys: judul_laporan, nama_pelapor, status (+ extras)
+TEMPLATES = {
+    "found": (
+        "Laporan \"{judul_laporan}\" ditandai selesai",
+        "Halo {nama_pelapor},\n\nLaporan \"{judul_laporan}\" telah ditandai selesai (barang ditemukan).\n"
+        "Terima kasih telah menggunakan layanan kami.",
+    ),
+    "deleted": (
+        "Laporan \"{judul_laporan}\" dihapus oleh admin",
+        "Halo {nama_pelapor},\n\nLaporan \"{judul_laporan}\" telah dihapus oleh admin.\n"
+        "Hubungi kami jika menurut Anda ini keliru.",
+    ),
+    "expired": (
+        "Laporan \"{judul_laporan}\" telah kedaluwarsa",
+        "Halo {nama_pelapor},\n\nLaporan \"{judul_laporan}\" sudah melewati batas waktu dan tidak lagi "
+        "ditampilkan. Silakan buat laporan baru bila barang Anda belum ditemukan.",
+    ),
+}
+
+
+class _SafeDict(dict):
+    def __missing__(self, key):
+        return ""
+
+
+def render(event: str, payload: dict) -> Tuple[str, str]:
+    subject, body = TEMPLATES.get(event, ("Pembaruan laporan \"{judul_laporan}\"", "Status laporan: {status}"))
+    values = _SafeDict(payload)
+    return subject.format_map(values), body.format_map(values)
+
+
+class LogChannel:
+    """Writes the message to the log instead of delivering it."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def send(self, recipient: str, subject: str, body: str):
+        logger.info("[outbox:%s] to=%s subject=%s", self.name, recipient, subject)
+
+
+class SmtpChannel:
+    """Plain smtplib in a worker thread; one connection per message."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 25,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        sender: str = "noreply@localhost",
+        timeout: float = SEND_TIMEOUT,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.sender = sender
+        self.timeout = timeout
+
+    def _send_sync(self, recipient: str, subject: str, body: str):
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(message)
+
+    async def send(self, recipient: str, subject: str, body: str):
+        await asyncio.to_thread(self._send_sync, recipient, subject, body)
+
+
+def _email_channel():
+    host = os.getenv("SMTP_HOST")
+    if not host:
+        return LogChannel("email")
+    return SmtpChannel(
+        host,
+        port=int(os.getenv("SMTP_PORT", "25")),
+        username=os.getenv("SMTP_USER"),
+        password=os.getenv("SMTP_PASSWORD"),
+        starttls=os.getenv("SMTP_STARTTLS", "false").lower() == "true",
+        sender=os.getenv("SMTP_FROM", "noreply@localhost"),
+    )
+
+
+_channels: Dict[str, object] = {}
+_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+def register_channel(name: str, channel, concurrency: Optional[int] = None):
+    """Install a delivery channel (anything with `async send(recipient, subject, body)`)."""
+    _channels[name] = channel
+    limit = concurrency or int(os.getenv(f"OUTBOX_CONCURRENCY_{name.upper()}", "4"))
+    _limits[name] = asyncio.Semaphore(limit)
+
+
+def _ensure_default_channels():
+    if "email" not in _channels:
+        register_channel("email", _email_channel())
+    if "kontak" not in _channels:
+        register_channel("kontak", LogChannel("kontak"))
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter: ~30s, 1m, 2m, ... capped at BACKOFF_MAX."""
+    delay = min(BACKOFF_BASE * (2 ** max(attempts - 1, 0)), BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxDispatcher:
+    def __init__(self, batch_size: int = BATCH_SIZE, poll_seconds: float = POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.db = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, db):
+        _ensure_default_channels()
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        """Deliver soon instead of at the next poll (called after enqueueing)."""
+        if self.running:
+            self._wakeup.set()
+
+    async def _deliver(self, row: dict) -> Optional[str]:
+        channel = _channels.get(row["channel"])
+        if channel is None:
+            return f"no channel '{row['channel']}'"
+        subject, body = render(row["event"], row["payload"])
+        start = time.perf_counter()
+        async with _limits[row["channel"]]:
+            try:
+                await asyncio.wait_for(channel.send(row["recipient"], subject, body), SEND_TIMEOUT)
+            except Exception as e:
+                metrics.OUTBOX_DELIVERIES.inc(row["channel"], "error")
+                return f"{type(e).__name__}: {e}"[:500]
+            finally:
+                metrics.OUTBOX_SEND_DURATION.observe(time.perf_counter() - start, row["channel"])
+        metrics.OUTBOX_DELIVERIES.inc(row["channel"], "sent")
+        return None
+
+    async def dispatch_once(self) -> int:
+        """Lease and deliver one batch. Returns the number of rows handled."""
+        rows = await outbox_repo.claim_batch(self.db, self.batch_size, LEASE_SECONDS)
+        if not rows:
+            return 0
+        errors = await asyncio.gather(*(self._deliver(r) for r in rows))
+
+        sent = [r["id_outbox"] for r, error in zip(rows, errors) if error is None]
+        failed = [(r, error) for r, error in zip(rows, errors) if error is not None]
+        await outbox_repo.mark_sent(self.db, sent)
+        if failed:
+            for r, _ in failed:
+                if r["attempts"] >= MAX_ATTEMPTS:
+                    metrics.OUTBOX_DELIVERIES.inc(r["channel"], "dead")
+                    logger.warning("Outbox %s dead after %d attempts", r["id_outbox"], r["attempts"])
+            await outbox_repo.mark_failed(
+                self.db,
+                [r["id_outbox"] for r, _ in failed],
+                [retry_delay(r["attempts"]) for r, _ in failed],
+                [error for _, error in failed],
+                MAX_ATTEMPTS,
+            )
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                with metrics.JOB_DURATION.time("outbox"):
+                    handled = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.JOB_FAILURES.inc("outbox")
+                logger.warning("Outbox dispatch failed: %s", e)
+                handled = 0
+            if handled >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+dispatcher = OutboxDispatcher()
@@ -0,0 +1,187 @@
+"""
+Perceptual photo fingerprints and the similar-photo index
+(GET /laporan/{id}/similar-photos).
+
+Every uploaded image gets a 64-bit dHash (difference hash of a 9x8
+grayscale thumbnail): near-identical photos of the same item (re-encoded,
+resized, slightly cropped or brightened) differ in a few bits. Hashes are
+stored in `foto_hash` and mirrored in an in-process multi-index hash table:
+the hash is split into four 16-bit chunks, each with its own dict. Two
+hashes within distance r share at least one chunk within distance r // 4
+(pigeonhole), so a query only probes the few hundred chunk values around
+its own chunks instead of scanning every hash.
+
+Decoding needs Pillow; without it uploads are simply not fingerprinted.
+Other workers' uploads are picked up by polling `foto_hash` for rows past
+a (xid, id) cursor (at most every PHOTO_INDEX_REFRESH_SECONDS, on query).
+"""
+import asyncio
+import io
+import logging
+import os
+import time
+from itertools import combinations
+from typing import Dict, List, Optional, Set, Tuple
+
+from repositories import foto_hash_repo
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DISTANCE = int(os.getenv("PHOTO_SIMILAR_MAX_DISTANCE", "10"))
+MAX_DISTANCE = 16
+REFRESH_SECONDS = float(os.getenv("PHOTO_INDEX_REFRESH_SECONDS", "2"))
+LOAD_BATCH = 50000
+
+_CHUNKS = 4
+_CHUNK_BITS = 16
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+
+
+def dhash(content: bytes) -> Optional[int]:
+    """64-bit difference hash of an image, or None if it can't be decoded."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            # Let the JPEG decoder downscale while decoding (much faster than a full decode)
+            image.draft("L", (64, 64))
+            pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception as e:
+        logger.info("Could not fingerprint image: %s", e)
+        return None
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+async def fingerprint(content: bytes) -> Optional[int]:
+    """dhash() off the event loop."""
+    return await asyncio.to_thread(dhash, content)
+
+
+def to_signed(value: int) -> int:
+    """Unsigned 64-bit hash -> BIGINT."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value & 0xFFFFFFFFFFFFFFFF
+
+
+def _masks(radius: int) -> List[int]:
+    """All 16-bit masks with at most `radius` bits set."""
+    masks = []
+    for bits in range(radius + 1):
+        for positions in combinations(range(_CHUNK_BITS), bits):
+            mask = 0
+            for p in positions:
+                mask |= 1 << p
+            masks.append(mask)
+    return masks
+
+
+_MASKS = [_masks(r) for r in range(MAX_DISTANCE // _CHUNKS + 1)]
+
+
+class PhotoIndex:
+    def __init__(self):
+        self.hashes: Dict[str, int] = {}
+        # Equal hashes (the same photo uploaded twice) share one entry
+        self.urls: Dict[int, Set[str]] = {}
+        self.tables: List[Dict[int, Set[int]]] = [{} for _ in range(_CHUNKS)]
+        # Refresh cursor (xid, id_hash), see foto_hash_repo.list_since
+        self.cursor = (0, 0)
+        self.refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @staticmethod
+    def _chunks(value: int):
+        for i in range(_CHUNKS):
+            yield i, (value >> (i * _CHUNK_BITS)) & _CHUNK_MASK
+
+    def _unlink(self, foto_url: str, old: int):
+        urls = self.urls[old]
+        urls.discard(foto_url)
+        if not urls:
+            del self.urls[old]
+            for i, chunk in self._chunks(old):
+                bucket = self.tables[i][chunk]
+                bucket.discard(old)
+                if not bucket:
+                    del self.tables[i][chunk]
+
+    def add(self, foto_url: str, value: int):
+        value = to_unsigned(value)
+        old = self.hashes.get(foto_url)
+        if old == value:
+            return
+        if old is not None:
+            self._unlink(foto_url, old)
+        self.hashes[foto_url] = value
+        urls = self.urls.get(value)
+        if urls is None:
+            urls = self.urls[value] = set()
+            for i, chunk in self._chunks(value):
+                self.tables[i].setdefault(chunk, set()).add(value)
+        urls.add(foto_url)
+
+    def rename(self, old_url: str, new_url: str):
+        """A spooled photo was replicated and its foto_url rewritten."""
+        value = self.hashes.pop(old_url, None)
+        if value is None:
+            return
+        self._unlink(old_url, value)
+        self.add(new_url, value)
+
+    def search(self, value: int, max_distance: int = DEFAULT_MAX_DISTANCE) -> List[Tuple[str, int]]:
+        """(foto_url, distance) within max_distance, nearest first."""
+        value = to_unsigned(value)
+        max_distance = max(0, min(max_distance, MAX_DISTANCE))
+        masks = _MASKS[max_distance // _CHUNKS]
+        candidates: Set[int] = set()
+        for i, chunk in self._chunks(value):
+            table = self.tables[i]
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates |= bucket
+        found = []
+        for candidate in candidates:
+            distance = bin(candidate ^ value).count("1")
+            if distance <= max_distance:
+                found.extend((foto_url, distance) for foto_url in self.urls[candidate])
+        found.sort(key=lambda f: (f[1], f[0]))
+        return found
+
+    async def refresh(self, db, force: bool = False) -> int:
+        """Load hashes stored since the last refresh (all of them the first time)."""
+        if not force and time.monotonic() - self.refreshed_at < REFRESH_SECONDS:
+            return 0
+        async with self._lock:
+            if not force and time.monotonic() - self.refreshed_at < REFRESH_SECONDS:
+                return 0
+            loaded = 0
+            while True:
+                xmin, rows = await foto_hash_repo.list_since(db, self.cursor[0], self.cursor[1], LOAD_BATCH)
+                for _, _, foto_url, phash in rows:
+                    self.add(foto_url, phash)
+                loaded += len(rows)
+                if len(rows) == LOAD_BATCH:
+                    self.cursor = (rows[-1][0], rows[-1][1])
+                    continue
+                # Everything below xmin has been read
+                self.cursor = max(self.cursor, (xmin, 0))
+                break
+            self.refreshed_at = time.monotonic()
+            return loaded
+
+
+index = PhotoIndex()
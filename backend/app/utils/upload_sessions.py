@@ -0,0 +1,285 @@
+"""
+Resumable (chunked) image uploads for clients on unreliable connections
+(POST/HEAD/PATCH/DELETE /laporan/uploads, tus-style).
+
+A session is created with the total size (Upload-Length), then the client
+PATCHes chunks at the offset the server already has (Upload-Offset). After a
+dropped connection it asks HEAD for the current offset and continues from
+there instead of starting over. Once every byte is in, finalize hands the
+assembled file to the storage backend like a single-shot upload.
+
+Chunks are appended to `<id>.part` in a local spool directory next to a
+`<id>.json` metadata file, so sessions survive a worker restart and can be
+continued on any worker sharing the directory. Disk use is bounded: creating
+a session reserves its full declared length against SPOOL_MAX_BYTES and is
+refused (507) when the spool is full; the check and the create run under an
+flock on `.lock` in the directory, so workers cannot overcommit it together.
+Finalizing moves the metadata to `<id>.done` (keeping the result for retried
+finalize calls) and frees the reservation. Sessions not touched for
+SESSION_TTL seconds are removed by collect_garbage() (run periodically from
+main).
+"""
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+SPOOL_DIR = Path(os.getenv("UPLOAD_SPOOL_DIR", str(APP_DIR / "cache" / "uploads")))
+# Same limit as the single-shot POST /laporan/upload-image
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(512 * 1024 * 1024)))
+SESSION_TTL = float(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 60 * 60)))
+GC_INTERVAL = float(os.getenv("UPLOAD_GC_INTERVAL_SECONDS", "600"))
+
+_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+class UploadSessions:
+    def __init__(self, directory: Path = SPOOL_DIR, max_bytes: int = SPOOL_MAX_BYTES, ttl: float = SESSION_TTL):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Serialises create() and finalize() within the worker; the space
+        # reservation is also guarded across workers (_reservation_lock)
+        self._lock = asyncio.Lock()
+        metrics.UPLOAD_SESSION_BYTES.set_function(lambda: {(): self.reserved_bytes()})
+
+    # --- paths / metadata -------------------------------------------------
+
+    def _path(self, upload_id: str, suffix: str) -> Path:
+        if not _ID.match(upload_id):
+            raise HTTPException(status_code=404, detail="Upload tidak ditemukan")
+        return self.directory / f"{upload_id}{suffix}"
+
+    def _read_meta(self, upload_id: str) -> dict:
+        meta = None
+        # .done (finalized) first: after a crash mid-finalize both may exist
+        for suffix in (".done", ".json"):
+            try:
+                with open(self._path(upload_id, suffix)) as f:
+                    meta = json.load(f)
+                break
+            except (FileNotFoundError, ValueError):
+                continue
+        if meta is None or self._expired(upload_id, time.time()):
+            raise HTTPException(status_code=404, detail="Upload tidak ditemukan atau sudah kedaluwarsa")
+        return meta
+
+    def _write_meta(self, upload_id: str, meta: dict, suffix: str = ".json"):
+        path = self._path(upload_id, suffix)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    @contextlib.contextmanager
+    def _reservation_lock(self):
+        """Exclusive flock shared by every worker using the spool directory."""
+        with open(self.directory / ".lock", "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _last_activity(self, upload_id: str) -> float:
+        latest = 0.0
+        for suffix in (".json", ".done", ".part"):
+            try:
+                latest = max(latest, os.stat(self._path(upload_id, suffix)).st_mtime)
+            except FileNotFoundError:
+                pass
+        return latest
+
+    def _expired(self, upload_id: str, now: float) -> bool:
+        return now - self._last_activity(upload_id) > self.ttl
+
+    def _offset(self, upload_id: str) -> int:
+        try:
+            return os.stat(self._path(upload_id, ".part")).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _session_ids(self, suffixes=(".json", ".done")):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return list(dict.fromkeys(
+            name[:-5] for name in names if name.endswith(suffixes)
+        ))
+
+    def reserved_bytes(self) -> int:
+        """Declared length of every session not finalized yet (only `.json` ones)."""
+        total = 0
+        for upload_id in self._session_ids((".json",)):
+            try:
+                with open(self._path(upload_id, ".json")) as f:
+                    meta = json.load(f)
+            except (FileNotFoundError, ValueError, HTTPException):
+                continue
+            if not meta.get("result"):
+                total += meta["length"]
+        return total
+
+    def _status(self, upload_id: str, meta: dict) -> dict:
+        result = meta.get("result")
+        return {
+            "upload_id": upload_id,
+            "length": meta["length"],
+            "offset": meta["length"] if result else self._offset(upload_id),
+            "filename": meta["filename"],
+            "content_type": meta["content_type"],
+            "finalized": bool(result),
+            "expires_at": self._last_activity(upload_id) + self.ttl,
+        }
+
+    # --- operations -------------------------------------------------------
+
+    def _create_sync(self, filename: str, content_type: str, length: int) -> dict:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._reservation_lock():
+            if self.reserved_bytes() + length > self.max_bytes:
+                raise HTTPException(status_code=507, detail="Penyimpanan upload sementara penuh, coba lagi nanti")
+            upload_id = secrets.token_urlsafe(18)
+            self._path(upload_id, ".part").touch()
+            meta = {
+                "filename": os.path.basename(filename),
+                "content_type": content_type,
+                "length": length,
+                "created_at": time.time(),
+            }
+            self._write_meta(upload_id, meta)
+        return self._status(upload_id, meta)
+
+    async def create(self, filename: str, content_type: str, length: int) -> dict:
+        if not filename:
+            raise HTTPException(status_code=400, detail="filename wajib diisi")
+        if not content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="Hanya file gambar yang diizinkan")
+        if length <= 0:
+            raise HTTPException(status_code=400, detail="Upload-Length harus lebih dari 0")
+        if length > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Ukuran file tidak boleh lebih dari 5MB")
+        async with self._lock:
+            return await asyncio.to_thread(self._create_sync, filename, content_type, length)
+
+    async def status(self, upload_id: str) -> dict:
+        meta = await asyncio.to_thread(self._read_meta, upload_id)
+        return self._status(upload_id, meta)
+
+    def _append_sync(self, upload_id: str, offset: int, data: bytes) -> int:
+        meta = self._read_meta(upload_id)
+        if meta.get("result"):
+            raise HTTPException(status_code=409, detail="Upload sudah selesai")
+        try:
+            # No O_CREAT: a missing .part must not be recreated
+            fd = os.open(self._path(upload_id, ".part"), os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            # Being finalized (renamed away) right now
+            raise HTTPException(status_code=409, detail="Upload sedang diselesaikan")
+        with os.fdopen(fd, "ab") as f:
+            # Two PATCHes for the same session (a retry racing the original,
+            # possibly on another worker) must not both append
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Upload-Offset {offset} tidak sesuai, server sudah menerima {current} byte",
+                )
+            if current + len(data) > meta["length"]:
+                raise HTTPException(status_code=413, detail="Data melebihi Upload-Length")
+            f.write(data)
+            f.flush()
+            return current + len(data)
+
+    async def append(self, upload_id: str, offset: int, data: bytes) -> int:
+        """Append a chunk at `offset` (must equal the current offset); returns the new offset."""
+        return await asyncio.to_thread(self._append_sync, upload_id, offset, data)
+
+    async def finalize(
+        self, upload_id: str, store: Callable[[bytes, str], Awaitable[dict]]
+    ) -> dict:
+        """
+        Hand the complete file to `store(content, filename)` once. The result
+        is kept with the session, so a retried finalize returns it again.
+        """
+        async with self._lock:
+            meta = await asyncio.to_thread(self._read_meta, upload_id)
+            if meta.get("result"):
+                return meta["result"]
+            offset = self._offset(upload_id)
+            if offset != meta["length"]:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Upload belum lengkap ({offset} dari {meta['length']} byte)",
+                )
+            part = self._path(upload_id, ".part")
+            claimed = self._path(upload_id, ".finalizing")
+            try:
+                # Atomic claim: only one worker gets to store the file
+                os.rename(part, claimed)
+            except FileNotFoundError:
+                raise HTTPException(status_code=409, detail="Upload sedang diselesaikan")
+            try:
+                content = await asyncio.to_thread(claimed.read_bytes)
+                result = await store(content, meta["filename"])
+            except BaseException:
+                os.rename(claimed, part)
+                raise
+            meta["result"] = result
+            await asyncio.to_thread(self._mark_done, upload_id, meta)
+            claimed.unlink(missing_ok=True)
+            return result
+
+    def _mark_done(self, upload_id: str, meta: dict):
+        # The result stays for retried finalize calls; dropping the .json
+        # releases the reservation and keeps create() from reading it again
+        self._write_meta(upload_id, meta, ".done")
+        self._path(upload_id, ".json").unlink(missing_ok=True)
+
+    def _remove_sync(self, upload_id: str):
+        for suffix in (".part", ".finalizing", ".json", ".json.tmp", ".done", ".done.tmp"):
+            try:
+                self._path(upload_id, suffix).unlink()
+            except FileNotFoundError:
+                pass
+
+    async def delete(self, upload_id: str):
+        await asyncio.to_thread(self._read_meta, upload_id)
+        await asyncio.to_thread(self._remove_sync, upload_id)
+
+    def _collect_garbage_sync(self) -> int:
+        now = time.time()
+        removed = 0
+        for upload_id in self._session_ids():
+            try:
+                if self._expired(upload_id, now):
+                    self._remove_sync(upload_id)
+                    removed += 1
+            except HTTPException:
+                continue
+        return removed
+
+    async def collect_garbage(self) -> int:
+        """Remove sessions idle for longer than the TTL; returns how many."""
+        return await asyncio.to_thread(self._collect_garbage_sync)
+
+
+sessions = UploadSessions()
@@ -0,0 +1,142 @@
+"""
+In-memory search index over provinsi and kab/kota names (GET /wilayah/search).
+
+Built once from the `wilayah` table. Every prefix of every word of a name is
+a key in a dict, so "sura" or "kab band" resolve with a few set
+intersections; when nothing matches by prefix (typos such as "surabya") a
+trigram index gives fuzzy candidates. Names are compared case- and
+accent-insensitively (utils.names.normalize_name).
+"""
+from typing import Dict, List, Optional, Set
+
+from utils.names import normalize_name, strip_kota_prefix
+
+MAX_LIMIT = 50
+
+# Trigram similarity (shared / union) needed for a fuzzy match
+FUZZY_THRESHOLD = 0.3
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Entry:
+    __slots__ = ("result", "norm", "bare", "trigrams", "order")
+
+    def __init__(self, result: dict, name: str, order: tuple):
+        self.result = result
+        self.norm = normalize_name(name)
+        self.bare = strip_kota_prefix(self.norm)
+        self.trigrams = _trigrams(self.bare)
+        self.order = order
+
+
+class WilayahIndex:
+    def __init__(self, wilayah_rows):
+        self.entries: List[_Entry] = []
+        self.kota_names: Dict[int, str] = {}
+        provinsi_seen = set()
+        for r in wilayah_rows:
+            self.kota_names[r["id_kota"]] = r["nama_kota"]
+            if r["id_provinsi"] not in provinsi_seen:
+                provinsi_seen.add(r["id_provinsi"])
+                self._add({
+                    "type": "provinsi",
+                    "id_provinsi": r["id_provinsi"],
+                    "nama_provinsi": r["nama_provinsi"],
+                    "label": r["nama_provinsi"],
+                }, r["nama_provinsi"], 0)
+            self._add({
+                "type": "kota",
+                "id_kota": r["id_kota"],
+                "nama_kota": r["nama_kota"],
+                "id_provinsi": r["id_provinsi"],
+                "nama_provinsi": r["nama_provinsi"],
+                "label": f"{r['nama_kota']}, {r['nama_provinsi']}",
+            }, r["nama_kota"], 1)
+
+        self.prefixes: Dict[str, Set[int]] = {}
+        self.trigram_index: Dict[str, Set[int]] = {}
+        for i, entry in enumerate(self.entries):
+            for word in entry.norm.split():
+                for end in range(1, len(word) + 1):
+                    self.prefixes.setdefault(word[:end], set()).add(i)
+            for gram in entry.trigrams:
+                self.trigram_index.setdefault(gram, set()).add(i)
+
+    def _add(self, result: dict, name: str, type_rank: int):
+        norm = normalize_name(name)
+        # Provinsi before kab/kota, Kota before Kabupaten, then shorter names
+        kabupaten = 1 if norm.startswith("kabupaten") else 0
+        self.entries.append(_Entry(result, name, (type_rank, kabupaten, len(norm), norm)))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, q: str, limit: int = 10, kind: Optional[str] = None) -> List[dict]:
+        """
+        Rank: exact name, then name starting with the query, then any word
+        starting with each query word, then fuzzy trigram matches.
+        """
+        query = normalize_name(q)
+        if not query:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        candidates: Optional[Set[int]] = None
+        for word in query.split():
+            matches = self.prefixes.get(word)
+            if not matches:
+                candidates = set()
+                break
+            candidates = matches if candidates is None else candidates & matches
+
+        scored = []
+        if candidates:
+            for i in candidates:
+                entry = self.entries[i]
+                if kind and entry.result["type"] != kind:
+                    continue
+                if entry.norm == query or entry.bare == query:
+                    rank = 0
+                elif entry.norm.startswith(query) or entry.bare.startswith(query):
+                    rank = 1
+                else:
+                    rank = 2
+                scored.append(((rank, 0.0) + entry.order, entry))
+        elif len(query) >= 3:
+            grams = _trigrams(strip_kota_prefix(query))
+            shared: Dict[int, int] = {}
+            for gram in grams:
+                for i in self.trigram_index.get(gram, ()):
+                    shared[i] = shared.get(i, 0) + 1
+            for i, count in shared.items():
+                entry = self.entries[i]
+                if kind and entry.result["type"] != kind:
+                    continue
+                similarity = count / (len(grams) + len(entry.trigrams) - count)
+                if similarity >= FUZZY_THRESHOLD:
+                    scored.append(((3, -similarity) + entry.order, entry))
+
+        scored.sort(key=lambda s: s[0])
+        return [entry.result for _, entry in scored[:limit]]
+
+
+_index: Optional[WilayahIndex] = None
+
+
+def set_index(index: Optional[WilayahIndex]):
+    global _index
+    _index = index
+
+
+def get_index() -> Optional[WilayahIndex]:
+    return _index
+
+
+def kota_name(id_kota: Optional[int]) -> Optional[str]:
+    if _index is None or id_kota is None:
+        return None
+    return _index.kota_names.get(id_kota)